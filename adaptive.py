@@ -0,0 +1,110 @@
+"""
+Adaptive response length for the Startup Guide Tool
+
+Learns how long responses actually are for each (topic, modifier, model)
+from the usage returned by the API, and derives max_tokens and a word
+target from those observations instead of a fixed slider value.
+"""
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple
+
+from config import Config
+from prompts import get_word_range
+
+WORDS_PER_TOKEN = 0.75
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return float(sorted_values[rank])
+
+
+class OutputLengthTracker:
+    """Rolling window of observed completion tokens per (topic, modifier, model)"""
+
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, str, str], deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        topic: str,
+        modifier: str,
+        model: str,
+        completion_tokens: int,
+        truncated: bool = False,
+        max_tokens: Optional[int] = None
+    ) -> None:
+        """
+        Record an observed completion length. Truncated responses only tell
+        us the answer wanted more room, so they are recorded above the limit.
+        """
+        if truncated and max_tokens:
+            completion_tokens = max(completion_tokens, int(max_tokens * Config.ADAPTIVE_HEADROOM))
+        with self._lock:
+            self._samples[(topic, modifier, model)].append(completion_tokens)
+
+    def stats(self, topic: str, modifier: str, model: str) -> Optional[Dict[str, float]]:
+        """
+        Percentiles of observed completion tokens, or None with too few samples
+        """
+        with self._lock:
+            values = sorted(self._samples.get((topic, modifier, model), ()))
+        if len(values) < self.min_samples:
+            return None
+        return {
+            "samples": len(values),
+            "p25": _percentile(values, 25),
+            "p50": _percentile(values, 50),
+            "p75": _percentile(values, 75),
+            "p95": _percentile(values, 95)
+        }
+
+    def word_target(self, topic: str, modifier: str, model: str) -> Tuple[int, int]:
+        """
+        Word range to ask for: the observed interquartile range once learned,
+        otherwise the template budget scaled for the modifier
+        """
+        observed = self.stats(topic, modifier, model)
+        if observed:
+            low = int(observed["p25"] * WORDS_PER_TOKEN)
+            high = int(observed["p75"] * WORDS_PER_TOKEN)
+        else:
+            low, high = get_word_range(topic)
+            scale = Config.ADAPTIVE_MODIFIER_SCALE.get(modifier, 1.0)
+            low, high = int(low * scale), int(high * scale)
+        low = max(Config.ADAPTIVE_MIN_WORDS, low // 50 * 50)
+        high = max(low + 50, int(math.ceil(high / 50.0)) * 50)
+        return low, high
+
+    def max_tokens(self, topic: str, modifier: str, model: str) -> int:
+        """
+        max_tokens with headroom over the p95 observed length (or the word target)
+        """
+        observed = self.stats(topic, modifier, model)
+        _, high_words = self.word_target(topic, modifier, model)
+        needed = high_words / WORDS_PER_TOKEN
+        if observed:
+            needed = max(needed, observed["p95"])
+        limit = int(math.ceil(needed * Config.ADAPTIVE_HEADROOM / 100.0)) * 100
+        return min(Config.MAX_MAX_TOKENS, max(Config.ADAPTIVE_MIN_TOKENS, limit))
+
+
+def length_instruction(word_target: Tuple[int, int]) -> str:
+    """
+    Prompt suffix stating the adaptive word target
+    """
+    return f"\n\nLength target for this answer: {word_target[0]}-{word_target[1]} words (this overrides any other length guidance)."
+
+
+# Process-wide tracker shared by all sessions
+length_tracker = OutputLengthTracker()
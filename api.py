@@ -0,0 +1,695 @@
+"""
+OpenRouter API client for the Startup Guide Tool
+
+Kept free of Streamlit so it can be shared by the app, background jobs
+and benchmarks. Callers render streamed text through the on_delta callback.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from metrics import registry, span
+from prompts import get_required_headings, get_static_instructions, get_word_range, render_prompt
+from utils import estimate_tokens
+
+SYSTEM_PROMPT = "You are an expert startup advisor providing structured, practical guidance. Be specific, actionable, and encouraging."
+CONTINUE_INSTRUCTION = (
+    "Your previous answer was cut off. Continue exactly where it stopped, without repeating "
+    "any text or adding an introduction, and keep the same structure."
+)
+
+# Resumed text is buffered until this many characters arrive so a repeated
+# tail of the partial answer can be dropped before it is shown
+RESUME_OVERLAP_WINDOW = 200
+MIN_RESUME_OVERLAP = 8
+
+
+API_REQUESTS = registry.counter("api_requests_total", "Upstream chat completion requests by status")
+API_TOKENS = registry.counter("api_tokens_total", "Tokens reported by the provider by kind")
+API_COALESCED = registry.counter("api_coalesced_requests_total", "Requests served by attaching to an in-flight generation")
+API_TIME_TO_HEADERS = registry.histogram("api_time_to_headers_seconds", "Time from request start to response headers")
+API_TTFT = registry.histogram("api_time_to_first_token_seconds", "Time from request start to the first content token")
+API_REQUEST_SECONDS = registry.histogram("api_request_seconds", "Total upstream request duration")
+API_TOKENS_PER_SECOND = registry.histogram(
+    "api_output_tokens_per_second", "Streaming output rate after the first token",
+    [5, 10, 20, 40, 60, 80, 120, 200, 400]
+)
+
+API_EARLY_STOPS = registry.counter("api_early_stops_total", "Streams closed by the stream monitor by reason")
+API_CANCELLED_TOKENS = registry.counter(
+    "api_cancelled_tokens_total", "Estimated output tokens generated before a stream was cancelled"
+)
+API_STREAM_RESUMES = registry.counter("api_stream_resumes_total", "Continuation requests sent after a stream broke off")
+API_RESUME_TOKENS_REUSED = registry.counter(
+    "api_resume_tokens_reused_total", "Estimated output tokens kept from broken streams instead of regenerated"
+)
+
+
+class APIError(Exception):
+    """Non-200 response from the chat completions endpoint"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"API Error: {status_code} - {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+# Statuses meaning the provider is down or overloaded, not that the request is bad
+UNAVAILABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def is_upstream_unavailable(error: BaseException) -> bool:
+    """
+    True if a request failed because the provider is unreachable, timing
+    out or overloaded, so a saved answer is a reasonable stand-in
+    """
+    if isinstance(error, APIError):
+        return error.status_code in UNAVAILABLE_STATUSES
+    import requests  # deferred, see get_http_session
+
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class CancelToken:
+    """
+    Cancels an in-flight request from any thread. Callbacks registered
+    with on_cancel (e.g. closing the HTTP response) run on cancellation,
+    which unblocks a stream that is waiting for its next chunk.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
+
+
+def _normalize_heading(line: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9&()\- ]", " ", line.lower()).split())
+
+
+class StreamMonitor:
+    """
+    Watches a streamed answer for the template's required "## " headings
+    and a word budget, and decides when the upstream stream can be closed.
+
+    The stream stops as soon as an extra top-level section starts after
+    every required heading has appeared; the last required section only
+    ends there, since a blank line inside it may just separate an intro
+    from its list. Exceeding word_budget also stops the stream, cut back
+    to the last paragraph break. Only complete lines are inspected.
+    """
+
+    def __init__(self, required_headings: List[str], word_budget: int):
+        self.required = {_normalize_heading(heading) for heading in required_headings}
+        self.word_budget = word_budget
+        self.seen = set()
+        self.words = 0
+        self.section_words = 0
+        self.scanned = 0  # offset of the first unscanned character
+        self.last_break = None  # latest paragraph break or heading start
+        self.cut = None
+        self.reason = None
+
+    @property
+    def structure_complete(self) -> bool:
+        return self.required <= self.seen
+
+    def feed(self, full_response: str) -> bool:
+        """
+        Inspect newly completed lines. Returns True once the stream should stop.
+        """
+        while self.reason is None:
+            end = full_response.find("\n", self.scanned)
+            if end < 0:
+                break
+            start, self.scanned = self.scanned, end + 1
+            self._line(full_response[start:end].strip(), start)
+        return self.reason is not None
+
+    def _stop(self, reason: str, cut: int) -> None:
+        self.reason = reason
+        self.cut = cut
+
+    def _line(self, line: str, offset: int) -> None:
+        if not line:
+            if self.section_words:
+                self.last_break = offset
+            return
+        if line.startswith("#") and not line.startswith("###"):
+            heading = _normalize_heading(line)
+            if heading in self.required:
+                self.seen.add(heading)
+                self.section_words = 0
+                self.last_break = offset
+                return
+            if self.structure_complete:
+                self._stop("extra_section", offset)
+                return
+        line_words = len(line.split())
+        self.words += line_words
+        self.section_words += line_words
+        if self.words > self.word_budget:
+            self._stop("word_budget", self.last_break if self.last_break is not None else offset)
+
+    def final_text(self, full_response: str) -> str:
+        """
+        The answer with anything after the stop point removed
+        """
+        if self.cut is None:
+            return full_response
+        return full_response[:self.cut].rstrip()
+
+
+def build_stream_monitor(topic: str, compact: bool = False, modifier: str = "generate") -> StreamMonitor:
+    """
+    Monitor for a topic's template: its headings and word range, scaled
+    for the follow-up type and widened by Config.EARLY_STOP_WORD_SLACK
+    """
+    headings = get_required_headings(topic, compact)
+    _, high = get_word_range(topic)
+    scale = Config.ADAPTIVE_MODIFIER_SCALE.get(modifier, 1.0)
+    return StreamMonitor(
+        headings,
+        word_budget=int(high * scale * Config.EARLY_STOP_WORD_SLACK)
+    )
+
+
+def build_messages(prompt: str, context: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Classic layout: system prompt, recent history, then the full topic prompt
+    """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if context:
+        messages.extend(context[-Config.CONTEXT_WINDOW_SIZE:])
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def build_prefix_stable_messages(
+    topic: str,
+    query: str,
+    profile_context: str = "",
+    modifier: str = "",
+    context: Optional[List[Dict]] = None,
+    compact: bool = False
+) -> List[Dict]:
+    """
+    Prefix-stable layout: static topic instructions first, the startup
+    profile second and the volatile query/modifier last, so repeat requests
+    share the longest possible identical prefix for provider prompt caching
+    """
+    messages = [{
+        "role": "system",
+        "content": SYSTEM_PROMPT + "\n\n" + get_static_instructions(topic, compact).strip()
+    }]
+    if profile_context.strip():
+        messages.append({"role": "system", "content": profile_context.strip()})
+    if context:
+        messages.extend(context[-Config.CONTEXT_WINDOW_SIZE:])
+    messages.append({"role": "user", "content": query + modifier})
+    return messages
+
+
+def build_guidance_messages(
+    topic: str,
+    query: str,
+    profile_context: str = "",
+    modifier: str = "",
+    context: Optional[List[Dict]] = None,
+    layout: str = Config.DEFAULT_PROMPT_LAYOUT,
+    compact: bool = False
+) -> List[Dict]:
+    """
+    Messages for a guidance request in the given message layout
+    """
+    if layout == "prefix_stable":
+        return build_prefix_stable_messages(topic, query, profile_context, modifier, context, compact=compact)
+    return build_messages(render_prompt(topic, query, profile_context, modifier, compact), context)
+
+
+def build_payload(messages: List[Dict], model: str, max_tokens: int, stream: bool) -> Dict:
+    """
+    Build the chat completions request body
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": Config.DEFAULT_TEMPERATURE,
+        "top_p": Config.DEFAULT_TOP_P,
+        "max_tokens": max_tokens,
+        "stream": stream
+    }
+    if stream:
+        # Ask for a final usage chunk so streamed calls report token counts
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def extract_cached_tokens(usage: Optional[Dict]) -> int:
+    """
+    Read the cached prompt token count from a usage block, if reported
+    """
+    if not usage:
+        return 0
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0)
+
+
+class _Flight:
+    """One upstream generation and the deltas it has produced so far"""
+
+    def __init__(self):
+        self.deltas: List[str] = []
+        self.done = False
+        self.result: Optional[Dict] = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent identical requests. The first caller for a key
+    runs the upstream generation; callers arriving while it is in flight
+    attach to it and receive the same streamed deltas (replayed from the
+    start) and the same final result. If the leader is cancelled, attached
+    callers retry and one of them leads a new generation.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"upstream": 0, "coalesced": 0}
+
+    def run(
+        self,
+        key: str,
+        fn: Callable[[Callable[[str, str], None]], Dict],
+        on_delta: Optional[Callable[[str, str], None]] = None
+    ) -> Dict:
+        """
+        Run fn(publish) once per key among concurrent callers
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                    self.stats["upstream"] += 1
+                else:
+                    self.stats["coalesced"] += 1
+                    API_COALESCED.inc()
+
+            if leader:
+                return self._lead(key, flight, fn, on_delta)
+            result = self._follow(flight, on_delta)
+            if result is not None:
+                return result
+
+    def _lead(self, key, flight: _Flight, fn, on_delta) -> Dict:
+        def publish(delta: str, full_response: str):
+            with flight.cond:
+                flight.deltas.append(delta)
+                flight.cond.notify_all()
+            if on_delta:
+                on_delta(delta, full_response)
+
+        try:
+            flight.result = fn(publish)
+            flight.cancelled = flight.result.get("finish_reason") == "cancelled"
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            # Interrupted caller (e.g. a Streamlit rerun): not an upstream error
+            flight.cancelled = True
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _follow(self, flight: _Flight, on_delta) -> Optional[Dict]:
+        seen = 0
+        full_response = ""
+        while True:
+            with flight.cond:
+                while seen >= len(flight.deltas) and not flight.done:
+                    flight.cond.wait()
+                pending = flight.deltas[seen:]
+                seen += len(pending)
+                finished = flight.done and seen >= len(flight.deltas)
+            for delta in pending:
+                full_response += delta
+                if on_delta:
+                    on_delta(delta, full_response)
+            if finished:
+                break
+
+        if flight.cancelled:
+            return None
+        if flight.error is not None:
+            raise flight.error
+        return dict(flight.result, coalesced=True)
+
+
+# Process-wide so requests from different sessions can share a generation
+single_flight = SingleFlight()
+
+
+def coalescing_key(payload: Dict, api_key: str) -> str:
+    """
+    Canonical digest of a request payload and the API key (the key is left
+    out only with Config.COALESCE_ACROSS_API_KEYS)
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    if not Config.COALESCE_ACROSS_API_KEYS:
+        canonical = api_key + "\n" + canonical
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_completion(
+    payload: Dict,
+    api_key: str,
+    on_delta: Optional[Callable[[str, str], None]] = None,
+    coalesce: Optional[bool] = None,
+    monitor: Optional[StreamMonitor] = None,
+    cancel_token: Optional[CancelToken] = None
+) -> Dict:
+    """
+    Send a chat completion request.
+
+    Streams when payload["stream"] is set, calling on_delta(delta, full_text)
+    for every content chunk. Returns a dict with the response content, the
+    provider usage block (if any), the cached prompt token count and the
+    finish reason. Identical concurrent requests share one upstream
+    generation unless coalescing is disabled. A stream monitor may close a
+    stream early (finish reason "early_stop"); followers of a coalesced
+    request get the leader's result. Cancelling cancel_token closes the
+    stream and returns the partial text (finish reason "cancelled").
+    """
+    if coalesce is None:
+        coalesce = Config.COALESCE_REQUESTS
+    if not coalesce:
+        return _request_completion(payload, api_key, on_delta, monitor, cancel_token)
+    return single_flight.run(
+        coalescing_key(payload, api_key),
+        lambda publish: _request_completion(payload, api_key, publish, monitor, cancel_token),
+        on_delta
+    )
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Process-wide requests.Session, created on first use. requests is imported
+    here because it dominates import time and is only needed once a user
+    actually generates; the shared session also keeps upstream connections
+    alive across reruns and sessions.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                pool_size = max(10, Config.MAX_CONCURRENT_GENERATIONS)
+                session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+                session.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+                _http_session = session
+    return _http_session
+
+
+def _record_usage(model: str, usage: Optional[Dict]) -> None:
+    if not usage:
+        return
+    API_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, kind="prompt")
+    API_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, kind="completion")
+    API_TOKENS.inc(extract_cached_tokens(usage), model=model, kind="cached")
+
+
+def estimated_usage(payload: Dict, generated: str) -> Dict:
+    """
+    Usage block for a request whose provider usage never arrived: prompt
+    and completion tokens estimated from the text, flagged as estimated
+    """
+    prompt_tokens = sum(estimate_tokens(msg.get("content") or "") for msg in payload.get("messages", []))
+    completion_tokens = estimate_tokens(generated)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "estimated": True
+    }
+
+
+def continuation_payload(payload: Dict, partial: str) -> Dict:
+    """
+    Payload asking the model to continue a partial answer. The partial text
+    is sent back as the assistant turn and max_tokens shrinks by what was
+    already generated, so a resume only pays for the missing tail.
+    """
+    messages = list(payload["messages"]) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_INSTRUCTION}
+    ]
+    remaining = int(payload.get("max_tokens") or Config.DEFAULT_MAX_TOKENS) - len(partial) // 4
+    return dict(payload, messages=messages, max_tokens=max(Config.STREAM_RESUME_MIN_TOKENS, remaining))
+
+
+def overlap_length(partial: str, continuation: str, limit: int = RESUME_OVERLAP_WINDOW) -> int:
+    """
+    Length of the longest suffix of partial that the continuation repeats
+    at its start; overlaps shorter than MIN_RESUME_OVERLAP are ignored
+    """
+    for size in range(min(limit, len(partial), len(continuation)), MIN_RESUME_OVERLAP - 1, -1):
+        if partial.endswith(continuation[:size]):
+            return size
+    return 0
+
+
+def _post(session, payload: Dict, api_key: str):
+    """
+    POST a payload; raises APIError on a non-200 response
+    """
+    import requests  # deferred, see get_http_session
+
+    model = payload.get("model", "")
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    try:
+        response = session.post(
+            Config.API_URL, headers=headers, json=payload, stream=bool(payload.get("stream")),
+            timeout=(Config.API_CONNECT_TIMEOUT_SECONDS, Config.API_READ_TIMEOUT_SECONDS)
+        )
+    except requests.RequestException:
+        API_REQUESTS.inc(model=model, status="network_error")
+        raise
+    if response.status_code != 200:
+        API_REQUESTS.inc(model=model, status=str(response.status_code))
+        raise APIError(response.status_code, response.text)
+    return response
+
+
+def _request_completion(
+    payload: Dict,
+    api_key: str,
+    on_delta: Optional[Callable[[str, str], None]] = None,
+    monitor: Optional[StreamMonitor] = None,
+    cancel_token: Optional[CancelToken] = None
+) -> Dict:
+    """
+    Perform a single upstream chat completion request. A stream that breaks
+    off mid-answer is resumed with a continuation request (up to
+    Config.STREAM_RESUME_ATTEMPTS times) and stitched onto the partial text;
+    if a resume fails too, the partial text is returned as "incomplete".
+    """
+    import requests  # deferred, see get_http_session
+
+    model = payload.get("model", "")
+    session = get_http_session()
+    start = time.perf_counter()
+
+    response = _post(session, payload, api_key)
+    # requests returns once headers arrive: DNS + connect + TLS + server queueing
+    API_TIME_TO_HEADERS.observe(time.perf_counter() - start, model=model)
+
+    if not payload.get("stream"):
+        response_data = response.json()
+        usage = response_data.get("usage")
+        choice = response_data["choices"][0]
+        API_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model)
+        API_REQUESTS.inc(model=model, status="200")
+        _record_usage(model, usage)
+        return {
+            "content": choice["message"]["content"].strip(),
+            "usage": usage,
+            "cached_tokens": extract_cached_tokens(usage),
+            "finish_reason": choice.get("finish_reason")
+        }
+
+    full_response = ""
+    usage = None
+    finish_reason = None
+    first_token_at = None
+    resumes = 0
+    while True:
+        completed = False
+        # Text of a resumed stream is held back until its overlap with the
+        # partial answer is known, then released without the repeat
+        pending = "" if resumes else None
+        partial = full_response
+
+        def emit(text: str):
+            nonlocal full_response
+            full_response += text
+            if on_delta:
+                on_delta(text, full_response)
+
+        try:
+            with span("api.stream", model=model, resume=resumes), response:
+                if cancel_token is not None:
+                    # Closing the response from another thread aborts a blocked read
+                    cancel_token.on_cancel(response.close)
+                for line in response.iter_lines():
+                    if cancel_token is not None and cancel_token.cancelled:
+                        break
+                    if line:
+                        line = line.decode('utf-8')
+                        if line.startswith('data: '):
+                            line = line[6:]
+                            if line.strip() == '[DONE]':
+                                completed = True
+                                break
+                            try:
+                                chunk = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            if chunk.get('usage'):
+                                usage = chunk['usage']
+                            if 'choices' in chunk and len(chunk['choices']) > 0:
+                                finish_reason = chunk['choices'][0].get('finish_reason') or finish_reason
+                                delta = chunk['choices'][0].get('delta', {})
+                                content = delta.get('content') or ''
+                                if content:
+                                    if first_token_at is None:
+                                        first_token_at = time.perf_counter()
+                                        API_TTFT.observe(first_token_at - start, model=model)
+                                    if pending is not None:
+                                        pending += content
+                                        if len(pending) < RESUME_OVERLAP_WINDOW:
+                                            continue
+                                        content = pending[overlap_length(partial, pending, RESUME_OVERLAP_WINDOW):]
+                                        pending = None
+                                    emit(content)
+                                    if monitor is not None and monitor.feed(full_response):
+                                        # Leaving the block closes the upstream connection
+                                        completed = True
+                                        break
+        except requests.RequestException:
+            # A read error caused by our own close is a cancellation, not a failure;
+            # any other transport error mid-stream is resumed below
+            if cancel_token is not None and cancel_token.cancelled:
+                pass
+            elif not full_response and pending is None:
+                raise
+        except Exception:
+            if cancel_token is None or not cancel_token.cancelled:
+                raise
+        finally:
+            if cancel_token is not None and cancel_token.cancelled:
+                API_REQUESTS.inc(model=model, status="cancelled")
+                API_CANCELLED_TOKENS.inc(len(full_response) // 4, model=model)
+
+        if pending:
+            emit(pending[overlap_length(partial, pending, RESUME_OVERLAP_WINDOW):])
+        if cancel_token is not None and cancel_token.cancelled:
+            return {
+                "content": full_response,
+                "usage": usage,
+                "cached_tokens": extract_cached_tokens(usage),
+                "finish_reason": "cancelled"
+            }
+        # A stream that ends without [DONE] or a finish reason was cut off
+        if completed or finish_reason is not None:
+            break
+        if resumes >= Config.STREAM_RESUME_ATTEMPTS:
+            finish_reason = "incomplete"
+            break
+        resumes += 1
+        API_STREAM_RESUMES.inc(model=model)
+        API_RESUME_TOKENS_REUSED.inc(len(full_response) // 4, model=model)
+        try:
+            response = _post(session, continuation_payload(payload, full_response), api_key)
+        except (requests.RequestException, APIError):
+            # Still unreachable: keep what was generated rather than losing it
+            finish_reason = "incomplete"
+            break
+
+    if monitor is not None and monitor.reason:
+        if usage is None:
+            # Closing the stream also drops the provider's final usage chunk
+            usage = estimated_usage(payload, full_response)
+        full_response = monitor.final_text(full_response)
+        finish_reason = "early_stop"
+        API_EARLY_STOPS.inc(model=model, reason=monitor.reason)
+
+    finished_at = time.perf_counter()
+    API_REQUEST_SECONDS.observe(finished_at - start, model=model)
+    API_REQUESTS.inc(model=model, status="200" if finish_reason != "incomplete" else "incomplete")
+    _record_usage(model, usage)
+    if first_token_at is not None and finished_at > first_token_at:
+        completion_tokens = (usage or {}).get("completion_tokens") or len(full_response) // 4
+        API_TOKENS_PER_SECOND.observe(completion_tokens / (finished_at - first_token_at), model=model)
+
+    return {
+        "content": full_response,
+        "usage": usage,
+        "cached_tokens": extract_cached_tokens(usage),
+        "finish_reason": finish_reason,
+        "resumes": resumes
+    }
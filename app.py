@@ -1,18 +1,45 @@
 import streamlit as st
-import requests
-import json
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime
+import threading
 import time
-from typing import Dict, List, Optional
-from prompts import get_prompt_template, TOPIC_EXAMPLES
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+from prompts import render_section_prompts, MODIFIERS, TOPIC_EXAMPLES
 from utils import (
     format_markdown_response, 
     export_to_markdown, 
-    extract_checklist_items,
     validate_api_key_format,
-    estimate_tokens
+    estimate_tokens,
+    format_timestamp,
+    suggest_follow_up_questions
 )
+from api import (
+    APIError,
+    CancelToken,
+    build_guidance_messages,
+    build_payload,
+    build_stream_monitor,
+    chat_completion,
+    single_flight,
+    StreamMonitor
+)
+from ratelimit import QueueFullError, RateLimitExceeded
+from scheduler import get_admission_controller, scheduler
+from adaptive import length_instruction, length_tracker
+from costs import ledger
+from router import AUTO_MODEL, router
+from metrics import SPAN_SECONDS, start_exporter
+from sections import build_section_payloads, generate_sections, section_text
+from blobs import blob_store
+from cache import cache_key, response_cache
+from prefetch import CachedRequest, prefetcher
+from transforms import build_transform_messages, is_transform, previous_answer, record_transform, transform_model
+from session_io import IMPORT_ERRORS, export_format, export_session_bytes, import_sessions, restore_session_state
 from config import Config
+from styles import CUSTOM_CSS, FOOTER_HTML
+
+_run_started = time.perf_counter()
 
 # Page Configuration
 st.set_page_config(
@@ -22,44 +49,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better UI
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: 700;
-        background: linear-gradient(120deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin-bottom: 1rem;
-    }
-    .topic-card {
-        padding: 1rem;
-        border-radius: 10px;
-        background: #f8f9fa;
-        margin: 0.5rem 0;
-    }
-    .response-container {
-        background: #ffffff;
-        padding: 2rem;
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .checklist-item {
-        padding: 0.5rem;
-        margin: 0.3rem 0;
-        border-left: 3px solid #667eea;
-        background: #f8f9fa;
-    }
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 8px;
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for better UI. Streamlit drops elements that a rerun does not
+# re-emit, so the (process-wide, prebuilt) style block is sent on every run.
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize Session State
 def init_session_state():
@@ -76,88 +68,332 @@ def init_session_state():
         st.session_state.total_tokens_used = 0
     if 'theme' not in st.session_state:
         st.session_state.theme = 'light'
+    if 'cached_tokens_total' not in st.session_state:
+        st.session_state.cached_tokens_total = 0
+    if 'last_usage' not in st.session_state:
+        st.session_state.last_usage = None
+    if 'last_finish_reason' not in st.session_state:
+        st.session_state.last_finish_reason = None
+    if 'last_coalesced' not in st.session_state:
+        st.session_state.last_coalesced = False
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if 'cancelled_generations' not in st.session_state:
+        st.session_state.cancelled_generations = 0
+    if 'cancelled_tokens_total' not in st.session_state:
+        st.session_state.cancelled_tokens_total = 0
+    if 'early_stops' not in st.session_state:
+        st.session_state.early_stops = 0
+    if 'transform_tokens_saved_total' not in st.session_state:
+        st.session_state.transform_tokens_saved_total = 0
+    if 'current_guidance' not in st.session_state:
+        st.session_state.current_guidance = None
 
 init_session_state()
 
+# Local Prometheus endpoint (started once per process)
+if Config.METRICS_ENABLED:
+    start_exporter()
+
+admission = get_admission_controller()
+
+# Session Disconnect Detection
+def start_disconnect_watch(cancel_token: CancelToken) -> threading.Event:
+    """
+    Cancel the token if this browser session goes away (tab closed or
+    connection lost) while generating. Set the returned event to stop watching.
+    """
+    finished = threading.Event()
+    ctx = get_script_run_ctx()
+    if ctx is None or not st.runtime.exists():
+        return finished
+    runtime = st.runtime.get_instance()
+    
+    def watch():
+        while not finished.wait(Config.DISCONNECT_POLL_SECONDS) and not cancel_token.cancelled:
+            if not runtime.is_active_session(ctx.session_id):
+                cancel_token.cancel("disconnected")
+    
+    threading.Thread(target=watch, name="disconnect-watch", daemon=True).start()
+    return finished
+
 # API Call Function with Streaming
 def call_openrouter_api(
-    prompt: str, 
+    messages: List[Dict],
     api_key: str, 
     model: str = "openai/gpt-4o-mini",
     max_tokens: int = 2000,
     stream: bool = True,
-    context: Optional[List[Dict]] = None
+    query_mode: str = "generate",
+    section_payloads: Optional[List[Tuple[str, Dict]]] = None,
+    monitor: Optional[StreamMonitor] = None,
+    on_cancel: Optional[Callable[[str], None]] = None,
+    fallback: Optional[Callable[[Exception], Optional[Dict]]] = None
 ) -> Optional[str]:
     """
-    Call OpenRouter API with optional streaming support
+    Call OpenRouter API with optional streaming support. With
+    section_payloads, the sections are generated concurrently instead and
+    each one is rendered in its own slot, in template order.
+    
+    A Stop button is shown while streaming. Stopping, any other
+    interaction that reruns the script, or the session disconnecting
+    closes the upstream stream; on_cancel then receives the partial text.
+    On a failed request, fallback(error) may supply a saved cache entry to
+    answer with instead of an error.
     """
-    API_URL = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    payload = build_payload(messages, model, max_tokens, stream)
+    cancel_token = CancelToken()
+    partial = {"sections": [""] * len(section_payloads or []), "text": ""}
+    queue_placeholder = st.empty()
+    stop_placeholder = st.empty()
+    response_placeholder = st.empty() if stream and not section_payloads else None
+    section_placeholders = [st.empty() for _ in section_payloads or []]
+    
+    def interruptible(render: Callable[[], None]):
+        # Streamlit interrupts a run (Stop click, topic change, closed tab)
+        # by raising from the next st call; cancel before letting it through
+        try:
+            render()
+        except BaseException:
+            cancel_token.cancel("interrupted")
+            raise
     
-    # Build messages with context
-    messages = [
-        {"role": "system", "content": "You are an expert startup advisor providing structured, practical guidance. Be specific, actionable, and encouraging."}
-    ]
+    def render_section(idx: int, text: str, finished: bool):
+        heading = section_payloads[idx][0]
+        partial["sections"][idx] = text
+        partial["text"] = "\n\n".join(
+            section_text(h, t) for (h, _), t in zip(section_payloads, partial["sections"]) if t
+        )
+        suffix = "" if finished else "▌"
+        interruptible(lambda: section_placeholders[idx].markdown(section_text(heading, text + suffix)))
     
-    # Add conversation history for context
-    if context:
-        messages.extend(context[-6:])  # Last 3 exchanges
+    def serve_fallback(error: Exception) -> Optional[str]:
+        entry = fallback(error) if fallback else None
+        if entry is None:
+            return None
+        queue_placeholder.empty()
+        stop_placeholder.empty()
+        st.session_state.last_fallback = entry
+        return serve_cached(entry, finish_reason="fallback")
     
-    messages.append({"role": "user", "content": prompt})
+    def render_queue_position(position: int, waited: float):
+        queue_placeholder.info(f" High demand right now: you are #{position} in the queue ({waited:.0f}s waited)")
     
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "max_tokens": max_tokens,
-        "stream": stream
-    }
+    def render_delta(delta: str, full_response: str):
+        partial["text"] = full_response
+        # Histogram only: a span would also write an event line per token
+        render_started = time.perf_counter()
+        interruptible(lambda: response_placeholder.markdown(full_response + "▌"))
+        SPAN_SECONDS.observe(time.perf_counter() - render_started, span="app.render_delta")
     
+    if stream:
+        stop_placeholder.button("⏹ Stop Generating", key="stop_generation")
+    watch_finished = start_disconnect_watch(cancel_token)
     try:
-        if stream:
-            response = requests.post(API_URL, headers=headers, json=payload, stream=True)
-            if response.status_code != 200:
-                st.error(f"API Error: {response.status_code} - {response.text}")
-                return None
-            
-            full_response = ""
-            response_placeholder = st.empty()
-            
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        line = line[6:]
-                        if line.strip() == '[DONE]':
-                            break
-                        try:
-                            chunk = json.loads(line)
-                            if 'choices' in chunk and len(chunk['choices']) > 0:
-                                delta = chunk['choices'][0].get('delta', {})
-                                content = delta.get('content', '')
-                                full_response += content
-                                response_placeholder.markdown(full_response + "▌")
-                        except json.JSONDecodeError:
-                            continue
-            
-            response_placeholder.markdown(full_response)
-            return full_response
-        else:
-            response = requests.post(API_URL, headers=headers, json=payload)
-            if response.status_code != 200:
-                st.error(f"API Error: {response.status_code} - {response.text}")
-                return None
-            
-            response_data = response.json()
-            return response_data["choices"][0]["message"]["content"].strip()
-            
+        with admission.admit(
+            st.session_state.session_id, api_key, model,
+            modifier=query_mode,
+            max_tokens=max_tokens,
+            on_wait=render_queue_position,
+            requests=len(section_payloads or [None])
+        ) as ticket:
+            queue_placeholder.empty()
+            if section_payloads:
+                # Never more section streams at once than admission granted
+                result = generate_sections(
+                    section_payloads, api_key,
+                    on_update=render_section,
+                    max_workers=ticket.streams,
+                    cancel_token=cancel_token
+                )
+            else:
+                result = chat_completion(
+                    payload, api_key,
+                    on_delta=render_delta if stream else None,
+                    monitor=monitor,
+                    cancel_token=cancel_token
+                )
+    except RateLimitExceeded as e:
+        queue_placeholder.empty()
+        st.warning(f"{Config.ERROR_MESSAGES['rate_limit']} Try again in {e.retry_after:.0f}s.")
+        return None
+    except QueueFullError:
+        queue_placeholder.empty()
+        st.warning(Config.ERROR_MESSAGES["queue_full"])
+        return None
+    except APIError as e:
+        text = serve_fallback(e)
+        if text is None:
+            st.error(str(e))
+        return text
     except Exception as e:
-        st.error(f"Error calling API: {str(e)}")
+        text = serve_fallback(e)
+        if text is None:
+            st.error(f"Error calling API: {str(e)}")
+        return text
+    except BaseException:
+        # Only session state is touched here: no st calls while interrupted
+        if cancel_token.cancelled:
+            record_cancelled(partial["text"], on_cancel)
+        raise
+    finally:
+        watch_finished.set()
+    
+    stop_placeholder.empty()
+    if result["finish_reason"] == "cancelled":
+        record_cancelled(result["content"], on_cancel)
         return None
+    if response_placeholder is not None:
+        response_placeholder.markdown(result["content"])
+    st.session_state.last_usage = result["usage"]
+    st.session_state.last_finish_reason = result["finish_reason"]
+    st.session_state.last_coalesced = result.get("coalesced", False)
+    st.session_state.cached_tokens_total += result["cached_tokens"]
+    st.session_state.early_stops += result["finish_reason"] == "early_stop"
+    return result["content"]
+
+def record_cancelled(partial_text: str, on_cancel: Optional[Callable[[str], None]]):
+    """Count a cancelled generation and hand its partial text to the caller"""
+    st.session_state.cancelled_generations += 1
+    st.session_state.cancelled_tokens_total += estimate_tokens(partial_text)
+    st.session_state.last_usage = None
+    st.session_state.last_finish_reason = "cancelled"
+    st.session_state.last_coalesced = False
+    if on_cancel and partial_text.strip():
+        on_cancel(partial_text)
+
+def serve_cached(entry: Dict, finish_reason: str = "cached") -> str:
+    """Answer from a response cache entry instead of calling the API"""
+    prefetcher.record_hit(entry)
+    st.session_state.last_usage = None
+    st.session_state.last_finish_reason = finish_reason
+    st.session_state.last_coalesced = False
+    return entry["content"]
+
+def history_context(history: List[Dict]) -> Optional[List[Dict]]:
+    """Recent turns sent with a question, or None without history"""
+    if not history:
+        return None
+    return [{"role": msg["role"], "content": msg["content"]} for msg in history[-Config.CONTEXT_WINDOW_SIZE:]]
+
+def ask_follow_up(question: str):
+    """Put a suggested follow-up in the query box and generate (button callback)"""
+    st.session_state.main_query = question
+    st.session_state.follow_up_requested = True
+
+def select_topic(topic_display: str):
+    """Switch the topic selector before the next run (button callback)"""
+    st.session_state.topic_select = topic_display
+
+@st.fragment
+def render_checklist(checklist_key: str, checklist_items: List[str]):
+    """Action checklist whose checkboxes rerun only this fragment"""
+    st.markdown("---")
+    st.markdown("###  Action Checklist")
+    
+    if checklist_key not in st.session_state.checklists:
+        st.session_state.checklists[checklist_key] = [False] * len(checklist_items)
+    
+    for idx, item in enumerate(checklist_items):
+        checked = st.checkbox(
+            item,
+            value=st.session_state.checklists[checklist_key][idx],
+            key=f"check_{checklist_key}_{idx}"
+        )
+        st.session_state.checklists[checklist_key][idx] = checked
+    
+    # Progress tracker
+    completed = sum(st.session_state.checklists[checklist_key])
+    total = len(checklist_items)
+    progress = completed / total if total > 0 else 0
+    st.progress(progress)
+    st.caption(f"Completed: {completed}/{total} tasks ({int(progress*100)}%)")
+
+@st.fragment
+def render_guidance_view():
+    """Latest guidance, rendered from session state on every run"""
+    guidance = st.session_state.current_guidance
+    if not guidance:
+        return
+    
+    st.markdown("---")
+    st.markdown(f"## 💡 Guidance on {guidance['topic_display']}")
+    if guidance.get("stopped"):
+        st.caption("⏹ Generation was stopped; showing the partial response")
+    if guidance.get("notice"):
+        st.caption(guidance["notice"])
+    st.markdown(guidance["content"])
+    
+    if guidance["checklist_items"]:
+        render_checklist(guidance["checklist_key"], guidance["checklist_items"])
+    
+    # Export Options
+    st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        markdown_export = export_to_markdown(
+            guidance["query"],
+            guidance["content"],
+            guidance["topic_display"],
+            guidance["checklist_items"]
+        )
+        st.download_button(
+            "📥 Download as Markdown",
+            markdown_export,
+            file_name=f"startup_guidance_{guidance['timestamp']}.md",
+            mime="text/markdown"
+        )
+    with col2:
+        st.download_button(
+            " Download as Text",
+            guidance["content"],
+            file_name=f"guidance_{guidance['timestamp']}.txt",
+            mime="text/plain"
+        )
+    
+    # Suggested follow-ups; ⚡ marks answers already in the response cache
+    if guidance.get("follow_ups"):
+        st.markdown("---")
+        st.markdown("###  Suggested Follow-ups")
+        for idx, (question, key) in enumerate(guidance["follow_ups"]):
+            ready = "⚡ " if response_cache.contains(key) else ""
+            if st.button(f"{ready}{question}", key=f"follow_up_{idx}", on_click=ask_follow_up, args=(question,)):
+                st.rerun()
+    
+    # Related Topics: switching topic needs a full rerun, which only
+    # re-renders the persisted guidance and does not generate
+    st.markdown("---")
+    st.markdown("###  Related Topics You Might Explore")
+    related_topics = [t for t in Config.TOPICS.keys() if t != guidance["topic_display"]][:3]
+    cols = st.columns(len(related_topics))
+    for idx, topic in enumerate(related_topics):
+        with cols[idx]:
+            if st.button(topic, key=f"related_{idx}", use_container_width=True, on_click=select_topic, args=(topic,)):
+                st.rerun()
+    
+    # Disclaimer
+    st.info("💡 **Disclaimer**: This is AI-generated general advice. Always consult with legal, financial, or domain experts for critical business decisions.")
+
+@st.fragment
+def render_history():
+    """Conversation history, independent of the guidance view"""
+    if not st.session_state.conversation_history:
+        return
+    
+    st.markdown("---")
+    st.markdown("##  Conversation History")
+    
+    with st.expander("View Previous Queries & Responses", expanded=False):
+        for idx in range(0, len(st.session_state.conversation_history), 2):
+            if idx + 1 < len(st.session_state.conversation_history):
+                user_msg = st.session_state.conversation_history[idx]
+                assistant_msg = st.session_state.conversation_history[idx + 1]
+                
+                stopped = " (stopped)" if assistant_msg.get("stopped") else ""
+                st.markdown(f"** Query ({user_msg['timestamp']}){stopped}:** {user_msg['content'][:100]}...")
+                with st.expander("View Full Response"):
+                    st.markdown(assistant_msg['content'])
+                st.markdown("---")
 
 # Sidebar Configuration
 with st.sidebar:
@@ -177,20 +413,56 @@ with st.sidebar:
     # Model Selection
     model_choice = st.selectbox(
         "Select Model",
-        options=[
-            "openai/gpt-4o-mini",
-            "openai/gpt-4o",
-            "anthropic/claude-3-5-sonnet",
-            "google/gemini-pro"
-        ],
-        help="Choose the AI model for guidance"
+        options=[AUTO_MODEL] + Config.AVAILABLE_MODELS,
+        index=1,
+        format_func=lambda m: "Auto (cost/latency-aware)" if m == AUTO_MODEL else m,
+        help=Config.HELP_TEXT["model_selection"]
     )
     
     # Response Settings
     with st.expander(" Advanced Settings"):
         enable_streaming = st.checkbox("Enable Streaming Responses", value=True)
-        max_tokens = st.slider("Max Response Length", 500, 3000, 2000, 100)
+        adaptive_length = st.checkbox(
+            "Adaptive Response Length",
+            value=Config.ADAPTIVE_LENGTH,
+            help=Config.HELP_TEXT["adaptive_length"]
+        )
+        max_tokens = st.slider(
+            "Max Response Length", 500, 3000, 2000, 100,
+            disabled=adaptive_length
+        )
+        compact_prompts = st.checkbox(
+            "Compact Prompts",
+            value=Config.COMPACT_PROMPTS,
+            help=Config.HELP_TEXT["compact_prompts"]
+        )
         include_context = st.checkbox("Include Conversation History", value=True)
+        prompt_layout = st.selectbox(
+            "Message Layout",
+            options=Config.PROMPT_LAYOUTS,
+            index=Config.PROMPT_LAYOUTS.index(Config.DEFAULT_PROMPT_LAYOUT),
+            help=Config.HELP_TEXT["prompt_layout"]
+        )
+        section_parallel = st.checkbox(
+            "Section-Parallel Generation",
+            value=Config.SECTION_PARALLEL,
+            help=Config.HELP_TEXT["section_parallel"]
+        )
+        early_stop = st.checkbox(
+            "Stop When Guide Is Complete",
+            value=Config.EARLY_STOP,
+            help=Config.HELP_TEXT["early_stop"]
+        )
+        transform_delta = st.checkbox(
+            "Quick Refine/Simplify/Expand",
+            value=Config.TRANSFORM_DELTA,
+            help=Config.HELP_TEXT["transform_delta"]
+        )
+        prefetch_follow_ups = st.checkbox(
+            "Prefetch Follow-up Answers",
+            value=Config.PREFETCH_ENABLED,
+            help=Config.HELP_TEXT["prefetch"]
+        )
     
     st.markdown("---")
     
@@ -229,6 +501,38 @@ with st.sidebar:
         st.metric("API Calls", st.session_state.api_calls_count)
     with col2:
         st.metric("Tokens Used", f"{st.session_state.total_tokens_used:,}")
+    session_cost = ledger.totals("session", st.session_state.session_id)["cost"]
+    if session_cost:
+        st.caption(f"Estimated cost this session: ${session_cost:.4f}")
+    if st.session_state.cached_tokens_total:
+        st.caption(f"Cached prompt tokens: {st.session_state.cached_tokens_total:,}")
+    if st.session_state.cancelled_generations:
+        st.caption(
+            f"Stopped generations: {st.session_state.cancelled_generations} "
+            f"(~{st.session_state.cancelled_tokens_total:,} tokens generated before stopping)"
+        )
+    if st.session_state.early_stops:
+        st.caption(f"Answers stopped early: {st.session_state.early_stops}")
+    if st.session_state.transform_tokens_saved_total:
+        st.caption(f"Prompt tokens saved by quick transforms: ~{st.session_state.transform_tokens_saved_total:,}")
+    prefetch_stats = prefetcher.stats()
+    if prefetch_stats["prefetched"]:
+        st.caption(
+            f"Prefetch (all users): {prefetch_stats['hits']:.0f}/{prefetch_stats['prefetched']:.0f} used "
+            f"({prefetch_stats['hit_rate']:.0%}), ${prefetch_stats['spend']:.4f} spent, "
+            f"${prefetch_stats['wasted']:.4f} wasted"
+        )
+    remaining_requests = admission.session_remaining(st.session_state.session_id)
+    if Config.RATE_LIMIT_REQUESTS - remaining_requests >= Config.RATE_LIMIT_WARNING_THRESHOLD:
+        st.warning(f" {remaining_requests} requests left in this session's hourly limit")
+    if admission is scheduler:
+        queue_state = scheduler.snapshot()
+        st.caption(
+            f"Queue depth: {queue_state['queue_depth']} | "
+            f"p95 wait: {max((scheduler.wait_seconds.percentile(95, **labels) for labels in scheduler.wait_seconds.label_sets()), default=0):g}s"
+        )
+    if single_flight.stats["coalesced"]:
+        st.caption(f"Shared generations (all users): {single_flight.stats['coalesced']:,}")
     
     # Clear History
     if st.button(" Clear History", use_container_width=True):
@@ -236,6 +540,31 @@ with st.sidebar:
         st.session_state.checklists = {}
         st.rerun()
     
+    # Session Export / Import
+    with st.expander(" Session Export / Import"):
+        export_extension, export_mime = export_format(Config.SESSION_EXPORT_COMPRESSION)
+        st.download_button(
+            "📥 Export Session (JSONL)",
+            export_session_bytes(
+                st.session_state.session_id,
+                st.session_state,
+                compression=Config.SESSION_EXPORT_COMPRESSION
+            ),
+            file_name=f"session_{st.session_state.session_id[:8]}{export_extension}",
+            mime=export_mime,
+            use_container_width=True
+        )
+        uploaded_session = st.file_uploader("Import Session", type=["jsonl", "gz", "zst", "zdict"])
+        if uploaded_session is not None and st.button(" Load Session", use_container_width=True):
+            try:
+                for _, imported_state in import_sessions(uploaded_session):
+                    restore_session_state(st.session_state, imported_state)
+                    st.session_state.current_guidance = None
+                    break
+                st.rerun()
+            except IMPORT_ERRORS as e:
+                st.error(f"Could not import session: {str(e)}")
+    
     # Help & Resources
     with st.expander(" Help & Resources"):
         st.markdown("""
@@ -255,15 +584,7 @@ st.markdown('<h1 class="main-header"> AI Startup Guidance Tool</h1>', unsafe_all
 st.markdown("*Get personalized, AI-powered advice to grow your startup*")
 
 # Topic Selection
-topics = {
-    " Scaling Business": "scaling",
-    " Funding & Investment": "funding",
-    " Team Setup & Hiring": "team",
-    " Legal Documents": "documents",
-    " Product Strategy": "product",
-    " Marketing & Growth": "marketing",
-    " General Advice": "general"
-}
+topics = Config.TOPICS
 
 st.markdown("###  Select Topic or Ask Anything")
 col1, col2 = st.columns([2, 1])
@@ -272,7 +593,7 @@ with col1:
     selected_topic_display = st.selectbox(
         "Choose guidance area:",
         options=list(topics.keys()),
-        index=0
+        key="topic_select"
     )
     selected_topic = topics[selected_topic_display]
 
@@ -310,7 +631,8 @@ with col4:
     expand_button = st.button(" Expand", use_container_width=True)
 
 # Process Query
-if any([generate_button, refine_button, simplify_button, expand_button]):
+follow_up_clicked = st.session_state.pop("follow_up_requested", False)
+if any([generate_button, refine_button, simplify_button, expand_button, follow_up_clicked]):
     if not user_query.strip():
         st.error(" Please enter a question to get guidance.")
     elif not or_api_token:
@@ -319,13 +641,14 @@ if any([generate_button, refine_button, simplify_button, expand_button]):
         try:
             # Determine query type
             if refine_button:
-                modifier = "\n\nProvide a more refined, detailed version of your previous response with specific examples and case studies."
+                query_mode = "refine"
             elif simplify_button:
-                modifier = "\n\nSimplify your previous response to be more concise and actionable, focusing on immediate next steps."
+                query_mode = "simplify"
             elif expand_button:
-                modifier = "\n\nExpand on your previous response with more comprehensive details, additional strategies, and deeper insights."
+                query_mode = "expand"
             else:
-                modifier = ""
+                query_mode = "generate"
+            modifier = MODIFIERS[query_mode]
             
             # Build context-aware prompt
             profile_context = ""
@@ -333,139 +656,278 @@ if any([generate_button, refine_button, simplify_button, expand_button]):
                 profile = st.session_state.startup_profile
                 profile_context = f"\n\nStartup Context: {profile.get('industry')} startup at {profile.get('stage')} stage with {profile.get('team_size')} team members."
             
-            # Get appropriate prompt template
-            prompt_template = get_prompt_template(selected_topic)
-            full_prompt = prompt_template.format(query=user_query) + profile_context + modifier
+            def route(mode: str) -> Dict:
+                """Pick a model for the auto option; the decision is logged"""
+                return router.choose(
+                    selected_topic,
+                    mode,
+                    prompt_tokens=estimate_tokens(user_query) + Config.ROUTER_PROMPT_OVERHEAD_TOKENS,
+                    max_tokens=max_tokens,
+                    session_id=st.session_state.session_id
+                )
+            
+            def follow_up_inputs() -> Tuple[str, Optional[List[Dict]]]:
+                """Modifier and context a follow-up question will be sent with"""
+                follow_up_modifier = MODIFIERS["generate"]
+                if adaptive_length:
+                    follow_up_modifier += length_instruction(
+                        length_tracker.word_target(selected_topic, "generate", request_model)
+                    )
+                follow_up_context = history_context(st.session_state.conversation_history) if include_context else None
+                return follow_up_modifier, follow_up_context
+            
+            # Transforms rewrite the last answer when there is one to rewrite
+            previous = None
+            if transform_delta and is_transform(query_mode):
+                previous = previous_answer(
+                    st.session_state.current_guidance, st.session_state.conversation_history
+                )
             
             # Prepare context from history
-            context = None
-            if include_context and st.session_state.conversation_history:
-                context = [
-                    {"role": msg["role"], "content": msg["content"]}
-                    for msg in st.session_state.conversation_history[-6:]
-                ]
+            context = history_context(st.session_state.conversation_history) if include_context else None
             
-            # Show loading state
-            with st.spinner(" Generating personalized guidance..."):
-                st.markdown("---")
-                st.markdown(f"## 💡 Guidance on {selected_topic_display}")
-                
-                # Call API
-                guidance_text = call_openrouter_api(
-                    full_prompt,
-                    or_api_token,
-                    model=model_choice,
-                    max_tokens=max_tokens,
+            # Resolve the auto model option per request. The adaptive length
+            # target depends on the model and is part of the cache key, so
+            # route before the cache lookup in that case
+            request_model = model_choice
+            decision = None
+            if previous is not None and model_choice != AUTO_MODEL:
+                request_model = transform_model(query_mode, model_choice)
+                if request_model != model_choice:
+                    st.caption(f"{query_mode.capitalize()} runs on {request_model}, the cheapest model")
+            if model_choice == AUTO_MODEL and adaptive_length:
+                decision = route(query_mode)
+                request_model = decision["model"]
+            
+            # Learned length limits replace the slider in adaptive mode
+            request_max_tokens = max_tokens
+            length_note = ""
+            if adaptive_length:
+                request_max_tokens = length_tracker.max_tokens(selected_topic, query_mode, request_model)
+                length_note = length_instruction(
+                    length_tracker.word_target(selected_topic, query_mode, request_model)
+                )
+                modifier += length_note
+            
+            # New questions may already be answered in the response cache,
+            # e.g. a follow-up the prefetcher generated in the background;
+            # a stale answer is shown now and refreshed for next time
+            cache_policy = CachedRequest(
+                st.session_state.session_id,
+                or_api_token,
+                selected_topic,
+                user_query,
+                profile_context,
+                model_choice=model_choice,
+                mode=query_mode,
+                compact=compact_prompts,
+                modifier=modifier,
+                context=context,
+                layout=prompt_layout,
+                max_tokens=request_max_tokens
+            )
+            cached = cache_policy.lookup()
+            
+            if model_choice == AUTO_MODEL and cached is None:
+                decision = decision or route(query_mode)
+                request_model = decision["model"]
+                st.caption(f"Auto-routed to {request_model} ({decision['reason']})")
+            
+            # Build messages in the selected layout
+            messages = build_guidance_messages(
+                selected_topic, user_query, profile_context, modifier, context,
+                layout=prompt_layout,
+                compact=compact_prompts
+            )
+            full_prompt = "".join(msg["content"] for msg in messages)
+            
+            # The delta path replaces the template, profile and history with
+            # the previous answer and a short instruction
+            full_path_tokens = None
+            if previous is not None:
+                full_path_tokens = estimate_tokens(full_prompt)
+                messages = build_transform_messages(query_mode, previous, user_query, profile_context, length_note)
+                full_prompt = "".join(msg["content"] for msg in messages)
+            
+            # Section-parallel mode requests every template section separately
+            section_payloads = None
+            if section_parallel and previous is None:
+                section_payloads = build_section_payloads(
+                    render_section_prompts(selected_topic, user_query, profile_context, modifier, compact_prompts),
+                    request_model,
+                    request_max_tokens,
                     stream=enable_streaming,
                     context=context
                 )
+                full_prompt = "".join(
+                    msg["content"] for _, payload in section_payloads for msg in payload["messages"]
+                )
+            
+            def save_guidance(text: str, stopped: bool = False, notice: str = ""):
+                """Price the request and persist it to history and the guidance view"""
+                # Coalesced requests were paid for by the leader, saved ones earlier
+                if not st.session_state.last_coalesced and st.session_state.last_finish_reason not in ("cached", "fallback"):
+                    ledger.record(
+                        st.session_state.session_id,
+                        selected_topic,
+                        request_model,
+                        st.session_state.last_usage,
+                        prompt_text=full_prompt,
+                        response_text=text,
+                        kind=query_mode
+                    )
+                
+                # Sessions share one copy of each distinct answer and refer to it by digest
+                body = blob_store.intern(text)
+                
+                # Save to history
+                st.session_state.conversation_history.append({
+                    "role": "user",
+                    "content": user_query,
+                    "topic": selected_topic,
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+                st.session_state.conversation_history.append({
+                    "role": "assistant",
+                    "content": body,
+                    "content_hash": body.digest,
+                    "topic": selected_topic,
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "stopped": stopped
+                })
+                
+                # Persist the current guidance so later reruns keep showing it
+                follow_up_modifier, follow_up_context = follow_up_inputs()
+                st.session_state.current_guidance = {
+                    "query": user_query,
+                    "content": body,
+                    "content_hash": body.digest,
+                    "topic": selected_topic,
+                    "topic_display": selected_topic_display,
+                    "checklist_key": body.digest[:16],
+                    "checklist_items": blob_store.checklist_items(body),
+                    "follow_ups": [
+                        (question, cache_key(
+                            selected_topic, question, profile_context, model_choice, "generate", compact_prompts,
+                            follow_up_modifier, follow_up_context
+                        ))
+                        for question in suggest_follow_up_questions(selected_topic, user_query)
+                    ],
+                    "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+                    "stopped": stopped,
+                    "notice": notice
+                }
+            
+            # Stream into a temporary area; the persisted guidance view below
+            # takes over once the response is stored in session state
+            live_view = st.empty()
+            with live_view.container(), st.spinner(" Generating personalized guidance..."):
+                st.markdown("---")
+                st.markdown(f"## 💡 Guidance on {selected_topic_display}")
                 
-                if guidance_text:
+                # Call API; a stopped generation keeps its partial text
+                request_started = time.perf_counter()
+                if cached is not None:
+                    guidance_text = serve_cached(cached)
+                else:
+                    guidance_text = call_openrouter_api(
+                        messages,
+                        or_api_token,
+                        model=request_model,
+                        max_tokens=request_max_tokens,
+                        stream=enable_streaming,
+                        query_mode=query_mode,
+                        section_payloads=section_payloads,
+                        monitor=build_stream_monitor(selected_topic, compact_prompts, query_mode) if early_stop else None,
+                        on_cancel=lambda text: save_guidance(text, stopped=True),
+                        fallback=cache_policy.fallback
+                    )
+            
+            if guidance_text:
+                live_view.empty()
+                
+                if is_transform(query_mode):
+                    st.session_state.transform_tokens_saved_total += record_transform(
+                        query_mode,
+                        "delta" if previous is not None else "full",
+                        full_prompt,
+                        time.perf_counter() - request_started,
+                        full_prompt_tokens=full_path_tokens
+                    )
+                
+                notice = ""
+                if st.session_state.last_finish_reason == "fallback":
+                    fallback_entry = st.session_state.last_fallback
+                    saved_at = format_timestamp(datetime.fromtimestamp(fallback_entry["created"])).lower()
+                    notice = (
+                        f"📴 OpenRouter is unavailable right now. This is a saved answer ({saved_at}) "
+                        f"to a similar question: \"{fallback_entry['query']}\""
+                    )
+                elif cached is not None and cached["stale"]:
+                    saved_at = format_timestamp(datetime.fromtimestamp(cached["created"])).lower()
+                    notice = f"⏳ Saved answer from {saved_at}; a fresh one is being generated for next time"
+                elif cached is not None:
+                    notice = "⚡ Served instantly from the response cache"
+                
+                if not notice:
                     # Update stats
                     st.session_state.api_calls_count += 1
-                    st.session_state.total_tokens_used += estimate_tokens(full_prompt + guidance_text)
+                    usage = st.session_state.last_usage
+                    if usage and usage.get("total_tokens"):
+                        st.session_state.total_tokens_used += usage["total_tokens"]
+                    else:
+                        st.session_state.total_tokens_used += estimate_tokens(full_prompt + guidance_text)
                     
-                    # Save to history
-                    st.session_state.conversation_history.append({
-                        "role": "user",
-                        "content": user_query,
-                        "topic": selected_topic,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    st.session_state.conversation_history.append({
-                        "role": "assistant",
-                        "content": guidance_text,
-                        "topic": selected_topic,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    
-                    # Extract and display checklist if applicable
-                    checklist_items = extract_checklist_items(guidance_text)
-                    if checklist_items:
-                        st.markdown("---")
-                        st.markdown("###  Action Checklist")
-                        checklist_key = f"{selected_topic}_{len(st.session_state.conversation_history)}"
-                        
-                        if checklist_key not in st.session_state.checklists:
-                            st.session_state.checklists[checklist_key] = [False] * len(checklist_items)
-                        
-                        for idx, item in enumerate(checklist_items):
-                            checked = st.checkbox(
-                                item,
-                                value=st.session_state.checklists[checklist_key][idx],
-                                key=f"check_{checklist_key}_{idx}"
-                            )
-                            st.session_state.checklists[checklist_key][idx] = checked
-                        
-                        # Progress tracker
-                        completed = sum(st.session_state.checklists[checklist_key])
-                        total = len(checklist_items)
-                        progress = completed / total if total > 0 else 0
-                        st.progress(progress)
-                        st.caption(f"Completed: {completed}/{total} tasks ({int(progress*100)}%)")
-                    
-                    # Export Options
-                    st.markdown("---")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        markdown_export = export_to_markdown(
-                            user_query,
-                            guidance_text,
-                            selected_topic_display,
-                            checklist_items
-                        )
-                        st.download_button(
-                            "📥 Download as Markdown",
-                            markdown_export,
-                            file_name=f"startup_guidance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
-                            mime="text/markdown"
-                        )
-                    with col2:
-                        st.download_button(
-                            " Download as Text",
-                            guidance_text,
-                            file_name=f"guidance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                            mime="text/plain"
+                    # Feed the observed output length back to the adaptive tracker;
+                    # only provider-reported counts, not estimates
+                    if usage and usage.get("completion_tokens") and not usage.get("estimated"):
+                        length_tracker.record(
+                            selected_topic,
+                            query_mode,
+                            request_model,
+                            usage["completion_tokens"],
+                            truncated=st.session_state.last_finish_reason == "length",
+                            max_tokens=request_max_tokens
                         )
                     
-                    # Related Topics
-                    st.markdown("---")
-                    st.markdown("###  Related Topics You Might Explore")
-                    related_topics = [t for t in topics.keys() if t != selected_topic_display][:3]
-                    cols = st.columns(len(related_topics))
-                    for idx, topic in enumerate(related_topics):
-                        with cols[idx]:
-                            st.button(topic, key=f"related_{idx}", use_container_width=True)
-                    
-                    # Disclaimer
-                    st.info("💡 **Disclaimer**: This is AI-generated general advice. Always consult with legal, financial, or domain experts for critical business decisions.")
+                    # Complete new answers are reusable by later identical questions
+                    cache_policy.store(guidance_text, st.session_state.last_finish_reason, request_model)
+                
+                save_guidance(guidance_text, notice=notice)
+                if st.session_state.last_finish_reason == "incomplete":
+                    st.warning("The connection dropped repeatedly, so this guide may end early. Try generating again.")
+                
+                # Speculatively answer the likely follow-ups while the user reads,
+                # unless other users are already queueing for capacity
+                if prefetch_follow_ups and not admission.queue_depth():
+                    follow_up_modifier, follow_up_context = follow_up_inputs()
+                    prefetcher.schedule(
+                        st.session_state.session_id,
+                        or_api_token,
+                        selected_topic,
+                        user_query,
+                        profile_context,
+                        model_choice=model_choice,
+                        model=request_model if cached is None else cached["model"],
+                        layout=prompt_layout,
+                        compact=compact_prompts,
+                        modifier=follow_up_modifier,
+                        context=follow_up_context
+                    )
+            elif st.session_state.last_finish_reason == "cancelled":
+                live_view.empty()
         
         except Exception as e:
             st.error(f" Error: {str(e)}")
             with st.expander("🐛 Debug Information"):
                 st.code(str(e))
 
-# Conversation History
-if st.session_state.conversation_history:
-    st.markdown("---")
-    st.markdown("##  Conversation History")
-    
-    with st.expander("View Previous Queries & Responses", expanded=False):
-        for idx in range(0, len(st.session_state.conversation_history), 2):
-            if idx + 1 < len(st.session_state.conversation_history):
-                user_msg = st.session_state.conversation_history[idx]
-                assistant_msg = st.session_state.conversation_history[idx + 1]
-                
-                st.markdown(f"** Query ({user_msg['timestamp']}):** {user_msg['content'][:100]}...")
-                with st.expander("View Full Response"):
-                    st.markdown(assistant_msg['content'])
-                st.markdown("---")
+# Current guidance, checklist and history are fragments: interacting with
+# them reruns only the fragment, never the generation flow above
+render_guidance_view()
+render_history()
 
 # Footer
 st.markdown("---")
-st.markdown("""
-<div style='text-align: center; color: #666; padding: 2rem;'>
-    <p>Built with ❤️ by SitaRaman | Powered by OpenRouter AI</p>
-    <p style='font-size: 0.8rem;'>🌟 Star this project | 📧 Contact for feedback</p>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
+SPAN_SECONDS.observe(time.perf_counter() - _run_started, span="app.script_run")
@@ -0,0 +1,82 @@
+"""
+Per-session memory with and without the content-addressed blob store
+
+Simulates many sessions that each view the same popular cached answers.
+Every session receives its own copy of each answer text (as after a JSON
+import or a separate stream) plus its own extracted checklist. The
+baseline keeps those copies; the blob store run interns them, so all
+sessions share one body and one checklist per distinct answer. Reports
+traced memory per session for both.
+
+    python benchmarks/bench_blobs.py
+    python benchmarks/bench_blobs.py --sessions 2000 --answers 20 --views 10
+"""
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import realistic_response  # noqa: E402
+from blobs import BlobStore  # noqa: E402
+from utils import extract_checklist_items  # noqa: E402
+
+
+def build_sessions(args, answers: List[str], store_answer: Callable[[str], Dict]) -> List[List[Dict]]:
+    rng = random.Random(args.seed)
+    sessions = []
+    for _ in range(args.sessions):
+        history = []
+        for _ in range(args.views):
+            # A fresh str object per view, as a separately received copy would be
+            text = "".join(list(rng.choice(answers)))
+            history.append(store_answer(text))
+        sessions.append(history)
+    return sessions
+
+
+def measure(args, answers: List[str], store_answer: Callable[[str], Dict]) -> float:
+    """
+    Traced bytes held per session after building all sessions
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build_sessions(args, answers, store_answer)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del sessions
+    return held / args.sessions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--answers", type=int, default=20, help="distinct popular answers")
+    parser.add_argument("--views", type=int, default=6, help="answers viewed per session")
+    parser.add_argument("--answer-bytes", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    answers = [realistic_response(args.answer_bytes, seed) for seed in range(args.answers)]
+
+    def copied(text: str) -> Dict:
+        return {"role": "assistant", "content": text, "checklist_items": extract_checklist_items(text)}
+
+    store = BlobStore()
+
+    def interned(text: str) -> Dict:
+        body = store.intern(text)
+        return {
+            "role": "assistant", "content": body, "content_hash": body.digest,
+            "checklist_items": store.checklist_items(body)
+        }
+
+    baseline = measure(args, answers, copied)
+    shared = measure(args, answers, interned)
+    print(f"sessions {args.sessions}, {args.views} views each over {args.answers} distinct answers of ~{args.answer_bytes} B")
+    print(f"{'copies per session':<24}{baseline / 1024:>10.1f} KB/session")
+    print(f"{'blob store':<24}{shared / 1024:>10.1f} KB/session")
+    print(f"{'reduction':<24}{(1 - shared / baseline) * 100:>10.1f} %")
@@ -0,0 +1,135 @@
+"""
+Dictionary-trained compression vs plain zlib: ratio and decode speed
+
+Generates per-topic answers that follow each prompt template's section
+structure, trains a dictionary per topic on one half, and compresses the
+other half three ways: plain zlib at the same level, with the seed
+dictionary built from the prompt template, and with the trained
+dictionary. Reports compression ratio by answer size and decode time per
+answer, plus a session export with gzip vs zdict.
+
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --answers 400 --dict-bytes 8192
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compression  # noqa: E402
+from bench_utils import SENTENCES  # noqa: E402
+from config import Config  # noqa: E402
+from prompts import PROMPT_TEMPLATES  # noqa: E402
+from session_io import export_session_bytes, import_sessions  # noqa: E402
+
+SIZES = [500, 1500, 4000, 10000]
+CLOSING = (
+    "\n---\n*This guidance is general information, not legal, tax or financial advice. "
+    "Validate key decisions with a qualified professional.*\n"
+)
+
+
+def topic_response(topic: str, target_bytes: int, rng: random.Random) -> str:
+    """
+    Answer with topic's headings, list scaffolding and closing disclaimer
+    """
+    headings = [line for line in PROMPT_TEMPLATES[topic].splitlines() if line.startswith("## ")]
+    parts: List[str] = []
+    size = 0
+    for heading in headings * 4:
+        block = [heading, rng.choice(SENTENCES)]
+        for idx in range(rng.randint(2, 5)):
+            marker = f"{idx + 1}." if rng.random() < 0.5 else "-"
+            block.append(f"{marker} **{rng.choice(['Action', 'Timeline', 'Owner', 'Metric'])}**: {rng.choice(SENTENCES)}")
+        text = "\n".join(block) + "\n\n"
+        if size + len(text) > target_bytes:
+            break
+        parts.append(text)
+        size += len(text)
+    return "".join(parts) + CLOSING
+
+
+def measure(texts: List[str], encode: Callable[[str], bytes], decode: Callable[[bytes], str]) -> Tuple[float, float]:
+    """
+    Compression ratio (raw / compressed) and microseconds per decode
+    """
+    blobs = [encode(text) for text in texts]
+    start = time.perf_counter()
+    for blob, text in zip(blobs, texts):
+        assert decode(blob) == text
+    seconds = (time.perf_counter() - start) / len(texts)
+    return sum(len(text.encode("utf-8")) for text in texts) / sum(len(blob) for blob in blobs), seconds * 1e6
+
+
+def plain_zlib(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), Config.COMPRESSION_LEVEL)
+
+
+def plain_unzlib(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--answers", type=int, default=200, help="answers per topic and size, half used for training")
+    parser.add_argument("--dict-bytes", type=int, default=Config.COMPRESSION_DICT_BYTES)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus: Dict[str, Dict[int, List[str]]] = {
+        topic: {size: [topic_response(topic, size, rng) for _ in range(args.answers)] for size in SIZES}
+        for topic in PROMPT_TEMPLATES
+    }
+    # In-memory dictionaries, trained explicitly below
+    compression.dictionaries = compression.DictionaryRegistry(directory="", size=args.dict_bytes, train_after=10 ** 9)
+
+    results: Dict[str, Dict[int, Tuple[float, float]]] = {"zlib": {}, "seed dictionary": {}, "trained dictionary": {}}
+    for size in SIZES:
+        held_out = [(topic, text) for topic in corpus for text in corpus[topic][size][args.answers // 2:]]
+        texts = [text for _, text in held_out]
+        results["zlib"][size] = measure(texts, plain_zlib, plain_unzlib)
+        topics = iter([topic for topic, _ in held_out])
+        results["seed dictionary"][size] = measure(
+            texts, lambda text: compression.compress(text, next(topics), learn=False), compression.decompress
+        )
+
+    for topic in corpus:
+        compression.dictionaries.train(
+            topic, [text for size in SIZES for text in corpus[topic][size][:args.answers // 2]]
+        )
+    for size in SIZES:
+        held_out = [(topic, text) for topic in corpus for text in corpus[topic][size][args.answers // 2:]]
+        topics = iter([topic for topic, _ in held_out])
+        results["trained dictionary"][size] = measure(
+            [text for _, text in held_out],
+            lambda text: compression.compress(text, next(topics), learn=False),
+            compression.decompress
+        )
+
+    print(f"{len(PROMPT_TEMPLATES)} topics, {args.answers // 2} held-out answers per topic and size, "
+          f"{args.dict_bytes // 1024} KB dictionaries, level {Config.COMPRESSION_LEVEL}")
+    print(f"{'':<20}" + "".join(f"{f'{size} B ratio':>14}" for size in SIZES) + f"{'decode 4 KB':>14}")
+    for name, by_size in results.items():
+        print(f"{name:<20}" + "".join(f"{by_size[size][0]:>13.2f}x" for size in SIZES)
+              + f"{by_size[4000][1]:>11.1f} us")
+
+    all_samples = [text for topic in corpus for size in SIZES for text in corpus[topic][size][:args.answers // 2]]
+    compression.dictionaries.train(compression.ALL_TOPICS, all_samples)
+    history = []
+    for topic in corpus:
+        history.append({"role": "user", "content": f"How do I handle {topic}?", "topic": topic, "timestamp": "2026-01-01"})
+        history.append({"role": "assistant", "content": corpus[topic][1500][-1], "topic": topic, "timestamp": "2026-01-01"})
+    state = {"startup_profile": {"stage": "Seed"}, "conversation_history": history, "checklists": {}}
+    gzip_bytes = export_session_bytes("bench", state, "gzip")
+    zdict_bytes = export_session_bytes("bench", state, "zdict")
+    restored = next(import_sessions(io.BytesIO(zdict_bytes)))[1]
+    assert [msg["content"] for msg in restored["conversation_history"]] == [msg["content"] for msg in history]
+    print(f"session export ({len(history)} turns): gzip {len(gzip_bytes):,} B, zdict {len(zdict_bytes):,} B "
+          f"({(1 - len(zdict_bytes) / len(gzip_bytes)) * 100:.0f}% smaller)")
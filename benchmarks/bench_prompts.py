@@ -0,0 +1,56 @@
+"""
+Render micro-benchmark for prompt templates
+
+Compares the original per-request path (rebuild the topic dict, str.format
+the template, concatenate profile context and modifier) against
+render_prompt with precompiled templates.
+
+    python benchmarks/bench_prompts.py --number 200000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts  # noqa: E402
+
+QUERY = "How do I scale my SaaS from 100 to 1000 users while keeping support quality high?"
+PROFILE = "\n\nStartup Context: SaaS startup at MVP stage with 2-5 team members."
+MODIFIER = "\n\nExpand on your previous response with more comprehensive details, additional strategies, and deeper insights."
+
+
+def legacy_render(topic: str) -> str:
+    templates = {
+        "scaling": prompts.SCALING_PROMPT,
+        "funding": prompts.FUNDING_PROMPT,
+        "team": prompts.TEAM_SETUP_PROMPT,
+        "documents": prompts.DOCUMENTS_PROMPT,
+        "product": prompts.PRODUCT_PROMPT,
+        "marketing": prompts.MARKETING_PROMPT,
+        "general": prompts.GENERAL_PROMPT
+    }
+    return templates.get(topic, prompts.GENERAL_PROMPT).format(query=QUERY) + PROFILE + MODIFIER
+
+
+def compiled_render(topic: str) -> str:
+    return prompts.render_prompt(topic, QUERY, PROFILE, MODIFIER)
+
+
+def run(number: int) -> None:
+    print(f"{'topic':<12}{'legacy us':>12}{'compiled us':>14}{'speedup':>10}")
+    for topic in prompts.PROMPT_TEMPLATES:
+        assert legacy_render(topic) == compiled_render(topic)
+        legacy = min(timeit.repeat(lambda: legacy_render(topic), number=number, repeat=5))
+        compiled = min(timeit.repeat(lambda: compiled_render(topic), number=number, repeat=5))
+        print(
+            f"{topic:<12}{legacy / number * 1e6:>12.3f}{compiled / number * 1e6:>14.3f}"
+            f"{legacy / compiled:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=200_000)
+    run(parser.parse_args().number)
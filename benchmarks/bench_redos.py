@@ -0,0 +1,102 @@
+"""
+Linear-time check for the utils analyzers
+
+Runs every regex-backed analyzer on adversarial and randomly fuzzed inputs
+at sizes n, 2n, 4n and 8n and estimates the growth exponent as the
+log-log slope of time against size. Linear matching gives about 1.0;
+anything above --max-exponent, or slower than --max-us-per-kb, fails the
+run.
+
+    python benchmarks/bench_redos.py
+    python benchmarks/bench_redos.py --size 8192 --fuzz-cases 20
+"""
+import argparse
+import math
+import os
+import random
+import sys
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import adversarial_inputs, time_call  # noqa: E402
+import utils  # noqa: E402
+
+FUNCTIONS: Dict[str, Callable[[str], object]] = {
+    "extract_checklist_items": utils.extract_checklist_items,
+    "extract_metrics_from_response": utils.extract_metrics_from_response,
+    "parse_timeline": utils.parse_timeline,
+    "score_response_quality": utils.score_response_quality,
+    "analyze_sentiment": utils.analyze_sentiment,
+    "format_markdown_response": utils.format_markdown_response,
+}
+
+# Fragments of every pattern in utils, recombined at random
+FUZZ_TOKENS = [
+    "Week", "Month", " ", "  ", "\t", "\n", "rate", "x" * 40, "x" * 300, "1", "12", "123456", "-", ".", ":",
+    "*", "**", "`", "[ ]", "[x]", "#", "## ", "CAC", "Churn", "%", "months", "Build", "the", "1. ", "- "
+]
+
+
+def fuzz_input(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    # Repeat a short random phrase so that larger sizes stay equally adversarial
+    phrase = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(3, 12)))
+    return (phrase * (size // len(phrase) + 1))[:size]
+
+
+def growth(func: Callable[[str], object], make: Callable[[int], str], size: int, samples: int) -> Dict[str, float]:
+    """
+    Best-of timings at n..8n and the least-squares log-log slope
+    """
+    factors = (1, 2, 4, 8)
+    # The minimum is the least noisy estimate of the actual matching cost
+    timings = {factor: min(time_call(func, make(size * factor), samples, budget=0.5)) for factor in factors}
+    xs = [math.log2(factor) for factor in factors]
+    ys = [math.log2(max(timings[factor], 1e-9)) for factor in factors]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    exponent = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum((x - x_mean) ** 2 for x in xs)
+    return {
+        "exponent": exponent,
+        "us_per_kb": timings[8] * 1e6 / (size * 8 / 1024),
+        "largest_ms": timings[8] * 1000
+    }
+
+
+def run(args) -> int:
+    cases: Dict[str, Callable[[int], str]] = {
+        f"adversarial_{name}": (lambda n, name=name: adversarial_inputs(n)[name])
+        for name in adversarial_inputs(64)
+    }
+    for seed in range(args.fuzz_cases):
+        cases[f"fuzz_{seed}"] = lambda n, seed=seed: fuzz_input(n, seed)
+
+    failures: List[str] = []
+    print(f"{'function':<32}{'case':<28}{'exponent':>10}{'us/KB':>10}{'8n ms':>10}")
+    for func_name, func in FUNCTIONS.items():
+        for case_name, make in cases.items():
+            result = growth(func, make, args.size, args.samples)
+            flag = ""
+            # Sub-millisecond timings are too noisy to judge growth from
+            if result["exponent"] > args.max_exponent and result["largest_ms"] > 1.0:
+                flag = "  SUPERLINEAR"
+            elif result["us_per_kb"] > args.max_us_per_kb:
+                flag = "  SLOW"
+            if flag:
+                failures.append(f"{func_name}/{case_name}")
+            print(
+                f"{func_name:<32}{case_name:<28}{result['exponent']:>10.2f}"
+                f"{result['us_per_kb']:>10.1f}{result['largest_ms']:>10.2f}{flag}"
+            )
+    print(f"\n{len(failures)} failing case(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=4096, help="smallest input size n in characters")
+    parser.add_argument("--samples", type=int, default=7, help="timings per size")
+    parser.add_argument("--fuzz-cases", type=int, default=12, help="random fuzz inputs per function")
+    parser.add_argument("--max-exponent", type=float, default=1.5)
+    parser.add_argument("--max-us-per-kb", type=float, default=500.0, help="time budget per KB of input")
+    sys.exit(run(parser.parse_args()))
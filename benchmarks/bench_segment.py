@@ -0,0 +1,154 @@
+"""
+Shared memory-mapped cache segment: lookups across worker processes, recovery and compaction
+
+Fills a segment file with realistic answers and their analysis, then has
+several worker processes look them up at random. Compares a lookup (a view
+into the mapping, plus decoding the text) with what a worker without the
+shared tier does to get the same data from a JSON snapshot: load the file
+and re-run the checklist, metrics and timeline analysers. Also checks that
+a torn append is truncated on reopen and that compaction keeps only the
+newest record per key; exits 1 if either check fails.
+
+    python benchmarks/bench_segment.py
+    python benchmarks/bench_segment.py --answers 2000 --workers 8 --lookups 20000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import realistic_response  # noqa: E402
+from segment import RECORD, CacheSegment, encode_record  # noqa: E402
+from utils import extract_checklist_items, extract_metrics_from_response, parse_timeline  # noqa: E402
+
+
+def analysis(text: str) -> Dict:
+    return {
+        "checklist": extract_checklist_items(text),
+        "metrics": extract_metrics_from_response(text),
+        "timeline": parse_timeline(text)
+    }
+
+
+def worker(path: str, keys: List[str], lookups: int, seed: int) -> Tuple[float, float, int]:
+    """
+    Seconds for lookups (views only), seconds for lookups with text and
+    analysis decoded, and the number of misses
+    """
+    rng = random.Random(seed)
+    sample = [rng.choice(keys) for _ in range(lookups)]
+    segment = CacheSegment(path)
+    misses = 0
+    start = time.perf_counter()
+    for key in sample:
+        misses += segment.get(key) is None
+    views = time.perf_counter() - start
+    start = time.perf_counter()
+    for key in sample:
+        entry = segment.get(key)
+        entry.text()
+        entry.analysis()
+    decoded = time.perf_counter() - start
+    segment.close()
+    return views, decoded, misses
+
+
+def check_recovery(path: str, keys: List[str]) -> bool:
+    """
+    Simulate a crash halfway through an append and reopen
+    """
+    size = os.path.getsize(path)
+    torn = encode_record("torn", "x" * 5000, {})
+    with open(path, "ab") as handle:
+        handle.write(torn[:RECORD.size + 100])
+    segment = CacheSegment(path)
+    ok = os.path.getsize(path) == size and segment.get("torn") is None
+    ok = ok and all(segment.get(key) is not None for key in keys)
+    segment.close()
+    return ok
+
+
+def check_compaction(path: str, keys: List[str]) -> Tuple[bool, int, int]:
+    """
+    Rewrite every key once more, compact, and verify the newest bodies survive
+    """
+    segment = CacheSegment(path)
+    for key in keys:
+        segment.put(key, "updated " + key, {})
+    before = os.path.getsize(path)
+    segment.compact()
+    after = os.path.getsize(path)
+    ok = all(segment.get(key, verify=True).text() == "updated " + key for key in keys)
+    ok = ok and segment.stats()["records"] == len(keys)
+    segment.close()
+    return ok, before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--answers", type=int, default=500)
+    parser.add_argument("--answer-bytes", type=int, default=4000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=5000, help="lookups per worker")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="segment-bench-")
+    path = os.path.join(directory, "responses.seg")
+    texts = [realistic_response(args.answer_bytes, seed) for seed in range(args.answers)]
+    keys = [f"answer-{index:06d}" for index in range(args.answers)]
+
+    segment = CacheSegment(path, fsync=False)
+    start = time.perf_counter()
+    for key, text in zip(keys, texts):
+        segment.put(key, text, analysis(text))
+    fill = time.perf_counter() - start
+    stats = segment.stats()
+    segment.close()
+
+    snapshot = os.path.join(directory, "responses.json")
+    with open(snapshot, "w", encoding="utf-8") as handle:
+        json.dump(dict(zip(keys, texts)), handle)
+
+    rng = random.Random(args.seed)
+    sample = [rng.randrange(args.answers) for _ in range(min(args.lookups, 500))]
+    start = time.perf_counter()
+    with open(snapshot, encoding="utf-8") as handle:
+        loaded = json.load(handle)
+    snapshot_load = time.perf_counter() - start
+    start = time.perf_counter()
+    for index in sample:
+        analysis(loaded[keys[index]])
+    reanalyse = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.starmap(
+            worker, [(path, keys, args.lookups, args.seed + index) for index in range(args.workers)]
+        )
+    wall = time.perf_counter() - start
+    lookups = args.workers * args.lookups
+    views = sum(result[0] for result in results) / lookups
+    decoded = sum(result[1] for result in results) / lookups
+    misses = sum(result[2] for result in results)
+
+    print(f"segment: {stats['live']} answers of ~{args.answer_bytes} B, {stats['slots']} index slots, "
+          f"{stats['bytes'] / 1024:.0f} KB, filled in {fill * 1000:.0f} ms")
+    print(f"{'lookup (view)':<34}{views * 1e6:>10.1f} us")
+    print(f"{'lookup + text + analysis':<34}{decoded * 1e6:>10.1f} us")
+    print(f"{'JSON snapshot load per worker':<34}{snapshot_load * 1e6:>10.1f} us")
+    print(f"{'re-analysing an answer':<34}{reanalyse * 1e6:>10.1f} us")
+    print(f"{args.workers} workers x {args.lookups} lookups in {wall:.2f} s, {misses} misses")
+
+    recovered = check_recovery(path, keys)
+    compacted, before, after = check_compaction(path, keys)
+    print(f"{'torn append recovered':<34}{'ok' if recovered else 'FAILED':>10}")
+    print(f"{'compaction':<34}{'ok' if compacted else 'FAILED':>10}  {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+    sys.exit(0 if recovered and compacted and misses == 0 else 1)
@@ -0,0 +1,99 @@
+"""
+Throughput benchmark for bulk session export/import
+
+Generates a synthetic dataset (1M turns by default), streams it through
+export_sessions for each available compression, reads it back with
+import_sessions and reports records/sec and MB/sec.
+
+    python benchmarks/bench_session_io.py --turns 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_io import export_sessions, import_sessions, zstandard  # noqa: E402
+
+TOPICS = ["scaling", "funding", "team", "documents", "product", "marketing", "general"]
+
+PARAGRAPHS = [
+    "## Overview\nScaling from 100 to 1,000 users requires investment in onboarding and support.",
+    "## Actionable Steps\n1. Audit your onboarding funnel (Week 1-2)\n2. Automate support triage (Month 1)",
+    "## Key Metrics to Track\n- CAC: keep under $150\n- Churn rate: below 3% monthly",
+    "## Quick Wins (30-Day Focus)\n- Launch a referral program\n- Publish two case studies",
+]
+
+
+def synthetic_sessions(total_turns: int, turns_per_session: int = 20, seed: int = 7):
+    """
+    Yield (session_id, state) pairs until total_turns turns have been produced
+    """
+    rng = random.Random(seed)
+    produced = 0
+    session_no = 0
+    while produced < total_turns:
+        count = min(turns_per_session, total_turns - produced)
+        history = []
+        for idx in range(count):
+            topic = rng.choice(TOPICS)
+            if idx % 2 == 0:
+                content = f"How should a {topic} startup approach question {idx}?"
+                role = "user"
+            else:
+                content = "\n\n".join(rng.sample(PARAGRAPHS, 3))
+                role = "assistant"
+            history.append({
+                "role": role,
+                "content": content,
+                "topic": topic,
+                "timestamp": "2025-11-09 11:48:57"
+            })
+        yield f"s{session_no:08d}", {
+            "startup_profile": {"industry": "SaaS", "stage": "MVP", "team_size": "2-5"},
+            "conversation_history": history,
+            "checklists": {f"{history[0]['topic']}_{count}": [False, True, False]}
+        }
+        produced += count
+        session_no += 1
+
+
+def run(total_turns: int) -> None:
+    compressions = ["none", "gzip"] + (["zstd"] if zstandard is not None else [])
+    print(f"Synthetic dataset: {total_turns:,} turns")
+    print(f"{'compression':<12}{'records':>12}{'size MB':>10}{'write rec/s':>14}{'read rec/s':>14}{'write MB/s':>12}")
+
+    for compression in compressions:
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            path = tmp.name
+        try:
+            start = time.perf_counter()
+            with open(path, "wb") as fh:
+                records = export_sessions(synthetic_sessions(total_turns), fh, compression)
+            write_s = time.perf_counter() - start
+            size_mb = os.path.getsize(path) / 1e6
+
+            start = time.perf_counter()
+            turns = 0
+            with open(path, "rb") as fh:
+                for _, state in import_sessions(fh):
+                    turns += len(state["conversation_history"])
+            read_s = time.perf_counter() - start
+            assert turns == total_turns, f"round-trip lost turns: {turns} != {total_turns}"
+
+            print(
+                f"{compression:<12}{records:>12,}{size_mb:>10.1f}"
+                f"{records / write_s:>14,.0f}{records / read_s:>14,.0f}"
+                f"{size_mb / write_s:>12.1f}"
+            )
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    run(parser.parse_args().turns)
@@ -0,0 +1,114 @@
+"""
+Startup and rerun timing for the Streamlit app
+
+Measures three things against targets:
+  * cold import of the app's own modules in a fresh interpreter, and
+    whether heavy dependencies (requests, http.server) stay unloaded
+  * first paint: the first full script run of app.py (needs streamlit)
+  * interaction rerun: the script run after toggling a sidebar checkbox
+
+First paint and reruns use streamlit.testing.v1.AppTest and are skipped
+when streamlit is not installed.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --rerun-target-ms 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_utils import median  # noqa: E402
+
+APP_MODULES = [
+    "config", "styles", "prompts", "utils", "metrics", "api", "ratelimit",
+    "scheduler", "adaptive", "costs", "router", "session_io", "sections", "transforms",
+    "cache", "prefetch", "blobs", "segment", "compression"
+]
+LAZY_MODULES = ["requests", "http.server"]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def measure_imports(runs: int) -> dict:
+    """
+    Median wall time to import the app modules in a fresh interpreter
+    """
+    script = IMPORT_SCRIPT.format(modules=", ".join(APP_MODULES), lazy=LAZY_MODULES)
+    timings: List[float] = []
+    loaded = ""
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ""
+    return {"median_ms": median(timings) * 1000, "eagerly_loaded": loaded}
+
+
+def measure_app(runs: int, timeout: float) -> dict:
+    """
+    First paint and checkbox-toggle rerun times via AppTest
+    """
+    from streamlit.testing.v1 import AppTest
+
+    first_paint: List[float] = []
+    reruns: List[float] = []
+    for _ in range(runs):
+        app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+        start = time.perf_counter()
+        app.run()
+        first_paint.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(f"app.py raised: {app.exception[0].message}")
+
+        checkbox = app.sidebar.checkbox[0]
+        start = time.perf_counter()
+        checkbox.set_value(not checkbox.value).run()
+        reruns.append(time.perf_counter() - start)
+    return {"first_paint_ms": median(first_paint) * 1000, "rerun_ms": median(reruns) * 1000}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--import-target-ms", type=float, default=100.0)
+    parser.add_argument("--first-paint-target-ms", type=float, default=1500.0)
+    parser.add_argument("--rerun-target-ms", type=float, default=250.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="AppTest script timeout in seconds")
+    args = parser.parse_args()
+
+    failures = 0
+    imports = measure_imports(args.runs)
+    ok = imports["median_ms"] <= args.import_target_ms and not imports["eagerly_loaded"]
+    failures += not ok
+    print(f"{'module import':<20}{imports['median_ms']:>10.1f} ms  target {args.import_target_ms:.0f} ms  {'ok' if ok else 'MISSED'}")
+    if imports["eagerly_loaded"]:
+        print(f"  loaded at import time but expected lazy: {imports['eagerly_loaded']}")
+
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        print("streamlit not installed: skipping first paint and rerun timings")
+    else:
+        app = measure_app(args.runs, args.timeout)
+        for name, value, target in (
+            ("first paint", app["first_paint_ms"], args.first_paint_target_ms),
+            ("rerun (toggle)", app["rerun_ms"], args.rerun_target_ms)
+        ):
+            ok = value <= target
+            failures += not ok
+            print(f"{name:<20}{value:>10.1f} ms  target {target:.0f} ms  {'ok' if ok else 'MISSED'}")
+
+    sys.exit(1 if failures else 0)
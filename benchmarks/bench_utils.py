@@ -0,0 +1,220 @@
+"""
+Benchmark suite for the utils text-processing hot paths
+
+Times every per-response analyzer over a reproducible corpus of realistic
+responses (1 KB to 100 KB) plus adversarial regex inputs, saves results as
+a baseline and compares later runs against it with a Mann-Whitney U test,
+so slowdowns are caught before deploy.
+
+    python benchmarks/bench_utils.py --save-baseline
+    python benchmarks/bench_utils.py --compare          # exit code 1 on regression
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+from prompts import PROMPT_TEMPLATES  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_utils.json")
+
+FUNCTIONS: Dict[str, Callable[[str], object]] = {
+    "format_markdown_response": utils.format_markdown_response,
+    "extract_checklist_items": utils.extract_checklist_items,
+    "extract_metrics_from_response": utils.extract_metrics_from_response,
+    "parse_timeline": utils.parse_timeline,
+    "score_response_quality": utils.score_response_quality,
+    "analyze_sentiment": utils.analyze_sentiment,
+    "calculate_reading_time": utils.calculate_reading_time,
+}
+
+SENTENCES = [
+    "Focus on retention before acquisition, since churn compounds faster than growth.",
+    "Interview 15-20 customers in Week 1-2 to validate the problem and willingness to pay.",
+    "Track CAC: keep it below one third of LTV for a healthy SaaS business.",
+    "Month 1-3: hire a founding engineer and a product designer with strong ownership.",
+    "Conversion rate from trial to paid should reach 15% within the first quarter.",
+    "Use tools like **Notion**, `Linear` and *HubSpot* to keep the team aligned.",
+    "The biggest risk is scaling sales before the onboarding experience is repeatable.",
+    "For example, Slack grew through bottom-up adoption and a generous free tier.",
+]
+
+
+def realistic_response(target_bytes: int, seed: int) -> str:
+    """
+    Markdown response following the templates' section structure
+    """
+    rng = random.Random(seed)
+    headings = [line for text in PROMPT_TEMPLATES.values() for line in text.splitlines() if line.startswith("## ")]
+    parts: List[str] = []
+    size = 0
+    while size < target_bytes:
+        block = [rng.choice(headings), rng.choice(SENTENCES)]
+        for idx in range(rng.randint(3, 7)):
+            marker = f"{idx + 1}." if rng.random() < 0.5 else rng.choice(["-", "*"])
+            block.append(f"{marker} {rng.choice(SENTENCES)}")
+        if rng.random() < 0.3:
+            block.append("```\nWeek 1: setup\n```")
+        text = "\n".join(block) + "\n\n"
+        parts.append(text)
+        size += len(text)
+    return "".join(parts)[:target_bytes]
+
+
+def adversarial_inputs(size: int) -> Dict[str, str]:
+    """
+    Inputs aimed at the backtracking-prone patterns in utils
+    """
+    return {
+        # Many short lines with no sentence terminator (checklist action pattern)
+        "no_terminators": ("Build the product roadmap quickly\n" * (size // 34 + 1))[:size],
+        # One long line without terminators
+        "long_line": ("Launch marketing campaigns " * (size // 27 + 1))[:size],
+        # Long word runs where "\w+\s+rate" must fail at every offset
+        "long_words": (("x" * 500 + " ") * (size // 501 + 1))[:size],
+        # Metric keywords without a following full stop
+        "metric_spam": ("churn rate " * (size // 11 + 1))[:size],
+        # Timeline keywords with unterminated descriptions
+        "timeline_spam": ("Week 1-2 " * (size // 9 + 1))[:size],
+        # Unbalanced emphasis markers inside list items
+        "emphasis": ("- " + "*a" * (size // 2))[:size],
+        # Whitespace runs between tokens
+        "whitespace": ("Week" + " " * 1000 + "rate\n") * (size // 1010 + 1),
+    }
+
+
+def build_corpus(quick: bool = False) -> List[Tuple[str, str]]:
+    sizes = [1024, 4096, 16384] if quick else [1024, 4096, 16384, 65536, 102400]
+    corpus = [(f"realistic_{size // 1024}k", realistic_response(size, seed=size)) for size in sizes]
+    adversarial_size = 4096 if quick else 16384
+    corpus.extend(
+        (f"adversarial_{name}_{adversarial_size // 1024}k", text)
+        for name, text in adversarial_inputs(adversarial_size).items()
+    )
+    return corpus
+
+
+def time_call(func: Callable[[str], object], text: str, samples: int, budget: float) -> List[float]:
+    """
+    Collect up to `samples` timings, stopping early once `budget` seconds are spent
+    """
+    func(text)  # warm-up
+    timings: List[float] = []
+    spent = 0.0
+    while len(timings) < samples and (spent < budget or len(timings) < 5):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+    return timings
+
+
+def mann_whitney_p(a: List[float], b: List[float]) -> float:
+    """
+    Two-sided Mann-Whitney U p-value (normal approximation with tie correction)
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    idx = 0
+    while idx < len(combined):
+        end = idx
+        while end + 1 < len(combined) and combined[end + 1][0] == combined[idx][0]:
+            end += 1
+        for k in range(idx, end + 1):
+            ranks[k] = (idx + end) / 2.0 + 1
+        ties = end - idx + 1
+        tie_term += ties ** 3 - ties
+        idx = end + 1
+    rank_a = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_a - n1 * (n1 + 1) / 2.0
+    mean = n1 * n2 / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+def median(values: List[float]) -> float:
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def run_suite(samples: int, budget: float, quick: bool, only: List[str]) -> Dict:
+    results = {}
+    for func_name, func in FUNCTIONS.items():
+        if only and func_name not in only:
+            continue
+        for case_name, text in build_corpus(quick):
+            timings = time_call(func, text, samples, budget)
+            results[f"{func_name}/{case_name}"] = timings
+            print(f"{func_name:<32}{case_name:<34}{median(timings) * 1e6:>12.1f} us  (n={len(timings)})")
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, alpha: float) -> int:
+    """
+    Print a comparison table and return the number of significant regressions
+    """
+    regressions = 0
+    print(f"\n{'benchmark':<66}{'baseline us':>13}{'current us':>13}{'ratio':>8}{'p':>10}")
+    for key, timings in current["results"].items():
+        base = baseline["results"].get(key)
+        if not base:
+            continue
+        ratio = median(timings) / median(base)
+        p_value = mann_whitney_p(timings, base)
+        flag = ""
+        if ratio > 1 + threshold and p_value < alpha:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold and p_value < alpha:
+            flag = "  faster"
+        print(f"{key:<66}{median(base) * 1e6:>13.1f}{median(timings) * 1e6:>13.1f}{ratio:>8.2f}{p_value:>10.4f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=30, help="timings per benchmark")
+    parser.add_argument("--budget", type=float, default=1.0, help="max seconds per benchmark")
+    parser.add_argument("--quick", action="store_true", help="smaller corpus for smoke runs")
+    parser.add_argument("--only", nargs="*", default=[], help="limit to these function names")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+    args = parser.parse_args()
+
+    current = run_suite(args.samples, args.budget, args.quick, args.only)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(current, fh)
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        found = compare(current, baseline, args.threshold, args.alpha)
+        print(f"\n{found} significant regression(s)")
+        sys.exit(1 if found else 0)
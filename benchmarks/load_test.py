@@ -0,0 +1,256 @@
+"""
+Offline load test for the guidance flow
+
+Starts the local mock OpenRouter server (unless --url is given), then
+drives the same path the app uses per request (render prompt, build
+messages, optional admission control, streamed or section-parallel
+completion, utils post-processing) from a pool of concurrent virtual users. Reports
+p50/p95/p99 latency and time to first token, throughput and memory.
+
+Refine/Simplify/Expand requests carry a previous answer in their history,
+as in the app; --transform-delta sends them on the delta path instead.
+--cache applies the app's response cache policy (stale-while-revalidate,
+nearest saved answer when upstream fails); --incident-after makes the
+built-in mock fail every request from that point on.
+
+    python benchmarks/load_test.py --concurrency 32 --requests 500 --ttft 0.2
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openrouter import (  # noqa: E402
+    add_settings_arguments, build_response_tokens, server_url, settings_from_args, start_mock_server
+)
+
+from config import Config  # noqa: E402
+import api  # noqa: E402
+from cache import response_cache  # noqa: E402
+from prefetch import CachedRequest  # noqa: E402
+from prompts import MODIFIERS, TOPIC_EXAMPLES, render_prompt, render_section_prompts  # noqa: E402
+from scheduler import get_admission_controller  # noqa: E402
+from sections import build_section_payloads, generate_sections  # noqa: E402
+from transforms import build_transform_messages, is_transform, transform_model  # noqa: E402
+from utils import extract_checklist_items, extract_metrics_from_response, format_markdown_response, parse_timeline  # noqa: E402
+
+PROFILE = "\n\nStartup Context: SaaS startup at MVP stage with 2-5 team members."
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def run_one(user_id: int, request_no: int, args, admission) -> Dict:
+    """
+    One guidance request as the app would issue it
+    """
+    rng = random.Random(user_id * 100003 + request_no)
+    topic = rng.choice(list(TOPIC_EXAMPLES))
+    query = rng.choice(TOPIC_EXAMPLES[topic][:args.distinct_queries])
+    mode = args.mode or rng.choice(["generate", "generate", "refine", "simplify", "expand"])
+    model = rng.choice(args.models)
+
+    # Transforms follow an earlier answer, which the history carries
+    context = None
+    if is_transform(mode):
+        previous = "".join(build_response_tokens(
+            api.build_messages(render_prompt(topic, query, PROFILE)), args.max_tokens, args.mock_settings
+        ))
+        context = [{"role": "user", "content": query}, {"role": "assistant", "content": previous}]
+
+    if context and args.transform_delta:
+        model = transform_model(mode, model)
+        messages = build_transform_messages(mode, previous, query, PROFILE)
+    elif args.layout == "prefix_stable":
+        messages = api.build_prefix_stable_messages(topic, query, PROFILE, MODIFIERS[mode], context)
+    else:
+        messages = api.build_messages(render_prompt(topic, query, PROFILE, MODIFIERS[mode]), context)
+    payload = api.build_payload(messages, model, args.max_tokens, stream=True)
+
+    section_prompts = None
+    if args.section_parallel and not (context and args.transform_delta):
+        section_prompts = render_section_prompts(topic, query, PROFILE, MODIFIERS[mode])
+    # Section streams the admission grant allows at once (no admission: no cap)
+    granted_streams = [None]
+
+    first_token = []
+    start = time.perf_counter()
+
+    def on_delta(delta: str, full_response: str):
+        if not first_token:
+            first_token.append(time.perf_counter() - start)
+
+    def complete() -> Dict:
+        if section_prompts:
+            section_payloads = build_section_payloads(section_prompts, model, args.max_tokens, context=context)
+            return generate_sections(
+                section_payloads, "sk-or-v1-loadtest",
+                on_update=lambda idx, text, finished: on_delta("", text),
+                max_workers=granted_streams[0]
+            )
+        monitor = api.build_stream_monitor(topic, modifier=mode) if args.early_stop else None
+        return api.chat_completion(payload, "sk-or-v1-loadtest", on_delta=on_delta, coalesce=args.coalesce, monitor=monitor)
+
+    def complete_cached() -> Dict:
+        # The app's cache policy around the same upstream call
+        request = CachedRequest(
+            f"user-{user_id}", "sk-or-v1-loadtest", topic, query, PROFILE,
+            model_choice=model,
+            mode=mode,
+            modifier=MODIFIERS[mode],
+            context=context,
+            layout=args.layout,
+            max_tokens=args.max_tokens
+        )
+        result = request.serve(complete, model)
+        if result["served"] != "upstream":
+            on_delta("", result["content"])
+        return result
+
+    if args.cache:
+        serve = complete_cached
+    else:
+        serve = complete
+
+    outcome = {
+        "ok": False, "ttft": None, "latency": None, "tokens": 0, "error": None, "coalesced": False, "early_stop": False,
+        "prompt_tokens": 0, "cost": 0.0, "served": "upstream"
+    }
+    try:
+        if admission is not None:
+            with admission.admit(
+                f"user-{user_id}", f"sk-or-v1-load-{user_id}", model,
+                modifier=mode,
+                max_tokens=args.max_tokens,
+                requests=len(section_prompts or [None])
+            ) as ticket:
+                granted_streams[0] = ticket.streams
+                result = serve()
+        else:
+            result = serve()
+        text = result["content"]
+        format_markdown_response(text)
+        extract_checklist_items(text)
+        extract_metrics_from_response(text)
+        parse_timeline(text)
+        usage = result.get("usage") or {}
+        outcome.update(
+            ok=True,
+            tokens=usage.get("completion_tokens") or len(text) // 4,
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            cost=Config.estimate_cost(model, usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0),
+            coalesced=result.get("coalesced", False),
+            early_stop=result.get("finish_reason") == "early_stop",
+            served=result.get("served", "upstream")
+        )
+    except Exception as e:
+        outcome["error"] = type(e).__name__
+    outcome["latency"] = time.perf_counter() - start
+    outcome["ttft"] = first_token[0] if first_token else None
+    return outcome
+
+
+def run(args) -> None:
+    server = None
+    args.mock_settings = settings_from_args(args)
+    if args.url:
+        Config.API_URL = args.url
+    else:
+        server = start_mock_server(args.mock_settings)
+        Config.API_URL = server_url(server)
+
+    if args.admission:
+        admission = get_admission_controller()
+    else:
+        admission = None
+
+    if args.cache:
+        response_cache.ttl = args.cache_ttl
+    if args.incident_after is not None and server is not None:
+        def start_incident():
+            args.mock_settings.error_rate = 1.0
+        threading.Timer(args.incident_after, start_incident).start()
+
+    tracemalloc.start()
+    results: List[Dict] = []
+    lock = threading.Lock()
+
+    def virtual_user(user_id: int):
+        for request_no in range(args.requests // args.concurrency + (user_id < args.requests % args.concurrency)):
+            outcome = run_one(user_id, request_no, args, admission)
+            with lock:
+                results.append(outcome)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(virtual_user, range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if server is not None:
+        server.shutdown()
+
+    ok = [r for r in results if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    print(f"Requests: {len(results)}  ok: {len(ok)}  errors: {errors or 0}  coalesced: {sum(r['coalesced'] for r in ok)}")
+    print(f"Concurrency: {args.concurrency}  wall time: {elapsed:.2f}s")
+    print(f"Throughput: {len(ok) / elapsed:.1f} req/s, {sum(r['tokens'] for r in ok) / elapsed:,.0f} output tokens/s")
+    print(
+        f"Prompt tokens: {sum(r['prompt_tokens'] for r in ok):,}  "
+        f"estimated cost: ${sum(r['cost'] for r in ok):.4f}"
+    )
+    if args.cache:
+        served: Dict[str, int] = {}
+        for r in ok:
+            served[r["served"]] = served.get(r["served"], 0) + 1
+        print(f"Served: {served}")
+    if args.early_stop:
+        print(f"Early stop: {sum(r['early_stop'] for r in ok)} of {len(ok)} answers stopped (usage estimated)")
+    for name, values in (("latency", latencies), ("ttft", ttfts)):
+        print(
+            f"{name:<8} p50 {percentile(values, 50) * 1000:8.1f} ms   "
+            f"p95 {percentile(values, 95) * 1000:8.1f} ms   p99 {percentile(values, 99) * 1000:8.1f} ms"
+        )
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Memory: peak traced {peak_traced / 1e6:.1f} MB, max RSS {max_rss_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=Config.DEFAULT_MAX_TOKENS)
+    parser.add_argument("--models", nargs="+", default=["openai/gpt-4o-mini", "openai/gpt-4o"])
+    parser.add_argument("--layout", choices=Config.PROMPT_LAYOUTS, default=Config.DEFAULT_PROMPT_LAYOUT)
+    parser.add_argument("--mode", choices=list(MODIFIERS), default=None, help="fixed query mode instead of a random mix")
+    parser.add_argument("--distinct-queries", type=int, default=4, help="example queries per topic to draw from")
+    parser.add_argument("--coalesce", action="store_true", help="enable single-flight request coalescing")
+    parser.add_argument("--admission", action="store_true", help="go through rate limits and the scheduler")
+    parser.add_argument("--section-parallel", action="store_true", help="generate template sections concurrently")
+    parser.add_argument("--early-stop", action="store_true", help="close streams once the template structure is complete")
+    parser.add_argument("--transform-delta", action="store_true", help="send Refine/Simplify/Expand on the delta path")
+    parser.add_argument("--cache", action="store_true", help="use the response cache with stale-while-revalidate and fallback")
+    parser.add_argument("--cache-ttl", type=float, default=Config.CACHE_TTL_SECONDS, help="seconds before cached answers go stale")
+    parser.add_argument("--incident-after", type=float, default=None, help="seconds into the run when the mock starts failing")
+    parser.add_argument("--url", default="", help="target an already running server instead of the built-in mock")
+    add_settings_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,274 @@
+"""
+Local mock of the OpenRouter chat completions endpoint
+
+Speaks the same request/response shapes that api.chat_completion parses:
+JSON for non-streaming calls and SSE "data: {...}" chunks ending with
+"data: [DONE]" for streaming calls, including the final usage chunk when
+stream_options.include_usage is set. Responses reuse the "## " headings
+found in the prompt so section-aware features behave as with a real model,
+and continuation requests after a dropped stream get the rest of the answer.
+
+    python benchmarks/mock_openrouter.py --port 8765 --ttft 0.4 --tokens-per-sec 60
+    OPENROUTER_API_URL=http://127.0.0.1:8765/api/v1/chat/completions streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+WORDS = (
+    "validate customers pricing runway hiring retention onboarding pipeline revenue "
+    "churn investors milestones roadmap founders metrics channels experiments "
+    "budget partners compliance equity traction cohort funnel referrals"
+).split()
+
+HEADING_PATTERN = re.compile(r'^(#{2,3} .+)$', re.MULTILINE)
+# Phrase from api.CONTINUE_INSTRUCTION that marks a continuation request
+CONTINUE_MARKER = "was cut off"
+
+
+class MockSettings:
+    """Behaviour knobs shared by all handler threads"""
+
+    def __init__(
+        self,
+        ttft: float = 0.3,
+        tokens_per_sec: float = 80.0,
+        output_tokens: int = 700,
+        chunk_tokens: int = 3,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        cached_ratio: float = 0.0,
+        prefill_tokens_per_sec: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.drop_rate = drop_rate
+        self.cached_ratio = cached_ratio
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "dropped": 0, "tokens": 0}
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+
+def build_response_tokens(messages: List[Dict], max_tokens: int, settings: MockSettings) -> List[str]:
+    """
+    Produce a markdown answer as a list of ~1-token pieces
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    headings = HEADING_PATTERN.findall(prompt) or ["## Overview", "## Recommended Actions", "## Next Steps"]
+    budget = min(max_tokens, settings.output_tokens)
+    per_section = max(8, budget // len(headings))
+
+    rng = random.Random(len(prompt))
+    pieces: List[str] = []
+    for heading in headings:
+        pieces.append(heading + "\n")
+        for idx in range(per_section - 2):
+            word = rng.choice(WORDS)
+            if idx % 12 == 0:
+                pieces.append(f"\n{idx // 12 + 1}. {word.capitalize()}")
+            else:
+                pieces.append(" " + word)
+        pieces.append(".\n\n")
+        if len(pieces) >= budget:
+            break
+    return pieces[:budget]
+
+
+def resume_response_tokens(messages: List[Dict], max_tokens: int, settings: MockSettings) -> List[str]:
+    """
+    Like build_response_tokens, but a continuation request (partial answer
+    as the assistant turn, then a user instruction) gets the rest of the
+    original answer, starting a few pieces early as real models often do
+    """
+    if len(messages) < 2 or messages[-2].get("role") != "assistant" or CONTINUE_MARKER not in str(messages[-1].get("content", "")):
+        return build_response_tokens(messages, max_tokens, settings)
+    partial = str(messages[-2].get("content", ""))
+    pieces = build_response_tokens(messages[:-2], max_tokens + len(partial) // 4, settings)
+    consumed, skip = 0, 0
+    while skip < len(pieces) and consumed + len(pieces[skip]) <= len(partial):
+        consumed += len(pieces[skip])
+        skip += 1
+    return pieces[max(0, skip - 3):][:max_tokens]
+
+
+def _usage(prompt: str, completion_tokens: int, settings: MockSettings) -> Dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * settings.cached_ratio)}
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        settings = self.settings
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with settings.lock:
+            settings.stats["requests"] += 1
+
+        roll = settings.roll()
+        if roll < settings.error_rate:
+            with settings.lock:
+                settings.stats["errors"] += 1
+            self._send_json(500, {"error": {"message": "mock upstream error", "code": 500}})
+            return
+        if roll < settings.error_rate + settings.rate_limit_rate:
+            with settings.lock:
+                settings.stats["rate_limited"] += 1
+            self._send_json(429, {"error": {"message": "mock rate limit", "code": 429}})
+            return
+
+        messages = payload.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        pieces = resume_response_tokens(messages, int(payload.get("max_tokens") or 2000), settings)
+        finish_reason = "length" if len(pieces) >= int(payload.get("max_tokens") or 2000) else "stop"
+        model = payload.get("model", "mock/model")
+        with settings.lock:
+            settings.stats["tokens"] += len(pieces)
+
+        time.sleep(settings.ttft)
+        if settings.prefill_tokens_per_sec:
+            # Longer prompts take longer to process before the first token
+            time.sleep(len(prompt) / 4 / settings.prefill_tokens_per_sec)
+        if not payload.get("stream"):
+            time.sleep(len(pieces) / settings.tokens_per_sec)
+            self._send_json(200, {
+                "id": "mock",
+                "model": model,
+                "choices": [{"message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": finish_reason}],
+                "usage": _usage(prompt, len(pieces), settings)
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        drop_at = None
+        if settings.roll() < settings.drop_rate:
+            drop_at = len(pieces) // 2
+            with settings.lock:
+                settings.stats["dropped"] += 1
+
+        interval = settings.chunk_tokens / settings.tokens_per_sec
+        try:
+            for start in range(0, len(pieces), settings.chunk_tokens):
+                if drop_at is not None and start >= drop_at:
+                    # Simulate a transport failure mid-stream
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                chunk = {
+                    "id": "mock",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": "".join(pieces[start:start + settings.chunk_tokens])}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(interval)
+
+            final = {"id": "mock", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = {"id": "mock", "model": model, "choices": [], "usage": _usage(prompt, len(pieces), settings)}
+                self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream early
+            pass
+        self.close_connection = True
+
+
+def start_mock_server(settings: MockSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the mock in a daemon thread; port 0 picks a free port
+    """
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openrouter", daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/v1/chat/completions"
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--output-tokens", type=int, default=700, help="response length cap")
+    parser.add_argument("--chunk-tokens", type=int, default=3, help="tokens per SSE chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of streams cut mid-way")
+    parser.add_argument("--cached-ratio", type=float, default=0.0, help="share of prompt tokens reported cached")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0.0, help="prompt processing rate (0 = free)")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        output_tokens=args.output_tokens,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        drop_rate=args.drop_rate,
+        cached_ratio=args.cached_ratio,
+        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+    server = start_mock_server(settings_from_args(args), args.host, args.port)
+    print(f"Mock OpenRouter listening on {server_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
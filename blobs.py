@@ -0,0 +1,102 @@
+"""
+Content-addressed store for response bodies
+
+Answers are interned by SHA-256 digest as Body objects, a str subclass, so
+the response cache and every session's history share a single copy of
+each distinct answer while existing code keeps treating them as text.
+History entries and checklists refer to a body by its digest. The store
+holds bodies weakly: a body is freed once no session or cache entry uses
+it. Derived data (checklist items) is computed once per body and shared.
+"""
+import hashlib
+import threading
+import weakref
+from typing import Optional, Tuple
+
+from metrics import registry
+from utils import extract_checklist_items
+
+BLOB_INTERNS = registry.counter("blob_store_interns_total", "Response bodies interned, by whether a copy was already held")
+
+
+class Body(str):
+    """Interned response text with its digest; behaves exactly like the str"""
+
+    digest: str
+
+
+def _supports_weakrefs() -> bool:
+    # Weak references to str subclasses are an implementation detail;
+    # without them bodies are still tagged with digests but not shared
+    try:
+        weakref.ref(Body(""))
+        return True
+    except TypeError:
+        return False
+
+
+WEAK_BODIES = _supports_weakrefs()
+
+
+def content_digest(text: str) -> str:
+    """
+    Hex SHA-256 of a response body
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """Process-wide, weakly held map of digest -> Body"""
+
+    def __init__(self):
+        self._bodies: "weakref.WeakValueDictionary[str, Body]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def intern(self, text: str, digest: Optional[str] = None) -> Body:
+        """
+        The shared Body for text, creating it on first sight. digest, if the
+        caller already has it (e.g. stored alongside text), skips hashing.
+        """
+        if isinstance(text, Body):
+            return text
+        digest = digest or content_digest(text)
+        with self._lock:
+            body = self._bodies.get(digest) if WEAK_BODIES else None
+            if body is not None:
+                BLOB_INTERNS.inc(result="shared")
+                return body
+            body = Body(text)
+            body.digest = digest
+            if WEAK_BODIES:
+                self._bodies[digest] = body
+        BLOB_INTERNS.inc(result="new")
+        return body
+
+    def get(self, digest: str) -> Optional[Body]:
+        """
+        The body for a digest, if some session or cache entry still holds it
+        """
+        with self._lock:
+            return self._bodies.get(digest)
+
+    def checklist_items(self, body: Body) -> Tuple[str, ...]:
+        """
+        Checklist items of a body, extracted once and shared by all sessions
+        """
+        items = body.__dict__.get("checklist_items")
+        if items is None:
+            items = tuple(extract_checklist_items(body))
+            body.checklist_items = items
+        return items
+
+    def stats(self) -> dict:
+        """
+        Distinct live bodies and their total size in characters
+        """
+        with self._lock:
+            bodies = list(self._bodies.values())
+        return {"bodies": len(bodies), "chars": sum(len(body) for body in bodies)}
+
+
+# Process-wide store shared by all sessions
+blob_store = BlobStore()
@@ -0,0 +1,319 @@
+"""
+Response cache for the Startup Guide Tool
+
+Process-wide LRU of generated answers keyed by what determines an answer:
+topic, query, startup profile, model choice, mode, prompt style, prompt
+modifier and the conversation history sent with the question. Entries
+are fresh for Config.CACHE_TTL_SECONDS and then stale for another
+Config.CACHE_STALE_SECONDS: a stale answer can be shown at once while it is
+regenerated in the background (stale-while-revalidate), and any retained
+answer for the same topic and profile can stand in when the provider is
+down. Entries written by the prefetcher remember whether they were ever
+served, so unused speculative answers can be counted as wasted spend when
+they leave the cache.
+
+With Config.CACHE_SEGMENT_PATH set, answers are also appended to a
+memory-mapped segment file together with their precomputed analysis
+(checklist, metrics, timeline), and a miss in this process's LRU is served
+from there, so worker processes serve each other's answers.
+
+With Config.CACHE_COMPRESS_RESPONSES, entries hold their answer compressed
+with the topic's trained dictionary (see compression.py) plus its digest;
+serving returns the body a session already holds, or decompresses it.
+"""
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from blobs import Body, blob_store
+from compression import compress, decompress
+from config import Config
+from metrics import registry
+from segment import CacheSegment
+from utils import extract_metrics_from_response, parse_timeline
+
+CACHE_LOOKUPS = registry.counter("response_cache_lookups_total", "Response cache lookups by result")
+CACHE_FALLBACKS = registry.counter("response_cache_fallbacks_total", "Nearest cached answers served while upstream was unavailable")
+CACHE_EVICTIONS = registry.counter("response_cache_evictions_total", "Entries removed from the response cache by reason")
+
+
+def cache_key(
+    topic: str,
+    query: str,
+    profile_context: str = "",
+    model: str = "",
+    mode: str = "generate",
+    compact: bool = False,
+    modifier: str = "",
+    context: Optional[List[Dict]] = None
+) -> str:
+    """
+    Digest of the inputs that determine an answer, including the prompt
+    modifier (e.g. an adaptive length target) and any conversation history
+    sent with it. Queries are compared case- and whitespace-insensitively.
+    """
+    normalized = " ".join(query.lower().split())
+    history = [[msg["role"], msg["content"]] for msg in context or []]
+    raw = json.dumps(
+        [topic, normalized, profile_context.strip(), model, mode, compact, modifier, history],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _query_terms(query: str) -> set:
+    return set(re.findall(r"\w+", query.lower()))
+
+
+class ResponseCache:
+    """Thread-safe LRU of answer entries with a TTL"""
+
+    def __init__(
+        self,
+        ttl: float = Config.CACHE_TTL_SECONDS,
+        max_entries: int = Config.CACHE_MAX_ENTRIES,
+        stale_ttl: float = Config.CACHE_STALE_SECONDS,
+        segment: Optional[CacheSegment] = None,
+        compress_responses: bool = Config.CACHE_COMPRESS_RESPONSES
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.segment = segment
+        self.compress_responses = compress_responses
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evict_listeners: List[Callable[[Dict, str], None]] = []
+
+    def on_evict(self, listener: Callable[[Dict, str], None]) -> None:
+        """
+        Call listener(entry, reason) whenever an entry leaves the cache
+        """
+        self._evict_listeners.append(listener)
+
+    def _remove(self, key: str, reason: str) -> Dict:
+        # Called with the lock held; listeners must not call back into the cache
+        entry = self._entries.pop(key)
+        CACHE_EVICTIONS.inc(reason=reason)
+        for listener in self._evict_listeners:
+            listener(entry, reason)
+        return entry
+
+    def _pack(self, body: Body, topic: str) -> Dict:
+        """
+        Entry fields holding body: the body itself, or its compressed bytes
+        """
+        if not self.compress_responses:
+            return {"content": body, "digest": body.digest}
+        return {"packed": compress(body, topic), "digest": body.digest}
+
+    def _view(self, entry: Dict, age: float) -> Dict:
+        """
+        Copy of entry as callers see it, with the answer as "content"
+        """
+        view = dict(entry, age=age, stale=age > self.ttl)
+        packed = view.pop("packed", None)
+        if packed is not None:
+            # Reuse the copy a session already shows before decompressing
+            view["content"] = blob_store.get(entry["digest"]) or blob_store.intern(decompress(packed))
+        return view
+
+    def _serve(self, key: str, entry: Dict, age: float) -> Dict:
+        # Called with the lock held
+        self._entries.move_to_end(key)
+        entry["hits"] += 1
+        return self._view(entry, age)
+
+    def _unusable(self, age: float, allow_stale: bool) -> Optional[str]:
+        """
+        Lookup result for an entry of this age that cannot be served, else None
+        """
+        if age > self.ttl + self.stale_ttl:
+            return "expired"
+        if age > self.ttl and not allow_stale:
+            return "stale_skipped"
+        return None
+
+    def get(self, key: str, mark_served: bool = True, allow_stale: bool = False) -> Optional[Dict]:
+        """
+        Entry for key, or None. Stale entries are returned only with
+        allow_stale, flagged with "stale": True. The entry is marked as
+        served unless mark_served is False (e.g. when only checking
+        availability).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.time() - entry["created"]
+                result = self._unusable(age, allow_stale)
+                if result is None:
+                    if not mark_served:
+                        return self._view(entry, age)
+                    CACHE_LOOKUPS.inc(result="stale" if age > self.ttl else "hit", source=entry["source"])
+                    return self._serve(key, entry, age)
+                if result == "expired":
+                    self._remove(key, "expired")
+        if entry is None:
+            # Read outside the lock; segment hits are not copied into the LRU
+            view = self._segment_view(key)
+            result = "miss" if view is None else self._unusable(view["age"], allow_stale)
+            if result is None:
+                if mark_served:
+                    CACHE_LOOKUPS.inc(result="stale" if view["stale"] else "hit", source=view["source"])
+                return view
+        if mark_served:
+            CACHE_LOOKUPS.inc(result=result)
+        return None
+
+    def _segment_view(self, key: str) -> Optional[Dict]:
+        """
+        Entry written by any worker process, served from the shared segment.
+        The body is decoded from the mapping only when this process does not
+        already hold it, and "analysis" carries the checklist, metrics and
+        timeline stored with it.
+        """
+        if self.segment is None:
+            return None
+        try:
+            record = self.segment.get(key)
+            if record is None:
+                return None
+            meta = record.analysis()
+            body = blob_store.get(meta["digest"]) or blob_store.intern(record.text(), digest=meta["digest"])
+        except (OSError, ValueError, struct.error, RuntimeError):
+            CACHE_LOOKUPS.inc(result="segment_error")
+            return None
+        if "checklist_items" not in body.__dict__:
+            body.checklist_items = tuple(meta["checklist"])
+        age = time.time() - record.created
+        return {
+            "content": body,
+            "digest": meta["digest"],
+            "topic": meta["topic"],
+            "query": meta["query"],
+            "profile_context": meta["profile_context"],
+            "model": meta["model"],
+            "source": meta["source"],
+            "analysis": {field: meta[field] for field in ("checklist", "metrics", "timeline")},
+            # Prefetch spend and waste are accounted by the writing process
+            "cost": 0.0,
+            "created": record.created,
+            "hits": 0,
+            "age": age,
+            "stale": age > self.ttl
+        }
+
+    def nearest(self, topic: str, profile_context: str, query: str) -> Optional[Dict]:
+        """
+        Retained answer for the same topic and profile whose query shares
+        the most words with query (newest first on ties), fresh or stale.
+        Used as a fallback when the provider is unavailable.
+        """
+        terms = _query_terms(query)
+        now = time.time()
+        with self._lock:
+            best_key, best_score = None, -1.0
+            # Newest entries are last; iterate backwards so ties keep the newest
+            for key in reversed(self._entries):
+                entry = self._entries[key]
+                if (entry["topic"] != topic or entry["profile_context"] != profile_context.strip()
+                        or now - entry["created"] > self.ttl + self.stale_ttl):
+                    continue
+                other = _query_terms(entry["query"])
+                score = len(terms & other) / len(terms | other) if terms | other else 0.0
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            entry = self._entries[best_key]
+            CACHE_FALLBACKS.inc(topic=topic)
+            return dict(self._serve(best_key, entry, now - entry["created"]), similarity=best_score)
+
+    def contains(self, key: str) -> bool:
+        """
+        True if a fresh entry exists; does not count as a lookup
+        """
+        return self.get(key, mark_served=False) is not None
+
+    def put(
+        self,
+        key: str,
+        content: str,
+        topic: str = "",
+        model: str = "",
+        source: str = "live",
+        cost: float = 0.0,
+        query: str = "",
+        profile_context: str = ""
+    ) -> None:
+        """
+        Store an answer. source is "live" or "prefetch"; cost is what the
+        answer cost to generate. query and profile_context let nearest()
+        match the entry.
+        """
+        # Interned, so sessions showing this answer share one copy
+        body = blob_store.intern(content)
+        entry = {
+            **self._pack(body, topic),
+            "topic": topic,
+            "query": query,
+            "profile_context": profile_context.strip(),
+            "model": model,
+            "source": source,
+            "cost": cost,
+            "created": time.time(),
+            "hits": 0
+        }
+        with self._lock:
+            self._insert(key, entry)
+        if self.segment is not None:
+            self._write_segment(key, body, entry)
+
+    def _insert(self, key: str, entry: Dict) -> None:
+        # Called with the lock held
+        if key in self._entries:
+            self._remove(key, "replaced")
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)), "capacity")
+
+    def _write_segment(self, key: str, body: Body, entry: Dict) -> None:
+        """
+        Append an answer and its analysis to the shared segment, so other
+        workers neither regenerate nor re-analyse it
+        """
+        meta = {
+            field: entry[field] for field in ("topic", "query", "profile_context", "model", "source", "digest")
+        }
+        meta.update(
+            checklist=list(blob_store.checklist_items(body)),
+            metrics=extract_metrics_from_response(body),
+            timeline=parse_timeline(body)
+        )
+        try:
+            self.segment.put(key, body, meta, created=entry["created"])
+        except (OSError, RuntimeError):
+            # The shared tier is best effort; this process's LRU still has the answer
+            CACHE_EVICTIONS.inc(reason="segment_write_failed")
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key, "cleared")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Process-wide cache shared by all sessions (and, with a segment, all workers)
+response_cache = ResponseCache(
+    segment=CacheSegment(
+        Config.CACHE_SEGMENT_PATH, max_age=Config.CACHE_TTL_SECONDS + Config.CACHE_STALE_SECONDS
+    ) if Config.CACHE_SEGMENT_PATH else None
+)
@@ -0,0 +1,376 @@
+"""
+Dictionary-trained compression for cached and archived responses
+
+Answers follow a handful of template structures from prompts.py, so most
+of their bytes are headings, list scaffolding and boilerplate that recur
+across answers. A preset dictionary holding those strings lets even a
+single short answer compress well, where plain zlib has nothing to refer
+back to yet.
+
+Each topic starts with a seed dictionary built from its prompt template,
+which every process rebuilds identically. Pseudo-topic "all" sees every
+answer and is used for session exports, which mix topics. Every blob
+starts with a header naming its codec and dictionary id. Dictionaries are
+raw content, usable as a zlib zdict or as a zstd raw-content dictionary.
+
+Training needs Config.COMPRESSION_DICT_DIR, where every version is saved
+and never deleted, so data compressed with an older or another process's
+dictionary stays readable. Once Config.COMPRESSION_TRAIN_SAMPLES answers
+(or Config.COMPRESSION_TRAIN_MAX_BYTES) for a topic have been compressed,
+a dictionary is trained on them in the background and becomes that
+topic's current version. Without a directory nothing is written and the
+seeds are used throughout.
+"""
+import io
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import Config
+from metrics import registry
+from prompts import COMPACT_PROMPT_TEMPLATES, PROMPT_TEMPLATES
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+MAGIC = b"\xd5SG"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<3sBBI")  # magic, format version, codec, dictionary id
+CODECS = {"zlib": 1, "zstd": 2}
+ALL_TOPICS = "all"
+ZLIB_WINDOW = 32768  # deflate cannot reference further back than this
+
+COMPRESSION_BYTES = registry.counter("compression_bytes_total", "Bytes in and out of dictionary compression")
+DICTIONARIES_TRAINED = registry.counter("compression_dictionaries_trained_total", "Dictionaries trained by topic and result")
+
+_FILE_PATTERN = re.compile(r"^(?P<topic>\w+)-v(?P<version>\d+)-(?P<id>[0-9a-f]{8})\.dict$")
+
+
+def train_dictionary(samples: Iterable[str], size: int = Config.COMPRESSION_DICT_BYTES) -> bytes:
+    """
+    Build a raw dictionary from the lines that recur across samples, scored
+    by the number of samples containing them times their length. The best
+    lines go last, where deflate can reach them with the shortest distances.
+    """
+    samples = list(samples)
+    counts: Counter = Counter()
+    for sample in samples:
+        counts.update(set(line for line in sample.splitlines(keepends=True) if line.strip()))
+    # A single sample (a template seed) has nothing to recur across
+    min_count = 2 if len(samples) > 1 else 1
+    ranked = sorted(
+        (line for line, count in counts.items() if count >= min_count),
+        key=lambda line: counts[line] * len(line),
+        reverse=True
+    )
+    chosen: List[bytes] = []
+    used = 0
+    for line in ranked:
+        encoded = line.encode("utf-8")
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+def seed_samples(topic: str) -> List[str]:
+    """
+    Template text a topic's first dictionary is built from
+    """
+    if topic == ALL_TOPICS:
+        return ["".join(PROMPT_TEMPLATES.values()) + "".join(COMPACT_PROMPT_TEMPLATES.values())]
+    return [PROMPT_TEMPLATES[topic] + COMPACT_PROMPT_TEMPLATES.get(topic, "")]
+
+
+class Dictionary:
+    """One immutable dictionary version"""
+
+    def __init__(self, topic: str, version: int, data: bytes):
+        self.topic = topic
+        self.version = version
+        self.data = data[-ZLIB_WINDOW:]
+        self.id = zlib.crc32(self.data)
+        self._zstd = None
+
+    def zstd_dict(self):
+        if self._zstd is None:
+            self._zstd = zstandard.ZstdCompressionDict(self.data, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        return self._zstd
+
+    @property
+    def filename(self) -> str:
+        return f"{self.topic}-v{self.version:03d}-{self.id:08x}.dict"
+
+
+class DictionaryRegistry:
+    """Current dictionary per topic, every known version by id, and training samples"""
+
+    def __init__(
+        self,
+        directory: str = Config.COMPRESSION_DICT_DIR,
+        size: int = Config.COMPRESSION_DICT_BYTES,
+        train_after: int = Config.COMPRESSION_TRAIN_SAMPLES,
+        max_sample_bytes: int = Config.COMPRESSION_TRAIN_MAX_BYTES
+    ):
+        self.directory = directory
+        self.size = size
+        self.train_after = train_after
+        self.max_sample_bytes = max_sample_bytes
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Dictionary] = {}
+        self._current: Dict[str, Dictionary] = {}
+        self._samples: Dict[str, List[str]] = defaultdict(list)
+        self._sample_bytes: Dict[str, int] = defaultdict(int)
+        self._training: Set[str] = set()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._loaded = False
+
+    def _read_directory(self) -> None:
+        # Called with the lock held
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            match = _FILE_PATTERN.match(name)
+            if not match:
+                continue
+            with open(os.path.join(self.directory, name), "rb") as handle:
+                self._register(Dictionary(match["topic"], int(match["version"]), handle.read()))
+
+    def _load(self) -> None:
+        # Called with the lock held
+        if self._loaded:
+            return
+        self._loaded = True
+        self._read_directory()
+        # Seeds are rebuilt from the templates, so every process can read
+        # what another compressed with them without sharing any file
+        for topic in (*PROMPT_TEMPLATES, ALL_TOPICS):
+            seed = Dictionary(topic, 0, train_dictionary(seed_samples(topic), self.size))
+            if seed.id not in self._by_id:
+                self._register(seed)
+                self._save(seed)
+
+    def _register(self, dictionary: Dictionary) -> None:
+        # Called with the lock held
+        self._by_id[dictionary.id] = dictionary
+        current = self._current.get(dictionary.topic)
+        if current is None or dictionary.version > current.version:
+            self._current[dictionary.topic] = dictionary
+
+    def _save(self, dictionary: Dictionary) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, dictionary.filename)
+        with open(path + ".tmp", "wb") as handle:
+            handle.write(dictionary.data)
+        os.replace(path + ".tmp", path)
+
+    def current(self, topic: str) -> Dictionary:
+        """
+        Dictionary new data for topic is compressed with
+        """
+        if topic != ALL_TOPICS and topic not in PROMPT_TEMPLATES:
+            topic = "general"
+        with self._lock:
+            self._load()
+            return self._current[topic]
+
+    def get(self, dictionary_id: int) -> Dictionary:
+        with self._lock:
+            self._load()
+            dictionary = self._by_id.get(dictionary_id)
+            if dictionary is None and self.directory:
+                # Possibly trained by another worker process since we looked
+                self._read_directory()
+                dictionary = self._by_id.get(dictionary_id)
+        if dictionary is None:
+            raise ValueError(f"Unknown compression dictionary {dictionary_id:08x}")
+        return dictionary
+
+    def observe(self, topic: str, text: str) -> None:
+        """
+        Keep text as a training sample; a topic whose current dictionary is
+        still its seed is trained in the background once enough samples are
+        held. Only with a directory: trained dictionaries must outlive the
+        process for what they compressed to stay readable.
+        """
+        if not self.directory:
+            return
+        if topic not in PROMPT_TEMPLATES:
+            topic = "general"
+        for name in (topic, ALL_TOPICS):
+            if self.current(name).version > 0:
+                continue
+            with self._lock:
+                if name in self._training:
+                    continue
+                samples = self._samples[name]
+                samples.append(text)
+                self._sample_bytes[name] += len(text)
+                if len(samples) < self.train_after and self._sample_bytes[name] < self.max_sample_bytes:
+                    continue
+                self._samples.pop(name)
+                self._sample_bytes.pop(name)
+                self._training.add(name)
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dictionary-train")
+                pool = self._pool
+            pool.submit(self._train_in_background, name, samples)
+
+    def _train_in_background(self, topic: str, samples: List[str]) -> None:
+        try:
+            self.train(topic, samples)
+        except OSError:
+            # Keep compressing with the seed rather than a dictionary that was not saved
+            DICTIONARIES_TRAINED.inc(topic=topic, result="save_failed")
+        finally:
+            with self._lock:
+                self._training.discard(topic)
+
+    def train(self, topic: str, samples: Iterable[str]) -> Dictionary:
+        """
+        Train and switch to a new version of topic's dictionary, e.g. from
+        the answers in a session export. With a directory, the dictionary
+        is saved before any data can be compressed with it.
+        """
+        data = train_dictionary(samples, self.size)
+        with self._lock:
+            self._load()
+            dictionary = Dictionary(topic, self._current[topic].version + 1, data)
+            self._save(dictionary)
+            self._register(dictionary)
+        DICTIONARIES_TRAINED.inc(topic=topic, result="ok")
+        return dictionary
+
+
+def _codec() -> str:
+    if Config.COMPRESSION_CODEC == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package")
+    return Config.COMPRESSION_CODEC
+
+
+def compress(text: str, topic: str = "general", learn: bool = True) -> bytes:
+    """
+    Compress text with topic's current dictionary. With learn, text is also
+    kept as a sample for training the topic's dictionary.
+    """
+    if learn:
+        dictionaries.observe(topic, text)
+    dictionary = dictionaries.current(topic)
+    codec = _codec()
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        body = zstandard.ZstdCompressor(level=Config.COMPRESSION_LEVEL, dict_data=dictionary.zstd_dict()).compress(raw)
+    else:
+        compressor = zlib.compressobj(Config.COMPRESSION_LEVEL, zdict=dictionary.data)
+        body = compressor.compress(raw) + compressor.flush()
+    COMPRESSION_BYTES.inc(len(raw), direction="in")
+    COMPRESSION_BYTES.inc(len(body) + HEADER.size, direction="out")
+    return HEADER.pack(MAGIC, FORMAT_VERSION, CODECS[codec], dictionary.id) + body
+
+
+def _read_header(header: bytes) -> Tuple[int, Dictionary]:
+    if len(header) < HEADER.size:
+        raise ValueError("Not a dictionary-compressed payload")
+    magic, version, codec, dictionary_id = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a dictionary-compressed payload")
+    if codec == CODECS["zstd"] and zstandard is None:
+        raise ValueError("Reading zstd payloads requires the 'zstandard' package")
+    return codec, dictionaries.get(dictionary_id)
+
+
+def decompress(blob: bytes) -> str:
+    """
+    Inverse of compress(), whichever dictionary version wrote blob
+    """
+    codec, dictionary = _read_header(blob[:HEADER.size])
+    body = blob[HEADER.size:]
+    if codec == CODECS["zstd"]:
+        raw = zstandard.ZstdDecompressor(dict_data=dictionary.zstd_dict()).decompress(body)
+    else:
+        raw = zlib.decompressobj(zdict=dictionary.data).decompress(body)
+    return raw.decode("utf-8")
+
+
+def is_compressed(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+class _DeflateWriter:
+    """Streaming zlib compressor with a preset dictionary"""
+
+    def __init__(self, fileobj, dictionary: Dictionary):
+        self._fileobj = fileobj
+        self._deflater = zlib.compressobj(Config.COMPRESSION_LEVEL, zdict=dictionary.data)
+
+    def write(self, data: bytes) -> int:
+        self._fileobj.write(self._deflater.compress(data))
+        return len(data)
+
+    def close(self) -> None:
+        self._fileobj.write(self._deflater.flush())
+
+
+class _InflateReader(io.RawIOBase):
+    """Streaming zlib decompressor with a preset dictionary"""
+
+    def __init__(self, fileobj, dictionary: Dictionary):
+        self._fileobj = fileobj
+        self._inflater = zlib.decompressobj(zdict=dictionary.data)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            if self._inflater.eof:
+                return 0
+            chunk = self._inflater.unconsumed_tail or self._fileobj.read(65536)
+            if not chunk:
+                raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+            self._buffer = self._inflater.decompress(chunk, len(target))
+        count = min(len(target), len(self._buffer))
+        target[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+def open_writer(fileobj, topic: str = ALL_TOPICS):
+    """
+    Write a header to fileobj and return a streaming compressor for the rest;
+    the caller must close() it
+    """
+    dictionary = dictionaries.current(topic)
+    codec = _codec()
+    fileobj.write(HEADER.pack(MAGIC, FORMAT_VERSION, CODECS[codec], dictionary.id))
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(
+            level=Config.COMPRESSION_LEVEL, dict_data=dictionary.zstd_dict()
+        ).stream_writer(fileobj, closefd=False)
+    return _DeflateWriter(fileobj, dictionary)
+
+
+def open_reader(fileobj):
+    """
+    Read the header from fileobj and return a buffered reader of the
+    decompressed stream
+    """
+    codec, dictionary = _read_header(fileobj.read(HEADER.size))
+    if codec == CODECS["zstd"]:
+        return io.BufferedReader(zstandard.ZstdDecompressor(dict_data=dictionary.zstd_dict()).stream_reader(fileobj))
+    return io.BufferedReader(_InflateReader(fileobj, dictionary))
+
+
+# Process-wide dictionaries shared by all sessions
+dictionaries = DictionaryRegistry()
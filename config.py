@@ -1,11 +1,16 @@
 """
 Configuration settings for Startup Guide Tool
 """
+import os
 
 class Config:
     """Application configuration"""
     
     # API Settings
+    # Override with OPENROUTER_API_URL to point at a local mock server
+    API_URL = os.environ.get("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+    API_CONNECT_TIMEOUT_SECONDS = 10
+    API_READ_TIMEOUT_SECONDS = 60  # longest wait for response headers or the next stream chunk
     DEFAULT_MODEL = "openai/gpt-4o-mini"
     AVAILABLE_MODELS = [
         "openai/gpt-4o-mini",
@@ -15,20 +20,98 @@ class Config:
         "meta-llama/llama-3-70b-instruct"
     ]
     
+    # Auto Routing ("auto" model option)
+    ROUTER_TOPIC_PREFERENCES = {
+        "general": ["openai/gpt-4o-mini", "google/gemini-pro", "openai/gpt-4o"],
+        "scaling": ["openai/gpt-4o-mini", "openai/gpt-4o", "anthropic/claude-3-5-sonnet"],
+        "marketing": ["openai/gpt-4o-mini", "openai/gpt-4o", "anthropic/claude-3-5-sonnet"],
+        "product": ["openai/gpt-4o-mini", "openai/gpt-4o", "anthropic/claude-3-5-sonnet"],
+        "team": ["openai/gpt-4o", "openai/gpt-4o-mini", "anthropic/claude-3-5-sonnet"],
+        "funding": ["openai/gpt-4o", "anthropic/claude-3-5-sonnet", "openai/gpt-4o-mini"],
+        "documents": ["anthropic/claude-3-5-sonnet", "openai/gpt-4o", "openai/gpt-4o-mini"]
+    }
+    ROUTER_MAX_COST_PER_REQUEST = 0.03  # USD budget per request
+    ROUTER_LATENCY_SLO_SECONDS = 45  # p95 total request time
+    ROUTER_TTFT_SLO_SECONDS = 5  # p95 time to first token
+    ROUTER_MAX_ERROR_RATE = 0.2
+    ROUTER_MIN_SAMPLES = 5  # Observations needed before metrics are trusted
+    ROUTER_WINDOW_SECONDS = 300  # Error rates cover the last one to two windows
+    ROUTER_PROMPT_OVERHEAD_TOKENS = 600  # Template + system prompt, added to the query estimate
+    ROUTER_EXPECTED_OUTPUT_RATIO = 0.5  # Expected completion share of max_tokens
+    ROUTER_DECISION_LOG_PATH = os.environ.get("ROUTER_DECISION_LOG_PATH", "")  # Optional JSONL audit log of decisions
+    
     # Token Limits
     DEFAULT_MAX_TOKENS = 2000
     MIN_MAX_TOKENS = 500
     MAX_MAX_TOKENS = 4000
     
+    # Adaptive Length
+    # Learn observed output length per (topic, modifier, model) and derive
+    # max_tokens and the word target from it instead of the slider value
+    ADAPTIVE_LENGTH = False
+    ADAPTIVE_HEADROOM = 1.25  # max_tokens margin over the p95 observed length
+    ADAPTIVE_MIN_TOKENS = 300
+    ADAPTIVE_MIN_WORDS = 100
+    ADAPTIVE_MODIFIER_SCALE = {
+        "generate": 1.0,
+        "refine": 1.2,
+        "simplify": 0.5,
+        "expand": 1.5
+    }
+    COMPACT_PROMPTS = False  # Use compact template variants
+    
+    # Section-Parallel Generation
+    # Generate each "## " section of a template as its own concurrent
+    # sub-request and stitch the results together in template order
+    SECTION_PARALLEL = False
+    SECTION_PARALLELISM = 8  # max concurrent sub-requests per generation
+    SECTION_TOKEN_HEADROOM = 1.5  # per-section max_tokens over an even split
+    
+    # Early Stop
+    # Close the stream once a section beyond the template's "## " sections
+    # starts, or when the answer runs past the word budget times this slack.
+    # Usage of a closed stream is estimated, as the provider's is never sent
+    EARLY_STOP = False
+    EARLY_STOP_WORD_SLACK = 1.3
+    
+    # Cancellation: how often a generating run checks that its browser
+    # session is still connected
+    DISCONNECT_POLL_SECONDS = 1.0
+    
+    # Stream Resumption
+    # When a stream breaks off mid-answer, ask the model to continue from the
+    # partial text instead of regenerating the whole guide
+    STREAM_RESUME_ATTEMPTS = 2
+    STREAM_RESUME_MIN_TOKENS = 200  # floor for the continuation's max_tokens
+    
+    # Delta Transforms
+    # Refine/Simplify/Expand send only the previous answer and a short
+    # instruction instead of re-sending the topic template and history
+    TRANSFORM_DELTA = True
+    TRANSFORM_CHEAPEST_MODES = ["simplify"]  # run on the cheapest available model
+    
     # Response Settings
     DEFAULT_TEMPERATURE = 0.7
     DEFAULT_TOP_P = 0.9
     ENABLE_STREAMING = True
     
+    # Request Coalescing
+    # Identical concurrent requests from the same API key share one upstream
+    # generation. COALESCE_ACROSS_API_KEYS lets different keys share it too;
+    # the leader's key then pays for, and its errors reach, every follower.
+    COALESCE_REQUESTS = True
+    COALESCE_ACROSS_API_KEYS = False
+    
     # Conversation Settings
     MAX_CONVERSATION_HISTORY = 20  # Store last 20 messages
     CONTEXT_WINDOW_SIZE = 6  # Use last 6 messages for context
     
+    # Prompt Layout
+    # "classic" embeds the query in the topic template; "prefix_stable" sends
+    # static instructions first and the query last for provider prompt caching
+    PROMPT_LAYOUTS = ["classic", "prefix_stable"]
+    DEFAULT_PROMPT_LAYOUT = "classic"
+    
     # UI Settings
     TOPICS = {
         " Scaling Business": "scaling",
@@ -41,15 +124,109 @@ class Config:
     }
     
     # Export Settings
-    EXPORT_FORMATS = ["markdown", "text", "json"]
+    EXPORT_FORMATS = ["markdown", "text", "json", "jsonl"]
+    SESSION_EXPORT_COMPRESSION = "gzip"  # "none", "gzip", "zstd" or "zdict" (needs the dictionaries to read)
     
-    # Rate Limiting (Client-side tracking)
-    RATE_LIMIT_REQUESTS = 50  # Max requests per session
+    # Rate Limiting (enforced server-side by ratelimit.py)
+    RATE_LIMIT_REQUESTS = 50  # Max requests per session per window
+    RATE_LIMIT_WINDOW_SECONDS = 3600
     RATE_LIMIT_WARNING_THRESHOLD = 40
+    # Token buckets: scope -> (capacity, refill window in seconds)
+    RATE_LIMITS = {
+        "session": (RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS),
+        "api_key": (20, 60),
+        "model": (120, 60)
+    }
+    
+    # Admission Control
+    MAX_CONCURRENT_GENERATIONS = 8
+    ADMISSION_QUEUE_SIZE = 32
+    ADMISSION_TIMEOUT_SECONDS = 120
+    ADMISSION_POLL_SECONDS = 0.5
+    
+    # Scheduling ("priority" = shortest job first with aging, "fair" = round-robin)
+    SCHEDULING_POLICY = "priority"
+    SCHEDULER_AGING_RATE = 0.5  # Cost units credited per second waited
+    MODEL_LATENCY_WEIGHTS = {
+        "openai/gpt-4o-mini": 1.0,
+        "openai/gpt-4o": 2.5,
+        "anthropic/claude-3-5-sonnet": 2.5,
+        "google/gemini-pro": 1.0,
+        "meta-llama/llama-3-70b-instruct": 2.0,
+        "default": 2.0
+    }
+    MODEL_CONCURRENCY = {
+        "openai/gpt-4o": 3,
+        "anthropic/claude-3-5-sonnet": 3,
+        "meta-llama/llama-3-70b-instruct": 3,
+        "default": 6
+    }
+    SCHEDULER_WAIT_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 120]
+    SCHEDULER_DEPTH_BUCKETS = [0, 1, 2, 4, 8, 16, 32]
+    
+    # Pricing (USD per 1M tokens). Add a new version instead of editing an
+    # old one so recorded costs stay reproducible.
+    CURRENT_PRICE_VERSION = "2025-11"
+    PRICE_TABLES = {
+        "2025-11": {
+            "openai/gpt-4o-mini": {"input": 0.15, "output": 0.60, "cached_input": 0.075},
+            "openai/gpt-4o": {"input": 2.50, "output": 10.00, "cached_input": 1.25},
+            "anthropic/claude-3-5-sonnet": {"input": 3.00, "output": 15.00, "cached_input": 0.30},
+            "google/gemini-pro": {"input": 0.50, "output": 1.50, "cached_input": 0.50},
+            "meta-llama/llama-3-70b-instruct": {"input": 0.59, "output": 0.79, "cached_input": 0.59},
+            "default": {"input": 1.00, "output": 3.00, "cached_input": 1.00}
+        }
+    }
+    COST_LEDGER_PATH = ""  # Optional JSONL file receiving every ledger entry
+    COST_LEDGER_MAX_RECORDS = 10000  # Recent entries kept in memory
+    
+    # Metrics
+    METRICS_ENABLED = True
+    METRICS_PORT = 9464  # Prometheus text endpoint at http://127.0.0.1:9464/metrics
+    # Opt-in span event log, one JSONL line per span (unrotated; for short profiling runs)
+    METRICS_JSONL_PATH = os.environ.get("METRICS_JSONL_PATH", "")
+    METRICS_LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
     
     # Cache Settings
     ENABLE_CACHE = True
     CACHE_TTL_SECONDS = 3600  # 1 hour
+    CACHE_MAX_ENTRIES = 500
+    # Expired answers are kept this much longer: shown (marked as saved)
+    # while a fresh copy is generated, or as a fallback if OpenRouter is down
+    CACHE_STALE_SECONDS = 86400  # 1 day
+    
+    # Shared Cache Segment
+    # Memory-mapped file shared by all worker processes on a host; empty keeps
+    # the response cache per process
+    CACHE_SEGMENT_PATH = os.environ.get("CACHE_SEGMENT_PATH", "")
+    CACHE_SEGMENT_INITIAL_SLOTS = 4096  # index slots; grows on compaction
+    CACHE_SEGMENT_COMPACT_MIN_RECORDS = 1000  # compact once over half of these are superseded
+    CACHE_SEGMENT_FSYNC = True  # fsync each append (survives power loss, not just crashes)
+    
+    # Response Compression
+    # Cached answers (and "zdict" session exports) are compressed with
+    # per-topic dictionaries, seeded from the prompt templates and, with a
+    # dictionary directory, trained on earlier answers
+    CACHE_COMPRESS_RESPONSES = True
+    COMPRESSION_CODEC = "zlib"  # or "zstd" (requires the 'zstandard' package)
+    COMPRESSION_LEVEL = 6
+    COMPRESSION_DICT_BYTES = 16384  # zlib uses at most the last 32 KB
+    COMPRESSION_TRAIN_SAMPLES = 64  # answers per topic before its dictionary is trained
+    COMPRESSION_TRAIN_MAX_BYTES = 262144  # or sample bytes held per topic, whichever comes first
+    # Trained dictionaries are saved here and every version is kept; empty
+    # writes no files and compresses with the template seeds only
+    COMPRESSION_DICT_DIR = os.environ.get("COMPRESSION_DICT_DIR", "")
+    
+    # Speculative Prefetch (opt-in)
+    # After an answer completes, answer the top suggested follow-ups in the
+    # background so clicking one is served from the response cache
+    PREFETCH_ENABLED = False
+    PREFETCH_FOLLOW_UPS = 2  # follow-ups prefetched per answer
+    PREFETCH_WORKERS = 2
+    PREFETCH_MAX_TOKENS = 1200
+    PREFETCH_SESSION_BUDGET_USD = 0.05  # spend cap per session per window
+    PREFETCH_GLOBAL_BUDGET_USD = 1.00  # spend cap for the whole process per window
+    PREFETCH_BUDGET_WINDOW_SECONDS = 3600
     
     # Startup Profile Fields
     INDUSTRIES = [
@@ -103,6 +280,7 @@ class Config:
         "empty_query": " Please enter a question to get guidance.",
         "api_error": " Error calling API. Please try again.",
         "rate_limit": " Rate limit reached. Please wait a moment.",
+        "queue_full": " The service is busy right now. Please try again shortly.",
         "network_error": " Network error. Please check your connection."
     }
     
@@ -116,10 +294,17 @@ class Config:
     # Help Text
     HELP_TEXT = {
         "api_key": "Get your API key from https://openrouter.ai/keys",
-        "model_selection": "Choose the AI model. GPT-4o-mini is fast and cost-effective.",
+        "model_selection": "Choose the AI model. GPT-4o-mini is fast and cost-effective. Auto picks per request from live latency, error and cost data.",
         "streaming": "Show responses as they're generated for better UX",
         "max_tokens": "Longer responses use more tokens (and cost more)",
-        "context": "Include previous messages for context-aware responses"
+        "context": "Include previous messages for context-aware responses",
+        "prompt_layout": "Prefix-stable puts shared instructions first so providers can cache them",
+        "adaptive_length": "Set response length from observed output sizes for this topic and model",
+        "compact_prompts": "Use shorter instructions with the same section structure",
+        "section_parallel": "Write the guide's sections concurrently; faster for long responses, slightly more prompt tokens",
+        "early_stop": "End the response once the model starts writing beyond the guide's sections or runs far past its length",
+        "transform_delta": "Refine, Simplify and Expand rewrite the last answer instead of regenerating it from the full prompt; Simplify uses the cheapest model",
+        "prefetch": "Answer the suggested follow-up questions in the background so they open instantly; costs extra tokens, capped by a small budget"
     }
     
     # Resources and Links
@@ -182,23 +367,54 @@ class Config:
                 "cost": "Low",
                 "quality": "Good",
                 "best_for": "Quick responses, general advice"
+            },
+            "meta-llama/llama-3-70b-instruct": {
+                "name": "Llama 3 70B Instruct",
+                "provider": "Meta",
+                "speed": "Medium",
+                "cost": "Low",
+                "quality": "Good",
+                "best_for": "Cost-effective open model, general advice"
             }
         }
         return model_info.get(model, {})
     
     @classmethod
-    def estimate_cost(cls, model: str, tokens: int) -> float:
-        """Estimate cost for API call"""
-        # Rough cost estimates per 1K tokens (input + output combined average)
-        costs_per_1k = {
-            "openai/gpt-4o-mini": 0.0002,
-            "openai/gpt-4o": 0.005,
-            "anthropic/claude-3-5-sonnet": 0.004,
-            "google/gemini-pro": 0.0001
-        }
+    def get_prices(cls, model: str, version: str = None) -> dict:
+        """Get per-1M-token prices for a model from a price table version"""
+        table = cls.PRICE_TABLES[version or cls.CURRENT_PRICE_VERSION]
+        return table.get(model, table["default"])
+    
+    @classmethod
+    def cheapest_model(cls) -> str:
+        """Available model with the lowest combined input and output price"""
+        return min(cls.AVAILABLE_MODELS, key=lambda m: cls.get_prices(m)["input"] + cls.get_prices(m)["output"])
+    
+    @classmethod
+    def estimate_cost(
+        cls,
+        model: str,
+        tokens: int,
+        completion_tokens: int = None,
+        cached_tokens: int = 0
+    ) -> float:
+        """Estimate cost for API call
+        
+        With only `tokens`, prices them at the blended input/output rate.
+        With completion_tokens, `tokens` is the prompt token count and each
+        kind is priced separately, with cached prompt tokens at the cache rate.
+        """
+        prices = cls.get_prices(model)
+        if completion_tokens is None:
+            blended = (prices["input"] + prices["output"]) / 2
+            return tokens * blended / 1_000_000
         
-        cost_per_1k = costs_per_1k.get(model, 0.001)
-        return (tokens / 1000) * cost_per_1k
+        cached_tokens = min(cached_tokens, tokens)
+        return (
+            (tokens - cached_tokens) * prices["input"]
+            + cached_tokens * prices["cached_input"]
+            + completion_tokens * prices["output"]
+        ) / 1_000_000
     
     @classmethod
     def get_topic_color(cls, topic: str) -> str:
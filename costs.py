@@ -0,0 +1,118 @@
+"""
+Per-request cost accounting for the Startup Guide Tool
+
+Every completed request is priced from the provider's usage block
+(prompt, completion and cached tokens) against a versioned price table
+and rolled up per session, topic, model and day. Rollups are updated
+incrementally on record, so reading them is O(number of keys).
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional
+
+from api import extract_cached_tokens
+from config import Config
+from metrics import registry
+from utils import estimate_tokens
+
+COST_USD = registry.counter("cost_usd_total", "Estimated spend in USD by model")
+
+ROLLUP_DIMENSIONS = ["session", "topic", "model", "day"]
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "cost": 0.0
+    }
+
+
+class CostLedger:
+    """Records priced requests and maintains rollups per dimension"""
+
+    def __init__(self, max_records: int = Config.COST_LEDGER_MAX_RECORDS, path: str = Config.COST_LEDGER_PATH):
+        self.records: Deque[Dict] = deque(maxlen=max_records)
+        self.path = path
+        self._rollups: Dict[str, Dict[str, Dict[str, float]]] = {dim: {} for dim in ROLLUP_DIMENSIONS}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        session_id: str,
+        topic: str,
+        model: str,
+        usage: Optional[Dict] = None,
+        prompt_text: str = "",
+        response_text: str = "",
+        kind: str = "generate"
+    ) -> Dict:
+        """
+        Price one request. Falls back to text-length estimates (flagged as
+        estimated) when the provider did not return usage.
+        """
+        if usage and usage.get("prompt_tokens") is not None:
+            prompt_tokens = int(usage.get("prompt_tokens") or 0)
+            completion_tokens = int(usage.get("completion_tokens") or 0)
+            # Same parsing as the API metrics, so the two agree
+            cached_tokens = extract_cached_tokens(usage)
+            # e.g. a stream closed early, before its usage chunk arrived
+            estimated = bool(usage.get("estimated"))
+        else:
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(response_text)
+            cached_tokens = 0
+            estimated = True
+
+        cost = Config.estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+        now = time.time()
+        entry = {
+            "ts": now,
+            "day": datetime.fromtimestamp(now).strftime("%Y-%m-%d"),
+            "session": session_id,
+            "topic": topic,
+            "model": model,
+            "kind": kind,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost": cost,
+            "price_version": Config.CURRENT_PRICE_VERSION,
+            "estimated": estimated
+        }
+
+        with self._lock:
+            self.records.append(entry)
+            for dim in ROLLUP_DIMENSIONS:
+                totals = self._rollups[dim].setdefault(entry[dim], _empty_totals())
+                totals["requests"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cached_tokens"] += cached_tokens
+                totals["cost"] += cost
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+        COST_USD.inc(cost, model=model)
+        return entry
+
+    def rollup(self, dimension: str) -> Dict[str, Dict[str, float]]:
+        """
+        Totals per key for one of: session, topic, model, day
+        """
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._rollups[dimension].items()}
+
+    def totals(self, dimension: str, key: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._rollups[dimension].get(key) or _empty_totals())
+
+
+# Process-wide ledger shared by all sessions
+ledger = CostLedger()
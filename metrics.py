@@ -0,0 +1,305 @@
+"""
+Lightweight in-process metrics for the Startup Guide Tool
+
+Counters and histograms with labels, timing spans, a Prometheus text
+endpoint and an optional JSONL event log. Recording a value is a lock,
+a bisect and two additions, so instrumentation can stay on in production.
+"""
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config import Config
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def items(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(dict(key), value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in items]
+
+
+def bucket_percentile(bounds: List[float], counts: List[int], pct: float) -> float:
+    """
+    Upper bound of the bucket containing the pct-th percentile of counts
+    (one count per bound plus the +Inf bucket)
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    target = pct / 100.0 * total
+    running = 0
+    for idx, bucket_count in enumerate(counts):
+        running += bucket_count
+        if running >= target:
+            return bounds[idx] if idx < len(bounds) else float("inf")
+    return float("inf")
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels and approximate percentiles"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: List[float]):
+        self.name = name
+        self.help = help_text
+        self.bounds = sorted(buckets)
+        self._children: Dict[LabelKey, _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = _HistogramChild(len(self.bounds) + 1)
+            child.counts[bisect.bisect_left(self.bounds, value)] += 1
+            child.count += 1
+            child.sum += value
+
+    def percentile(self, pct: float, **labels) -> float:
+        """
+        Upper bound of the bucket containing the pct-th percentile
+        """
+        with self._lock:
+            child = self._children.get(_label_key(labels))
+            if child is None:
+                return 0.0
+            return bucket_percentile(self.bounds, child.counts, pct)
+
+    def snapshot(self, **labels) -> Dict:
+        with self._lock:
+            child = self._children.get(_label_key(labels)) or _HistogramChild(len(self.bounds) + 1)
+            return {
+                "bounds": list(self.bounds),
+                "counts": list(child.counts),
+                "count": child.count,
+                "sum": child.sum
+            }
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [dict(key) for key in self._children]
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted(self._children.items())
+            for key, child in items:
+                running = 0
+                for bound, bucket_count in zip(self.bounds, child.counts):
+                    running += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {running}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {child.count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {child.sum:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets: Optional[List[float]] = None) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets or Config.METRICS_LATENCY_BUCKETS)
+            return self._metrics[name]
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class JsonlEventLog:
+    """Buffered JSONL writer for span events"""
+
+    def __init__(self, path: str, flush_every: int = 100, flush_seconds: float = 5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, event: Dict) -> None:
+        line = json.dumps(event, separators=(",", ":"), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+
+registry = MetricsRegistry()
+event_log: Optional[JsonlEventLog] = JsonlEventLog(Config.METRICS_JSONL_PATH) if Config.METRICS_JSONL_PATH else None
+
+SPAN_SECONDS = registry.histogram("span_duration_seconds", "Duration of instrumented spans")
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Time a block of code into span_duration_seconds{span=name, ...}
+    """
+    if not Config.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.observe(duration, span=name, **labels)
+        if event_log is not None:
+            event_log.write({"ts": time.time(), "span": name, "seconds": duration, "labels": labels})
+
+
+def timed(name: str):
+    """
+    Decorator form of span()
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _metrics_handler():
+    """
+    Build the /metrics request handler. http.server is imported here so
+    processes that never export metrics do not pay for it at startup.
+    """
+    from http.server import BaseHTTPRequestHandler
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return _MetricsHandler
+
+
+_exporter_lock = threading.Lock()
+_exporter: Optional["ThreadingHTTPServer"] = None
+_exporter_attempted = False
+
+
+def start_exporter(port: Optional[int] = None, host: str = "127.0.0.1") -> Optional["ThreadingHTTPServer"]:
+    """
+    Serve /metrics on a local port once per process (idempotent).
+    Returns None if the port is taken, e.g. by another worker process.
+    """
+    global _exporter, _exporter_attempted
+    with _exporter_lock:
+        if _exporter is None and not _exporter_attempted:
+            _exporter_attempted = True
+            from http.server import ThreadingHTTPServer
+            try:
+                _exporter = ThreadingHTTPServer((host, port or Config.METRICS_PORT), _metrics_handler())
+            except OSError:
+                return None
+            threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+        return _exporter
@@ -0,0 +1,363 @@
+"""
+Speculative prefetch of follow-up answers for the Startup Guide Tool
+
+After an answer completes, the top suggested follow-up questions for the
+same topic and profile are answered on a small background pool and stored
+in the response cache, so clicking one is served instantly. Spend is capped
+per session and for the whole process over a sliding window; every
+prefetch is priced in the cost ledger under kind "prefetch". Background
+requests go through admission control at the lowest priority: they are
+charged to the API key and model buckets and run only when a slot is
+free and no user is queueing. Prefetched
+answers that leave the cache without ever being served count as wasted.
+
+The same pool revalidates stale cache entries: the user is shown the saved
+answer at once and a fresh copy replaces it in the background.
+CachedRequest holds that serving policy (hit, stale hit, upstream, saved
+answer during an outage) so the app and the load test apply the same one.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional
+
+from api import build_guidance_messages, build_payload, chat_completion, is_upstream_unavailable
+from cache import ResponseCache, cache_key, response_cache
+from config import Config
+from costs import ledger
+from metrics import registry
+from ratelimit import QueueFullError, RateLimitExceeded
+from scheduler import get_admission_controller
+from utils import estimate_tokens, suggest_follow_up_questions
+
+PREFETCH_REQUESTS = registry.counter("prefetch_requests_total", "Speculative follow-up requests by outcome")
+PREFETCH_HITS = registry.counter("prefetch_hits_total", "Prefetched answers served to a user")
+PREFETCH_SPEND = registry.counter("prefetch_spend_usd_total", "Estimated USD spent on prefetched answers")
+CACHE_REVALIDATIONS = registry.counter("response_cache_revalidations_total", "Background refreshes of stale answers by outcome")
+PREFETCH_WASTED = registry.counter(
+    "prefetch_wasted_usd_total", "Estimated USD of prefetched answers that left the cache unserved"
+)
+
+
+class Prefetcher:
+    """Budget-capped background generation of likely follow-up answers"""
+
+    def __init__(self, cache: ResponseCache = response_cache, workers: int = Config.PREFETCH_WORKERS):
+        self.cache = cache
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: set = set()
+        # [timestamp, cost] pairs; the cost is an estimate until the request finishes
+        self._session_spend: Dict[str, Deque[List[float]]] = defaultdict(deque)
+        self._global_spend: Deque[List[float]] = deque()
+        cache.on_evict(self._on_evict)
+
+    def _window_total(self, spend: Deque[List[float]], now: float) -> float:
+        while spend and now - spend[0][0] > Config.PREFETCH_BUDGET_WINDOW_SECONDS:
+            spend.popleft()
+        return sum(cost for _, cost in spend)
+
+    def _reserve(self, session_id: str, estimate: float) -> Optional[List[float]]:
+        """
+        Reserve estimated spend in both budgets; None if either would be exceeded
+        """
+        now = time.time()
+        with self._lock:
+            session_spend = self._session_spend[session_id]
+            if (self._window_total(session_spend, now) + estimate > Config.PREFETCH_SESSION_BUDGET_USD
+                    or self._window_total(self._global_spend, now) + estimate > Config.PREFETCH_GLOBAL_BUDGET_USD):
+                return None
+            reservation = [now, estimate]
+            # The same list sits in both windows so settling it updates both
+            session_spend.append(reservation)
+            self._global_spend.append(reservation)
+            return reservation
+
+    def schedule(
+        self,
+        session_id: str,
+        api_key: str,
+        topic: str,
+        query: str,
+        profile_context: str = "",
+        model_choice: str = Config.DEFAULT_MODEL,
+        model: str = Config.DEFAULT_MODEL,
+        layout: str = Config.DEFAULT_PROMPT_LAYOUT,
+        compact: bool = False,
+        modifier: str = "",
+        context: Optional[List[Dict]] = None
+    ) -> int:
+        """
+        Start prefetching the top follow-ups for an answer. Answers are
+        cached under model_choice (what the user selected, possibly "auto")
+        and generated with model. modifier and context must be what a
+        follow-up request would send (the history including this answer),
+        or its cache key will not match. Returns the number of requests
+        started.
+        """
+        started = 0
+        for question in suggest_follow_up_questions(topic, query)[:Config.PREFETCH_FOLLOW_UPS]:
+            key = cache_key(topic, question, profile_context, model_choice, "generate", compact, modifier, context)
+            if self.cache.contains(key):
+                PREFETCH_REQUESTS.inc(outcome="already_cached")
+                continue
+
+            messages = build_guidance_messages(
+                topic, question, profile_context, modifier, context, layout=layout, compact=compact
+            )
+            estimate = Config.estimate_cost(
+                model, estimate_tokens("".join(msg["content"] for msg in messages)), Config.PREFETCH_MAX_TOKENS
+            )
+            reservation = self._reserve(session_id, estimate)
+            if reservation is None:
+                PREFETCH_REQUESTS.inc(outcome="over_budget")
+                break
+
+            payload = build_payload(messages, model, Config.PREFETCH_MAX_TOKENS, stream=False)
+            if self._submit(key, payload, api_key, session_id, topic, question, profile_context, "prefetch", reservation):
+                started += 1
+        return started
+
+    def revalidate(
+        self,
+        key: str,
+        session_id: str,
+        api_key: str,
+        topic: str,
+        query: str,
+        profile_context: str = "",
+        model: str = Config.DEFAULT_MODEL,
+        max_tokens: int = Config.DEFAULT_MAX_TOKENS,
+        layout: str = Config.DEFAULT_PROMPT_LAYOUT,
+        compact: bool = False,
+        modifier: str = "",
+        context: Optional[List[Dict]] = None
+    ) -> bool:
+        """
+        Regenerate a stale answer in the background and replace its cache
+        entry. At most one refresh per key runs at a time; not budget-capped,
+        since it replaces an answer the user asked for. Returns True if a
+        refresh was started.
+        """
+        messages = build_guidance_messages(
+            topic, query, profile_context, modifier, context, layout=layout, compact=compact
+        )
+        payload = build_payload(messages, model, max_tokens, stream=False)
+        return self._submit(key, payload, api_key, session_id, topic, query, profile_context, "revalidate")
+
+    def _submit(
+        self,
+        key: str,
+        payload: Dict,
+        api_key: str,
+        session_id: str,
+        topic: str,
+        query: str,
+        profile_context: str,
+        kind: str,
+        reservation: Optional[List[float]] = None
+    ) -> bool:
+        with self._lock:
+            if key in self._pending:
+                if reservation is not None:
+                    reservation[1] = 0.0
+                return False
+            self._pending.add(key)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+            pool = self._pool
+        pool.submit(self._run, key, payload, api_key, session_id, topic, query, profile_context, kind, reservation)
+        return True
+
+    def _run(
+        self,
+        key: str,
+        payload: Dict,
+        api_key: str,
+        session_id: str,
+        topic: str,
+        query: str,
+        profile_context: str,
+        kind: str,
+        reservation: Optional[List[float]]
+    ) -> None:
+        model = payload["model"]
+        counter = PREFETCH_REQUESTS if kind == "prefetch" else CACHE_REVALIDATIONS
+        try:
+            # Lowest priority: skipped unless it can start without holding up users
+            with get_admission_controller().admit(
+                session_id, api_key, model, max_tokens=payload["max_tokens"], background=True
+            ):
+                result = chat_completion(payload, api_key)
+            entry = ledger.record(
+                session_id, topic, model, result["usage"],
+                prompt_text="".join(msg["content"] for msg in payload["messages"]),
+                response_text=result["content"],
+                kind=kind
+            )
+            if reservation is not None:
+                with self._lock:
+                    reservation[1] = entry["cost"]
+                PREFETCH_SPEND.inc(entry["cost"], model=model)
+            if result["finish_reason"] in ("length", "incomplete"):
+                counter.inc(outcome="truncated")
+                return
+            self.cache.put(
+                key, result["content"],
+                topic=topic,
+                model=model,
+                source="prefetch" if kind == "prefetch" else "live",
+                cost=entry["cost"],
+                query=query,
+                profile_context=profile_context
+            )
+            counter.inc(outcome="ok")
+        except (RateLimitExceeded, QueueFullError):
+            if reservation is not None:
+                with self._lock:
+                    reservation[1] = 0.0
+            counter.inc(outcome="no_capacity")
+        except Exception:
+            # Failed requests are not billed; release the reservation
+            if reservation is not None:
+                with self._lock:
+                    reservation[1] = 0.0
+            counter.inc(outcome="error")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def record_hit(self, entry: Dict) -> None:
+        """
+        Count a served cache entry; only the first serve of a prefetched
+        answer is a prefetch hit
+        """
+        if entry["source"] == "prefetch" and entry["hits"] == 1:
+            PREFETCH_HITS.inc()
+
+    def _on_evict(self, entry: Dict, reason: str) -> None:
+        if entry["source"] == "prefetch" and entry["hits"] == 0:
+            PREFETCH_WASTED.inc(entry["cost"])
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Prefetched answers, hits, hit rate and spend for tuning
+        """
+        prefetched = PREFETCH_REQUESTS.value(outcome="ok")
+        hits = PREFETCH_HITS.total()
+        return {
+            "prefetched": prefetched,
+            "hits": hits,
+            "hit_rate": hits / prefetched if prefetched else 0.0,
+            "spend": PREFETCH_SPEND.total(),
+            "wasted": PREFETCH_WASTED.total(),
+            "over_budget": PREFETCH_REQUESTS.value(outcome="over_budget")
+        }
+
+
+class CachedRequest:
+    """Response cache policy for one guidance request"""
+
+    def __init__(
+        self,
+        session_id: str,
+        api_key: str,
+        topic: str,
+        query: str,
+        profile_context: str = "",
+        model_choice: str = Config.DEFAULT_MODEL,
+        mode: str = "generate",
+        compact: bool = False,
+        modifier: str = "",
+        context: Optional[List[Dict]] = None,
+        layout: str = Config.DEFAULT_PROMPT_LAYOUT,
+        max_tokens: int = Config.DEFAULT_MAX_TOKENS,
+        cache: ResponseCache = response_cache
+    ):
+        self.session_id = session_id
+        self.api_key = api_key
+        self.topic = topic
+        self.query = query
+        self.profile_context = profile_context
+        self.compact = compact
+        self.modifier = modifier
+        self.context = context
+        self.layout = layout
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.key = cache_key(topic, query, profile_context, model_choice, mode, compact, modifier, context)
+        # Transforms depend on the answer being transformed; only new questions are cached
+        self.enabled = Config.ENABLE_CACHE and mode == "generate"
+
+    def lookup(self) -> Optional[Dict]:
+        """
+        Fresh or stale cache entry for the request, or None. A stale entry
+        is refreshed in the background for the next request.
+        """
+        if not self.enabled:
+            return None
+        entry = self.cache.get(self.key, allow_stale=True)
+        if entry is not None and entry["stale"]:
+            prefetcher.revalidate(
+                self.key, self.session_id, self.api_key, self.topic, self.query, self.profile_context,
+                model=entry["model"],
+                max_tokens=self.max_tokens,
+                layout=self.layout,
+                compact=self.compact,
+                modifier=self.modifier,
+                context=self.context
+            )
+        return entry
+
+    def fallback(self, error: Exception) -> Optional[Dict]:
+        """
+        Nearest saved answer to stand in when error means the provider is
+        unavailable, or None
+        """
+        if not self.enabled or not is_upstream_unavailable(error):
+            return None
+        return self.cache.nearest(self.topic, self.profile_context, self.query)
+
+    def store(self, content: str, finish_reason: str, model: str) -> None:
+        """
+        Cache a generated answer if it is complete
+        """
+        if self.enabled and finish_reason in ("stop", "early_stop"):
+            self.cache.put(
+                self.key, content,
+                topic=self.topic,
+                model=model,
+                query=self.query,
+                profile_context=self.profile_context
+            )
+
+    def serve(self, generate: Callable[[], Dict], model: str) -> Dict:
+        """
+        Apply the whole policy around generate(), which returns an
+        api.chat_completion result for model. The result gains "served":
+        "cache", "stale", "fallback" or "upstream".
+        """
+        entry = self.lookup()
+        if entry is None:
+            try:
+                result = generate()
+            except Exception as e:
+                entry = self.fallback(e)
+                if entry is None:
+                    raise
+                return {"content": entry["content"], "usage": None, "finish_reason": "fallback", "served": "fallback"}
+            self.store(result["content"], result["finish_reason"], model)
+            return dict(result, served="upstream")
+        prefetcher.record_hit(entry)
+        return {
+            "content": entry["content"],
+            "usage": None,
+            "finish_reason": "cached",
+            "served": "stale" if entry["stale"] else "cache"
+        }
+
+
+# Process-wide prefetcher shared by all sessions
+prefetcher = Prefetcher()
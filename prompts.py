@@ -1,3 +1,8 @@
+import re
+from functools import lru_cache
+from string import Formatter
+from typing import List, Tuple
+
 SCALING_PROMPT = """
 You are an expert startup advisor specializing in business scaling strategies.
 
@@ -468,17 +473,376 @@ TOPIC_EXAMPLES = {
     ]
 }
 
+PROMPT_TEMPLATES = {
+    "scaling": SCALING_PROMPT,
+    "funding": FUNDING_PROMPT,
+    "team": TEAM_SETUP_PROMPT,
+    "documents": DOCUMENTS_PROMPT,
+    "product": PRODUCT_PROMPT,
+    "marketing": MARKETING_PROMPT,
+    "general": GENERAL_PROMPT
+}
+
+# Compact variants: same section headings, fewer instruction tokens
+COMPACT_PROMPT_TEMPLATES = {
+    "scaling": """
+You are an expert startup scaling advisor.
+
+User query: {query}
+
+Answer with these sections:
+##  Overview
+2-3 sentences.
+##  Actionable Steps
+5-7 numbered steps with timeline, resources, outcome.
+##  Common Challenges & Solutions
+4-5 pitfalls with mitigation.
+##  Key Metrics to Track
+4-6 KPIs with benchmarks.
+##  Recommended Tools & Resources
+Free, paid and learning resources.
+##  Quick Wins (30-Day Focus)
+3 immediate actions.
+
+Be practical and specific. Total response: 400-600 words.
+""",
+    "funding": """
+You are a venture capital and fundraising expert.
+
+User query: {query}
+
+Answer with these sections:
+##  Funding Landscape
+Relevant stages, typical amounts, investor expectations.
+##  Essential Documents Checklist
+Pitch deck, projections, executive summary, cap table, demo, market analysis, term sheet: purpose and pitfalls.
+##  Preparation Roadmap
+Weeks 1-8 in two-week steps.
+##  Pitch Mastery
+5-7 pitch elements.
+##  Alternative Funding Routes
+3-4 non-VC options.
+##  Resources
+Templates, investor databases, communities.
+##  Legal Considerations
+Dilution, terms to watch, when to hire a lawyer.
+
+**Legal Disclaimer**: This is general guidance. Always consult with legal and financial professionals before making funding decisions.
+
+Total response: 500-700 words, tailored to startup stage and query.
+""",
+    "team": """
+You are a startup HR and organizational design expert.
+
+User query: {query}
+
+Answer with these sections:
+##  Core Team Structure
+3-5 critical first hires and hiring sequence.
+##  Hiring Process Blueprint
+Sourcing, interviewing, assessment, offers.
+##  Organizational Design
+Structure, reporting lines, roles.
+##  Culture & Retention
+Values, compensation and equity, engagement.
+##  Essential Tools (Budget-Friendly)
+HR, communication and collaboration tools.
+##  Legal & Compliance
+Contracts, equity paperwork, employment law basics.
+##  30-Day Action Plan
+Concrete weekly actions.
+
+Total response: 450-650 words, specific to startup stage and team size.
+""",
+    "documents": """
+You are a startup legal and compliance documentation expert.
+
+User query: {query}
+
+Answer with these sections:
+##  Critical Documents Checklist
+For each document: purpose, when needed, key components, DIY vs. lawyer cost.
+### Formation Documents
+### Founder & Equity Documents
+### Employee Documents
+### Investor Documents
+### Operational Documents
+### Financial & Tax Documents
+##  Digital Tools & Platforms
+Formation, e-signature and document tools.
+##  Timeline & Priority
+What to do first, next and later.
+##  Critical Mistakes to Avoid
+Common, costly errors.
+##  When to Hire a Lawyer
+Triggers and cost expectations.
+##  Additional Resources
+Templates and guides.
+
+**Legal Disclaimer**: This is educational information, not legal advice. Always consult with a qualified attorney for your specific situation, especially regarding formation, equity, contracts, and compliance.
+
+Total response: 500-800 words, specific to the query and jurisdiction if mentioned.
+""",
+    "product": """
+You are a startup product strategy expert.
+
+User query: {query}
+
+Answer with these sections:
+##  Product Vision & Strategy
+Vision, target users, differentiation.
+##  Development Roadmap
+MVP scope and phased milestones.
+##  User Research & Validation
+Methods to validate demand and fit.
+##  Product Metrics & KPIs
+Key metrics with targets.
+##  Go-to-Market Strategy
+Launch plan, positioning, pricing.
+##  Tools & Resources
+Product, analytics and research tools.
+
+Total response: 400-600 words.
+""",
+    "marketing": """
+You are a growth marketing and customer acquisition expert.
+
+User query: {query}
+
+Answer with these sections:
+##  Marketing Strategy Framework
+Audience, positioning, goals.
+##  Channel-Specific Tactics
+Best channels with concrete tactics.
+##  Growth Hacking Strategies
+Low-cost, high-leverage experiments.
+##  Marketing Metrics & Analytics
+KPIs with benchmarks.
+##  Essential Marketing Tools
+Free and paid tools.
+##  90-Day Marketing Plan
+Month-by-month actions.
+
+Total response: 450-600 words.
+""",
+    "general": """
+You are a comprehensive startup advisor.
+
+User query: {query}
+
+Answer with these sections:
+##  Core Analysis
+Situation, key considerations, implications.
+##  Recommended Actions
+Prioritized steps with timing and resources.
+## Risks & Mitigation
+Challenges and mitigation.
+## Success Metrics
+What to measure and targets.
+##  Tools & Resources
+Tools, learning resources, templates.
+##  Next Steps
+30-day actions.
+
+Total response: 400-600 words, tailored to the specific query. Be specific, practical, and encouraging.
+"""
+}
+
+class PromptTemplate:
+    """
+    Prompt template parsed once into static segments and named slots.
+    Rendering fills the slots and joins the precomputed parts, so the
+    template text is never re-parsed per request.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[str] = []
+        self.slots: List[Tuple[int, str]] = []
+
+        for literal, field, _, _ in Formatter().parse(text):
+            if literal:
+                self.parts.append(literal)
+            if field is not None:
+                self.slots.append((len(self.parts), field))
+                self.parts.append("")
+
+    def render(self, *suffixes: str, **values: str) -> str:
+        """
+        Fill slots with values and append any suffix strings in one join
+        """
+        parts = list(self.parts)
+        for idx, name in self.slots:
+            parts[idx] = values[name]
+        parts.extend(suffixes)
+        return "".join(parts)
+
+# Word budget stated in each template ("Total response: 400-600 words")
+WORD_RANGE_PATTERN = re.compile(r'Total response:\s*(\d+)-(\d+) words')
+
+# Follow-up modifiers appended to the prompt for the Refine/Simplify/Expand buttons
+MODIFIERS = {
+    "generate": "",
+    "refine": "\n\nProvide a more refined, detailed version of your previous response with specific examples and case studies.",
+    "simplify": "\n\nSimplify your previous response to be more concise and actionable, focusing on immediate next steps.",
+    "expand": "\n\nExpand on your previous response with more comprehensive details, additional strategies, and deeper insights."
+}
+
+# Delta transforms: the buttons rewrite the previous answer from a compact
+# instruction instead of re-sending the full topic template
+TRANSFORM_INSTRUCTIONS = {
+    "refine": "Refine the answer above: make it more specific, with concrete examples and case studies.",
+    "simplify": "Simplify the answer above: make it concise and actionable, focused on immediate next steps.",
+    "expand": "Expand the answer above with more comprehensive details, additional strategies and deeper insights."
+}
+
+TRANSFORM_TEMPLATE = """Question: {query}{profile_context}
+
+Previous answer:
+{previous}
+
+{instruction} Keep its "## " section headings and markdown format, and reply with the rewritten answer only.{length_note}"""
+
+# Query-free template text for the prefix-stable message layout, where the
+# query is sent as the final message instead of inside the instructions
+QUERY_REFERENCE = "provided in the final message"
+
 def get_prompt_template(topic: str) -> str:
     """
     Get the appropriate prompt template based on topic
     """
-    prompts = {
-        "scaling": SCALING_PROMPT,
-        "funding": FUNDING_PROMPT,
-        "team": TEAM_SETUP_PROMPT,
-        "documents": DOCUMENTS_PROMPT,
-        "product": PRODUCT_PROMPT,
-        "marketing": MARKETING_PROMPT,
-        "general": GENERAL_PROMPT
-    }
-    return prompts.get(topic, GENERAL_PROMPT)
\ No newline at end of file
+    return PROMPT_TEMPLATES.get(topic, GENERAL_PROMPT)
+
+@lru_cache(maxsize=None)
+def get_compiled_template(topic: str, compact: bool = False) -> PromptTemplate:
+    """
+    Get the precompiled (optionally compact) template for a topic.
+    Templates are parsed on first use and cached for the process.
+    """
+    templates = COMPACT_PROMPT_TEMPLATES if compact else PROMPT_TEMPLATES
+    if topic not in templates:
+        return get_compiled_template("general", compact)
+    return PromptTemplate(templates[topic])
+
+@lru_cache(maxsize=None)
+def get_static_instructions(topic: str, compact: bool = False) -> str:
+    """
+    Get the query-free instructions for a topic
+    """
+    return get_compiled_template(topic, compact).render(query=QUERY_REFERENCE)
+
+@lru_cache(maxsize=None)
+def get_word_range(topic: str) -> Tuple[int, int]:
+    """
+    Get the word budget stated in a topic's template
+    """
+    match = WORD_RANGE_PATTERN.search(get_prompt_template(topic))
+    return int(match.group(1)), int(match.group(2))
+
+def render_prompt(
+    topic: str,
+    query: str,
+    profile_context: str = "",
+    modifier: str = "",
+    compact: bool = False
+) -> str:
+    """
+    Render the full user prompt for a topic, profile context and modifier
+    """
+    return get_compiled_template(topic, compact).render(profile_context, modifier, query=query)
+
+def render_transform_prompt(
+    mode: str,
+    previous: str,
+    query: str,
+    profile_context: str = "",
+    length_note: str = ""
+) -> str:
+    """
+    Render the delta prompt that rewrites a previous answer for a button mode
+    """
+    return TRANSFORM_TEMPLATE.format(
+        query=query,
+        profile_context=profile_context,
+        previous=previous.strip(),
+        instruction=TRANSFORM_INSTRUCTIONS[mode],
+        length_note=length_note
+    )
+
+# Section-parallel layout: each "## " section is requested on its own with
+# the template's shared preamble, so sections can be generated concurrently
+SECTION_INSTRUCTION = (
+    "This guide is written one section at a time. Write only the section below, "
+    "starting with its heading line exactly as shown. The other sections ({others}) "
+    "are written separately, so do not repeat their content or add an introduction."
+)
+
+def split_template(text: str) -> Tuple[str, List[Tuple[str, str]], str]:
+    """
+    Split a template into its preamble, ("## " heading, body) sections and
+    the closing paragraphs that follow the last section
+    """
+    lines = text.strip("\n").split("\n")
+    starts = [idx for idx, line in enumerate(lines) if line.startswith("## ")]
+    if not starts:
+        return text, [], ""
+
+    preamble = "\n".join(lines[:starts[0]]).rstrip()
+    sections = []
+    for pos, start in enumerate(starts):
+        end = starts[pos + 1] if pos + 1 < len(starts) else len(lines)
+        sections.append((lines[start], "\n".join(lines[start + 1:end]).strip("\n")))
+
+    # The last section runs until its first blank line; the rest is trailer
+    heading, body = sections[-1]
+    body, _, trailer = body.partition("\n\n")
+    sections[-1] = (heading, body)
+    return preamble, sections, trailer.strip()
+
+@lru_cache(maxsize=None)
+def get_section_templates(topic: str, compact: bool = False) -> List[Tuple[str, PromptTemplate]]:
+    """
+    Per-section templates for a topic, parsed on first use
+    """
+    templates = COMPACT_PROMPT_TEMPLATES if compact else PROMPT_TEMPLATES
+    if topic not in templates:
+        return get_section_templates("general", compact)
+    preamble, sections, trailer = split_template(templates[topic])
+    low, high = get_word_range(topic)
+    share = max(1, len(sections))
+    # Closing notes such as legal disclaimers belong with the last section
+    closing = "\n".join(line for line in trailer.split("\n") if not WORD_RANGE_PATTERN.search(line)).strip()
+
+    section_templates = []
+    for pos, (heading, body) in enumerate(sections):
+        others = ", ".join(h.lstrip("# ").strip() for h, _ in sections if h != heading)
+        parts = [preamble, SECTION_INSTRUCTION.format(others=others), heading + "\n" + body]
+        if closing and pos == len(sections) - 1:
+            parts.append(closing)
+        parts.append(f"Section length: {low // share}-{high // share} words.")
+        section_templates.append((heading, PromptTemplate("\n\n".join(parts) + "\n")))
+    return section_templates
+
+def render_section_prompts(
+    topic: str,
+    query: str,
+    profile_context: str = "",
+    modifier: str = "",
+    compact: bool = False
+) -> List[Tuple[str, str]]:
+    """
+    Render one (heading, prompt) pair per template section
+    """
+    return [
+        (heading, template.render(profile_context, modifier, query=query))
+        for heading, template in get_section_templates(topic, compact)
+    ]
+
+@lru_cache(maxsize=None)
+def get_required_headings(topic: str, compact: bool = False) -> Tuple[str, ...]:
+    """
+    The "## " headings a topic's template asks for, in order
+    """
+    templates = COMPACT_PROMPT_TEMPLATES if compact else PROMPT_TEMPLATES
+    _, sections, _ = split_template(templates.get(topic, templates["general"]))
+    return tuple(heading for heading, _ in sections)
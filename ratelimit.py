@@ -0,0 +1,349 @@
+"""
+Server-side rate limiting and admission control for the Startup Guide Tool
+
+Token buckets limit requests per session, per API key and globally per
+model. Requests that pass the limits wait in a bounded admission queue
+that is served round-robin across sessions, so one busy session cannot
+starve the others and bursts turn into short, predictable queues instead
+of upstream 429s.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, List, Optional, Tuple
+
+from config import Config
+
+
+class RateLimitExceeded(Exception):
+    """A limit cannot be satisfied within the admission timeout"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded ({scope}); retry in {retry_after:.0f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class QueueFullError(Exception):
+    """The admission queue is at capacity"""
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe on its own"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated = now
+
+    def wait_time(self, now: float, amount: float = 1.0) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if available now)
+        """
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float = 1.0) -> None:
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Per-session, per-API-key and per-model token buckets"""
+
+    def __init__(self, max_tracked: int = 10000):
+        self.max_tracked = max_tracked
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+    def _bucket(self, scope: str, key: str) -> TokenBucket:
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            capacity, window = Config.RATE_LIMITS[scope]
+            bucket = TokenBucket(capacity, capacity / float(window))
+            self._buckets[(scope, key)] = bucket
+            # Forget the least recently used sessions/keys
+            while len(self._buckets) > self.max_tracked:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((scope, key))
+        return bucket
+
+    def buckets_for(self, session_id: str, api_key: str, model: str) -> List[Tuple[str, TokenBucket]]:
+        key_digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return [
+            ("session", self._bucket("session", session_id)),
+            ("api_key", self._bucket("api_key", key_digest)),
+            ("model", self._bucket("model", model))
+        ]
+
+    def remaining(self, session_id: str) -> int:
+        """
+        Requests left in a session's bucket right now
+        """
+        bucket = self._bucket("session", session_id)
+        bucket.wait_time(time.monotonic())
+        return int(bucket.tokens)
+
+
+class Ticket:
+    __slots__ = (
+        "session_id", "model", "modifier", "max_tokens", "buckets", "requests", "streams", "granted", "enqueued", "cost"
+    )
+
+    def __init__(self, session_id: str, model: str, modifier: str, max_tokens: int, buckets, requests: int = 1):
+        self.session_id = session_id
+        self.model = model
+        self.modifier = modifier
+        self.max_tokens = max_tokens
+        self.buckets = buckets
+        self.requests = requests  # upstream requests it will make (e.g. one per section)
+        self.streams = 1  # slots granted: how many of them may run at once
+        self.granted = False
+        self.enqueued = time.monotonic()
+        self.cost = 0.0
+
+
+class AdmissionController:
+    """
+    Bounded admission queue with round-robin fairness across sessions and
+    a cap on concurrent upstream generations
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[RateLimiter] = None,
+        max_concurrent: int = Config.MAX_CONCURRENT_GENERATIONS,
+        max_queue: int = Config.ADMISSION_QUEUE_SIZE,
+        timeout: float = Config.ADMISSION_TIMEOUT_SECONDS
+    ):
+        self.limiter = limiter or RateLimiter()
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "background_skipped": 0}
+
+    # Scheduling hooks; subclasses override these to change dispatch order
+
+    def _prepare(self, ticket: Ticket) -> None:
+        """Called once when a ticket is created"""
+
+    def _candidates(self, now: float) -> List[Ticket]:
+        """
+        Head tickets of each session in the order they should be tried
+        """
+        return [queue[0] for queue in self._queues.values()]
+
+    def _can_start(self, ticket: Ticket) -> bool:
+        return True
+
+    def _free_streams(self, ticket: Ticket) -> int:
+        """Slots a startable ticket could be granted right now"""
+        return self.max_concurrent - self.active
+
+    def _on_grant(self, ticket: Ticket, now: float) -> None:
+        """Called (under the lock) when a ticket is granted a slot"""
+
+    def _on_release(self, ticket: Ticket) -> None:
+        """Called (under the lock) when a granted request finishes"""
+
+    def _waiting_order(self) -> List[Ticket]:
+        """
+        Waiting tickets in the order round-robin dispatch would serve them
+        """
+        order = []
+        queues = [list(q) for q in self._queues.values()]
+        depth = 0
+        while True:
+            layer = [q[depth] for q in queues if depth < len(q)]
+            if not layer:
+                return order
+            order.extend(layer)
+            depth += 1
+
+    def _limit_wait(self, ticket: Ticket, now: float) -> Tuple[float, str]:
+        wait, scope = 0.0, ""
+        for name, bucket in ticket.buckets:
+            bucket_wait = bucket.wait_time(now, min(ticket.requests, bucket.capacity))
+            if bucket_wait > wait:
+                wait, scope = bucket_wait, name
+        return wait, scope
+
+    def _dispatch(self) -> float:
+        """
+        Grant slots to waiting tickets in round-robin order. Returns the
+        shortest rate-limit wait among tickets that could not be granted.
+        """
+        now = time.monotonic()
+        next_retry = float("inf")
+        for head in self._candidates(now):
+            if self.active >= self.max_concurrent:
+                break
+            if not self._can_start(head):
+                continue
+            wait, _ = self._limit_wait(head, now)
+            if wait > 0:
+                next_retry = min(next_retry, wait)
+                continue
+            for _, bucket in head.buckets:
+                bucket.consume(min(head.requests, bucket.capacity))
+            # As many parallel streams as are free, at least one
+            head.streams = max(1, min(head.requests, self._free_streams(head)))
+            head.granted = True
+            queue = self._queues.pop(head.session_id)
+            queue.popleft()
+            self._queued -= 1
+            self.active += head.streams
+            self._on_grant(head, now)
+            # Served sessions move to the back of the rotation
+            if queue:
+                self._queues[head.session_id] = queue
+        self._cond.notify_all()
+        return next_retry
+
+    def queue_position(self, ticket: Ticket) -> int:
+        """
+        1-based position of a waiting ticket in fair dispatch order
+        """
+        with self._cond:
+            order = self._waiting_order()
+            return order.index(ticket) + 1 if ticket in order else 0
+
+    def session_remaining(self, session_id: str) -> int:
+        with self._cond:
+            return self.limiter.remaining(session_id)
+
+    def queue_depth(self) -> int:
+        """
+        Requests waiting for a slot right now
+        """
+        with self._cond:
+            return self._queued
+
+    def _grant_background(self, ticket: Ticket) -> None:
+        """
+        Grant a background ticket a slot at once or raise. Background work
+        never waits, so it only runs on capacity no user is queueing for.
+        Called with the lock held.
+        """
+        if self._queued or self.active >= self.max_concurrent or not self._can_start(ticket):
+            self.stats["background_skipped"] += 1
+            raise QueueFullError("No spare capacity for background work")
+        now = time.monotonic()
+        wait, scope = self._limit_wait(ticket, now)
+        if wait > 0:
+            self.stats["background_skipped"] += 1
+            raise RateLimitExceeded(scope, wait)
+        for _, bucket in ticket.buckets:
+            bucket.consume()
+        ticket.granted = True
+        self.active += ticket.streams
+        self._on_grant(ticket, now)
+
+    @contextmanager
+    def admit(
+        self,
+        session_id: str,
+        api_key: str,
+        model: str,
+        modifier: str = "generate",
+        max_tokens: int = Config.DEFAULT_MAX_TOKENS,
+        on_wait: Optional[Callable[[int, float], None]] = None,
+        background: bool = False,
+        requests: int = 1
+    ):
+        """
+        Block until the request may call the upstream API.
+
+        on_wait(position, waited_seconds) is called periodically while
+        queued. Raises RateLimitExceeded if a limit cannot be met within
+        the timeout and QueueFullError if the queue is full. Background
+        requests (prefetch, revalidation) have the lowest priority: they
+        are admitted only if they can start at once, and are charged to
+        the API key and model but not to the user's session.
+
+        requests is how many upstream requests the caller will make, e.g.
+        one per section; each is charged to the buckets. The granted
+        ticket's streams (at least one, at most requests) is how many slots
+        it holds, and the caller must not run more requests at once.
+        """
+        with self._cond:
+            buckets = self.limiter.buckets_for(session_id, api_key, model)
+            if background:
+                buckets = [(name, bucket) for name, bucket in buckets if name != "session"]
+            ticket = Ticket(session_id, model, modifier, max_tokens, buckets, 1 if background else max(1, requests))
+            if background:
+                self._grant_background(ticket)
+            else:
+                self._prepare(ticket)
+                wait, scope = self._limit_wait(ticket, time.monotonic())
+                if wait > self.timeout:
+                    self.stats["rejected"] += 1
+                    raise RateLimitExceeded(scope, wait)
+                if self._queued >= self.max_queue:
+                    self.stats["rejected"] += 1
+                    raise QueueFullError("Too many requests are waiting; please try again shortly.")
+                self._queues.setdefault(session_id, deque()).append(ticket)
+                self._queued += 1
+                next_retry = self._dispatch()
+                if not ticket.granted:
+                    self.stats["queued"] += 1
+
+        deadline = ticket.enqueued + self.timeout
+        try:
+            while not ticket.granted:
+                if on_wait:
+                    on_wait(self.queue_position(ticket), time.monotonic() - ticket.enqueued)
+                with self._cond:
+                    if ticket.granted:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitExceeded("queue", self._limit_wait(ticket, time.monotonic())[0])
+                    self._cond.wait(timeout=min(remaining, next_retry, Config.ADMISSION_POLL_SECONDS))
+                    next_retry = self._dispatch()
+        except BaseException:
+            with self._cond:
+                if ticket.granted:
+                    # Granted concurrently with the failure: hand the slots back
+                    self.active -= ticket.streams
+                    self._on_release(ticket)
+                    self._dispatch()
+                else:
+                    queue = self._queues.get(session_id)
+                    if queue and ticket in queue:
+                        queue.remove(ticket)
+                        self._queued -= 1
+                        if not queue:
+                            del self._queues[session_id]
+                self.stats["rejected"] += 1
+            raise
+
+        with self._cond:
+            self.stats["admitted"] += 1
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self.active -= ticket.streams
+                self._on_release(ticket)
+                self._dispatch()
+
+
+# Process-wide controller shared by all sessions
+admission = AdmissionController()
@@ -0,0 +1,187 @@
+"""
+Cost/latency-aware model routing for the Startup Guide Tool
+
+The "auto" model option picks a model per request. Candidates come from
+the topic's preference list (cheap models for general questions, stronger
+ones for legal documents); each is checked against live metrics over the
+last one to two windows (p95 latency and time to first token, error rate)
+and its expected cost against the configured budget. The first candidate
+meeting every constraint wins. A model rejected on latency gets no
+traffic, so its samples age out of the window and it is tried again.
+Every decision, including why other candidates were rejected, is kept in
+memory for auditing and, with Config.ROUTER_DECISION_LOG_PATH set, also
+appended to a JSONL file through a buffered writer.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from adaptive import length_tracker
+from api import API_REQUEST_SECONDS, API_REQUESTS, API_TTFT
+from config import Config
+from metrics import Histogram, JsonlEventLog, bucket_percentile, registry
+
+AUTO_MODEL = "auto"
+
+ROUTER_DECISIONS = registry.counter("router_decisions_total", "Auto-routing decisions by chosen model and reason")
+
+
+class ModelRouter:
+    """Chooses a model per request and keeps an audit log of decisions"""
+
+    def __init__(self, log_path: str = Config.ROUTER_DECISION_LOG_PATH, max_decisions: int = 1000):
+        self.log_path = log_path
+        self._log = JsonlEventLog(log_path) if log_path else None
+        self.decisions: Deque[Dict] = deque(maxlen=max_decisions)
+        self._window_start = time.monotonic()
+        self._baseline: Dict[str, Dict] = {}
+        self._previous: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _request_counts(self) -> Dict[str, Dict[str, float]]:
+        """
+        Cumulative {model: {"total": n, "errors": n}} from the API counters.
+        Cancelled requests were ended by the user, not the model, and count
+        as neither; "incomplete" ones (the stream kept dropping) are errors.
+        """
+        counts: Dict[str, Dict[str, float]] = {}
+        for labels, value in API_REQUESTS.items():
+            if labels.get("status") == "cancelled":
+                continue
+            model_counts = counts.setdefault(labels.get("model", ""), {"total": 0.0, "errors": 0.0})
+            model_counts["total"] += value
+            if labels.get("status") != "200":
+                model_counts["errors"] += value
+        return counts
+
+    def _snapshot(self) -> Dict[str, Dict]:
+        """
+        Cumulative request counts and latency bucket counts per model
+        """
+        return {
+            "requests": self._request_counts(),
+            "latency": {
+                labels.get("model", ""): API_REQUEST_SECONDS.snapshot(**labels)["counts"]
+                for labels in API_REQUEST_SECONDS.label_sets()
+            },
+            "ttft": {
+                labels.get("model", ""): API_TTFT.snapshot(**labels)["counts"]
+                for labels in API_TTFT.label_sets()
+            }
+        }
+
+    def _since(self) -> Dict[str, Dict]:
+        """
+        Snapshot taken at the start of the previous window (empty at first)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= Config.ROUTER_WINDOW_SECONDS:
+                # Roll the window: observations older than two windows stop counting
+                self._previous = self._baseline
+                self._baseline = self._snapshot()
+                self._window_start = now
+            return self._previous
+
+    def error_rate(self, model: str) -> Optional[float]:
+        """
+        Error rate over the current and previous window, or None without data
+        """
+        since = self._since().get("requests", {})
+        current = self._request_counts()
+        model_now = current.get(model, {"total": 0.0, "errors": 0.0})
+        model_then = since.get(model, {"total": 0.0, "errors": 0.0})
+        total = model_now["total"] - model_then["total"]
+        if total < Config.ROUTER_MIN_SAMPLES:
+            return None
+        return (model_now["errors"] - model_then["errors"]) / total
+
+    def windowed_p95(self, histogram: Histogram, kind: str, model: str) -> Optional[float]:
+        """
+        p95 of a latency histogram over the current and previous window, or
+        None with fewer than Config.ROUTER_MIN_SAMPLES observations
+        """
+        counts = histogram.snapshot(model=model)["counts"]
+        then = self._since().get(kind, {}).get(model)
+        if then:
+            counts = [now - before for now, before in zip(counts, then)]
+        if sum(counts) < Config.ROUTER_MIN_SAMPLES:
+            return None
+        return bucket_percentile(histogram.bounds, counts, 95)
+
+    def expected_cost(self, model: str, topic: str, modifier: str, prompt_tokens: int, max_tokens: int) -> float:
+        observed = length_tracker.stats(topic, modifier, model)
+        completion_tokens = observed["p50"] if observed else max_tokens * Config.ROUTER_EXPECTED_OUTPUT_RATIO
+        return Config.estimate_cost(model, prompt_tokens, int(completion_tokens))
+
+    def evaluate(self, model: str, topic: str, modifier: str, prompt_tokens: int, max_tokens: int) -> Dict:
+        """
+        Measured and expected figures for a candidate plus any violated constraints
+        """
+        candidate = {
+            "model": model,
+            "expected_cost": self.expected_cost(model, topic, modifier, prompt_tokens, max_tokens),
+            "p95_latency": self.windowed_p95(API_REQUEST_SECONDS, "latency", model),
+            "p95_ttft": self.windowed_p95(API_TTFT, "ttft", model),
+            "error_rate": self.error_rate(model),
+            "rejected": []
+        }
+        if candidate["expected_cost"] > Config.ROUTER_MAX_COST_PER_REQUEST:
+            candidate["rejected"].append("over_budget")
+        if candidate["p95_latency"] is not None and candidate["p95_latency"] > Config.ROUTER_LATENCY_SLO_SECONDS:
+            candidate["rejected"].append("latency_slo")
+        if candidate["p95_ttft"] is not None and candidate["p95_ttft"] > Config.ROUTER_TTFT_SLO_SECONDS:
+            candidate["rejected"].append("ttft_slo")
+        if candidate["error_rate"] is not None and candidate["error_rate"] > Config.ROUTER_MAX_ERROR_RATE:
+            candidate["rejected"].append("error_rate")
+        return candidate
+
+    def choose(
+        self,
+        topic: str,
+        modifier: str = "generate",
+        prompt_tokens: int = 0,
+        max_tokens: int = Config.DEFAULT_MAX_TOKENS,
+        session_id: str = ""
+    ) -> Dict:
+        """
+        Pick a model for a request. Returns the logged decision record.
+        """
+        preferences: List[str] = Config.ROUTER_TOPIC_PREFERENCES.get(topic, Config.ROUTER_TOPIC_PREFERENCES["general"])
+        if modifier == "simplify":
+            # Simplifying never needs the strongest model: try the cheapest first
+            preferences = sorted(preferences, key=lambda m: Config.get_prices(m)["output"])
+        candidates = [self.evaluate(model, topic, modifier, prompt_tokens, max_tokens) for model in preferences]
+
+        chosen = next((c for c in candidates if not c["rejected"]), None)
+        if chosen is not None:
+            reason = "preferred" if chosen is candidates[0] else "fallback"
+        else:
+            # Nothing meets every constraint: degrade to the cheapest healthy option
+            healthy = [c for c in candidates if "error_rate" not in c["rejected"]] or candidates
+            chosen = min(healthy, key=lambda c: c["expected_cost"])
+            reason = "constraints_unmet"
+
+        decision = {
+            "ts": time.time(),
+            "session": session_id,
+            "topic": topic,
+            "modifier": modifier,
+            "prompt_tokens": prompt_tokens,
+            "max_tokens": max_tokens,
+            "model": chosen["model"],
+            "reason": reason,
+            "candidates": candidates
+        }
+        ROUTER_DECISIONS.inc(model=chosen["model"], reason=reason)
+        with self._lock:
+            self.decisions.append(decision)
+        if self._log is not None:
+            # Buffered, and outside the router lock
+            self._log.write(decision)
+        return decision
+
+
+# Process-wide router fed by the shared metrics registry
+router = ModelRouter()
@@ -0,0 +1,107 @@
+"""
+Priority scheduling of generations across sessions
+
+Extends the admission controller so that cheap requests (e.g. "Simplify"
+on gpt-4o-mini) are not stuck behind long "Expand" requests on larger
+models. Waiting requests are ordered by estimated cost minus an aging
+credit, so long jobs still run once they have waited long enough, and
+each model has its own concurrency cap.
+"""
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+from metrics import registry
+from ratelimit import AdmissionController, Ticket, admission
+
+
+def estimate_job_cost(model: str, modifier: str, max_tokens: int) -> float:
+    """
+    Relative cost of a generation: model slowness x expected output size
+    """
+    weight = Config.MODEL_LATENCY_WEIGHTS.get(model, Config.MODEL_LATENCY_WEIGHTS["default"])
+    scale = Config.ADAPTIVE_MODIFIER_SCALE.get(modifier, 1.0)
+    return weight * scale * max_tokens / 1000.0
+
+
+class PriorityScheduler(AdmissionController):
+    """
+    Shortest-job-first admission with aging and per-model concurrency caps
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active_by_model: Dict[str, int] = {}
+        self.wait_seconds = registry.histogram(
+            "scheduler_wait_seconds", "Time requests waited for admission", Config.SCHEDULER_WAIT_BUCKETS
+        )
+        self.queue_depth = registry.histogram(
+            "scheduler_queue_depth", "Admission queue depth seen by arriving requests", Config.SCHEDULER_DEPTH_BUCKETS
+        )
+
+    def _prepare(self, ticket: Ticket) -> None:
+        ticket.cost = estimate_job_cost(ticket.model, ticket.modifier, ticket.max_tokens)
+        self.queue_depth.observe(self._queued)
+
+    def _priority(self, ticket: Ticket, now: float) -> float:
+        return ticket.cost - Config.SCHEDULER_AGING_RATE * (now - ticket.enqueued)
+
+    def _candidates(self, now: float) -> List[Ticket]:
+        heads = super()._candidates(now)
+        return sorted(heads, key=lambda ticket: self._priority(ticket, now))
+
+    def _can_start(self, ticket: Ticket) -> bool:
+        cap = Config.MODEL_CONCURRENCY.get(ticket.model, Config.MODEL_CONCURRENCY["default"])
+        return self.active_by_model.get(ticket.model, 0) < cap
+
+    def _free_streams(self, ticket: Ticket) -> int:
+        cap = Config.MODEL_CONCURRENCY.get(ticket.model, Config.MODEL_CONCURRENCY["default"])
+        return min(super()._free_streams(ticket), cap - self.active_by_model.get(ticket.model, 0))
+
+    def _on_grant(self, ticket: Ticket, now: float) -> None:
+        self.active_by_model[ticket.model] = self.active_by_model.get(ticket.model, 0) + ticket.streams
+        self.wait_seconds.observe(now - ticket.enqueued, model=ticket.model)
+
+    def _on_release(self, ticket: Ticket) -> None:
+        self.active_by_model[ticket.model] -= ticket.streams
+
+    def _waiting_order(self) -> List[Ticket]:
+        # Session heads compete on priority; later tickets of a session follow its head
+        now = time.monotonic()
+        order = []
+        queues = {sid: list(queue) for sid, queue in self._queues.items()}
+        while queues:
+            best = min(queues, key=lambda sid: self._priority(queues[sid][0], now))
+            order.append(queues[best].pop(0))
+            if not queues[best]:
+                del queues[best]
+        return order
+
+    def snapshot(self) -> Dict:
+        """
+        Current queue state and histograms for dashboards
+        """
+        with self._cond:
+            depth = self._queued
+            active = dict(self.active_by_model)
+        return {
+            "queue_depth": depth,
+            "active_by_model": active,
+            "wait_seconds": {
+                labels["model"]: self.wait_seconds.snapshot(**labels)
+                for labels in self.wait_seconds.label_sets()
+            },
+            "queue_depth_histogram": self.queue_depth.snapshot()
+        }
+
+
+# Process-wide scheduler shared by all sessions
+scheduler = PriorityScheduler()
+
+
+def get_admission_controller(policy: Optional[str] = None) -> AdmissionController:
+    """
+    Admission controller for the configured scheduling policy
+    """
+    policy = policy or Config.SCHEDULING_POLICY
+    return scheduler if policy == "priority" else admission
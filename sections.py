@@ -0,0 +1,160 @@
+"""
+Section-parallel generation for the Startup Guide Tool
+
+A structured guide is requested as one sub-request per "## " section.
+Sub-requests run concurrently on a thread pool and push their streamed
+text onto a queue; the calling thread drains the queue and reports every
+update, so UI rendering stays on the caller's thread (Streamlit elements
+cannot be written from worker threads). Wall-clock time approaches that of
+the longest section instead of the whole document.
+"""
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api import CancelToken, build_messages, build_payload, chat_completion, extract_cached_tokens
+from config import Config
+from metrics import registry
+
+SECTION_REQUESTS = registry.counter("section_requests_total", "Section sub-requests by outcome")
+
+USAGE_FIELDS = ["prompt_tokens", "completion_tokens", "total_tokens"]
+
+
+def section_max_tokens(max_tokens: int, sections: int) -> int:
+    """
+    Per-section token limit: an even split of max_tokens plus headroom
+    """
+    share = max_tokens / max(1, sections) * Config.SECTION_TOKEN_HEADROOM
+    return max(Config.ADAPTIVE_MIN_TOKENS, int(math.ceil(share)))
+
+
+def build_section_payloads(
+    section_prompts: List[Tuple[str, str]],
+    model: str,
+    max_tokens: int,
+    stream: bool = True,
+    context: Optional[List[Dict]] = None
+) -> List[Tuple[str, Dict]]:
+    """
+    One (heading, payload) pair per section prompt
+    """
+    limit = section_max_tokens(max_tokens, len(section_prompts))
+    return [
+        (heading, build_payload(build_messages(prompt, context), model, limit, stream))
+        for heading, prompt in section_prompts
+    ]
+
+
+def section_text(heading: str, content: str) -> str:
+    """
+    Section content with its heading, added if the model left it out
+    """
+    content = content.strip()
+    if content.startswith("#"):
+        return content
+    return f"{heading}\n{content}"
+
+
+def merge_usage(usages: List[Optional[Dict]]) -> Optional[Dict]:
+    """
+    Sum provider usage blocks; None if no sub-request reported usage
+    """
+    reported = [usage for usage in usages if usage]
+    if not reported:
+        return None
+    merged = {field: sum(usage.get(field) or 0 for usage in reported) for field in USAGE_FIELDS}
+    # Whichever field each provider reports cached tokens in
+    merged["prompt_tokens_details"] = {"cached_tokens": sum(extract_cached_tokens(usage) for usage in reported)}
+    return merged
+
+
+def generate_sections(
+    section_payloads: List[Tuple[str, Dict]],
+    api_key: str,
+    on_update: Optional[Callable[[int, str, bool], None]] = None,
+    max_workers: Optional[int] = None,
+    cancel_token: Optional[CancelToken] = None
+) -> Dict:
+    """
+    Generate all sections concurrently.
+
+    on_update(index, text, finished) is called on the calling thread after
+    every streamed chunk or finished section, with that section's text so
+    far. Returns the same shape as api.chat_completion with the sections
+    joined in template order. If any section fails, the other section
+    streams are closed at once and the first error is raised. Cancelling
+    cancel_token, or an exception from on_update, also closes every
+    section stream.
+    """
+    count = len(section_payloads)
+    cancel_token = cancel_token or CancelToken()
+    # Sections stop together without marking the caller's request cancelled
+    sections_token = CancelToken()
+    cancel_token.on_cancel(lambda: sections_token.cancel(cancel_token.reason or "cancelled"))
+    events: "queue.Queue[Tuple[int, str, object]]" = queue.Queue()
+    texts = [""] * count
+    done = [False] * count
+    results: List[Optional[Dict]] = [None] * count
+    errors: List[Exception] = []
+
+    def worker(idx: int, payload: Dict) -> None:
+        try:
+            result = chat_completion(
+                payload, api_key,
+                on_delta=lambda delta, full_response: events.put((idx, "delta", full_response)),
+                cancel_token=sections_token
+            )
+            events.put((idx, "done", result))
+        except Exception as e:
+            events.put((idx, "error", e))
+
+    workers = max(1, min(count, max_workers or Config.SECTION_PARALLELISM))
+    # Upstream streams are capped by max_workers (the caller's admission
+    # grant); sections beyond it start as others finish
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="section") as pool:
+        for idx, (_, payload) in enumerate(section_payloads):
+            pool.submit(worker, idx, payload)
+
+        remaining = count
+        try:
+            while remaining:
+                idx, kind, value = events.get()
+                if kind == "delta":
+                    texts[idx] = value
+                else:
+                    remaining -= 1
+                    done[idx] = True
+                    if kind == "done":
+                        results[idx] = value
+                        texts[idx] = value["content"]
+                        SECTION_REQUESTS.inc(outcome="cancelled" if value["finish_reason"] == "cancelled" else "ok")
+                    else:
+                        errors.append(value)
+                        SECTION_REQUESTS.inc(outcome="error")
+                        # The answer is lost anyway; stop paying for the rest
+                        sections_token.cancel("section_failed")
+                if on_update:
+                    on_update(idx, texts[idx], done[idx])
+        except BaseException:
+            # Stop the workers before the pool waits for them
+            cancel_token.cancel("interrupted")
+            raise
+
+    if errors:
+        raise errors[0]
+
+    usage = merge_usage([result["usage"] for result in results])
+    cancelled = any(result["finish_reason"] == "cancelled" for result in results)
+    return {
+        "content": "\n\n".join(section_text(heading, text) for (heading, _), text in zip(section_payloads, texts)),
+        "usage": usage,
+        "cached_tokens": sum(result["cached_tokens"] for result in results),
+        "finish_reason": "cancelled" if cancelled else next(
+            (reason for reason in ("incomplete", "length") if any(r["finish_reason"] == reason for r in results)),
+            "stop"
+        ),
+        "coalesced": all(result.get("coalesced", False) for result in results),
+        "sections": count
+    }
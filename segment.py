@@ -0,0 +1,381 @@
+"""
+Memory-mapped on-disk cache segment for the Startup Guide Tool
+
+One append-only file holds generated responses and their precomputed
+analysis (checklist, metrics, timeline) so that several Streamlit worker
+processes can share them. Layout:
+
+    header   64 bytes: magic, version, slot count, record count, live keys, data end
+    index    slot count x 16 bytes: (64-bit key hash, record offset), open addressing
+    records  crc32, key/meta/body lengths, created; then key, JSON meta, UTF-8 body
+
+Readers map the file and probe the index without locks or deserializing;
+a lookup returns memoryviews into the mapping. Writers serialize on an
+fcntl lock file, append the record, then publish it in the index and
+advance the header's data end. On open and before every append, records
+past the data end are re-indexed if their CRC checks out and a torn tail
+is truncated, so a crash mid-append loses at most that record. Compaction
+rewrites live records into a new file (with a larger index when needed)
+and atomically renames it over the old one; other processes notice the
+new inode on their next access.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import Config
+from metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; locking is then per process only
+    fcntl = None
+
+MAGIC = b"SGSEG\x00\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")  # magic, version, slots, records, live keys, data end
+HEADER_SIZE = 64
+SLOT = struct.Struct("<QQ")  # key hash, record offset (0 = empty slot)
+RECORD = struct.Struct("<IIIId")  # crc32 of the rest, key, meta and body lengths, created
+MAX_LOAD = 0.7  # index load factor that triggers a rebuild with more slots
+
+SEGMENT_OPS = registry.counter("cache_segment_ops_total", "Cache segment operations by kind and result")
+SEGMENT_RECOVERED = registry.counter("cache_segment_recovered_total", "Records re-indexed or torn bytes truncated on recovery")
+
+
+def key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def encode_record(key: str, body: str, meta: Dict, created: Optional[float] = None) -> bytes:
+    """
+    Serialize one record, CRC included
+    """
+    key_bytes = key.encode("utf-8")
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    body_bytes = body.encode("utf-8")
+    rest = struct.pack("<IIId", len(key_bytes), len(meta_bytes), len(body_bytes), created or time.time())
+    payload = rest + key_bytes + meta_bytes + body_bytes
+    return struct.pack("<I", zlib.crc32(payload)) + payload
+
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(0, (value - 1).bit_length())
+
+
+class SegmentEntry:
+    """A record viewed in place; body and meta are memoryviews into the mapping"""
+
+    __slots__ = ("key", "created", "meta", "body")
+
+    def __init__(self, key: str, created: float, meta: memoryview, body: memoryview):
+        self.key = key
+        self.created = created
+        self.meta = meta
+        self.body = body
+
+    def text(self) -> str:
+        return str(self.body, "utf-8")
+
+    def analysis(self) -> Dict:
+        return json.loads(bytes(self.meta))
+
+
+class CacheSegment:
+    """Append-only, memory-mapped response store with an on-disk hash index"""
+
+    def __init__(
+        self,
+        path: str,
+        initial_slots: int = Config.CACHE_SEGMENT_INITIAL_SLOTS,
+        fsync: bool = Config.CACHE_SEGMENT_FSYNC,
+        max_age: Optional[float] = None
+    ):
+        self.path = path
+        self.max_age = max_age  # records older than this are dropped when compacting
+        self.initial_slots = _next_power_of_two(initial_slots)
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        with self._locked():
+            if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+                self._create(path, self.initial_slots)
+            self._open()
+            self._recover()
+
+    # -- file handling -------------------------------------------------
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Exclusive access across threads and, with fcntl, across processes
+        """
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _create(self, target: str, slots: int) -> None:
+        fd = os.open(target, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            data_start = HEADER_SIZE + slots * SLOT.size
+            os.ftruncate(fd, data_start)  # zero-filled index
+            os.pwrite(fd, HEADER.pack(MAGIC, VERSION, slots, 0, 0, data_start), 0)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _open(self) -> None:
+        fd = os.open(self.path, os.O_RDWR)
+        stat = os.fstat(fd)
+        magic, version = HEADER.unpack(os.pread(fd, HEADER.size, 0))[:2]
+        if magic != MAGIC or version != VERSION:
+            os.close(fd)
+            raise ValueError(f"{self.path} is not a version {VERSION} cache segment")
+        self._close()
+        self._fd = fd
+        self._inode = stat.st_ino
+        self._mm = mmap.mmap(fd, stat.st_size)
+
+    def _close(self) -> None:
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # Entries handed out still view the old mapping; it is
+                # released when the last of them is garbage collected
+                pass
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _ensure_current(self) -> None:
+        """
+        Reopen after another process compacted the file; remap after it grew
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode:
+            self._open()
+        elif stat.st_size > len(self._mm):
+            self._mm = mmap.mmap(self._fd, stat.st_size)
+
+    def _header(self) -> Tuple[int, int, int, int]:
+        _, _, slots, records, live, data_end = HEADER.unpack_from(self._mm, 0)
+        return slots, records, live, data_end
+
+    def _write_header(self, slots: int, records: int, live: int, data_end: int) -> None:
+        os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, slots, records, live, data_end), 0)
+
+    # -- records and index ---------------------------------------------
+
+    def _record_at(self, offset: int, limit: int) -> Optional[Tuple[bytes, float, int, int, int]]:
+        """
+        (key, created, meta start, body start, end) of the record at offset,
+        or None if it does not fit below limit
+        """
+        if offset + RECORD.size > limit:
+            return None
+        _, key_len, meta_len, body_len, created = RECORD.unpack_from(self._mm, offset)
+        key_start = offset + RECORD.size
+        meta_start = key_start + key_len
+        body_start = meta_start + meta_len
+        end = body_start + body_len
+        if end > limit:
+            return None
+        return bytes(self._mm[key_start:meta_start]), created, meta_start, body_start, end
+
+    def _crc_ok(self, offset: int, end: int) -> bool:
+        (crc,) = struct.unpack_from("<I", self._mm, offset)
+        return zlib.crc32(self._mm[offset + 4:end]) == crc
+
+    def _probe(self, slots: int, hashed: int) -> Iterator[int]:
+        start = hashed & (slots - 1)
+        for step in range(slots):
+            yield (start + step) & (slots - 1)
+
+    def _find(self, key: bytes, hashed: int, data_end: int) -> Tuple[int, int]:
+        """
+        (slot, record offset) for key, or (first empty slot, 0) if absent
+        """
+        slots = self._header()[0]
+        for slot in self._probe(slots, hashed):
+            slot_hash, offset = SLOT.unpack_from(self._mm, HEADER_SIZE + slot * SLOT.size)
+            if offset == 0:
+                return slot, 0
+            if slot_hash == hashed:
+                record = self._record_at(offset, data_end)
+                if record is not None and record[0] == key:
+                    return slot, offset
+        raise RuntimeError("cache segment index is full")
+
+    def _index(self, key: bytes, offset: int, data_end: int) -> bool:
+        """
+        Point key's slot at offset; True if the key was new
+        """
+        hashed = key_hash(key)
+        slot, existing = self._find(key, hashed, data_end)
+        os.pwrite(self._fd, SLOT.pack(hashed, offset), HEADER_SIZE + slot * SLOT.size)
+        return existing == 0
+
+    def _recover(self) -> None:
+        """
+        Index valid records past the committed data end and truncate a torn
+        tail. Called with the lock held.
+        """
+        self._ensure_current()
+        slots, records, live, data_end = self._header()
+        size = os.fstat(self._fd).st_size
+        offset = data_end
+        while offset < size:
+            record = self._record_at(offset, size)
+            if record is None or not self._crc_ok(offset, record[4]):
+                break
+            live += self._index(record[0], offset, record[4])
+            records += 1
+            offset = record[4]
+            SEGMENT_RECOVERED.inc(kind="record")
+        if offset < size:
+            # Bytes of an append that never completed
+            SEGMENT_RECOVERED.inc(size - offset, kind="torn_bytes")
+            os.ftruncate(self._fd, offset)
+            self._mm = mmap.mmap(self._fd, offset)
+        if offset != data_end:
+            self._write_header(slots, records, live, offset)
+            if self.fsync:
+                os.fsync(self._fd)
+
+    # -- public API ----------------------------------------------------
+
+    def get(self, key: str, verify: bool = False) -> Optional[SegmentEntry]:
+        """
+        Look up a record without copying it. verify=True also checks the
+        record's CRC (reads the whole record).
+        """
+        key_bytes = key.encode("utf-8")
+        with self._lock:
+            self._ensure_current()
+            data_end = self._header()[3]
+            if data_end > len(self._mm):
+                # Another process appended after the mapping was sized
+                self._mm = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+                data_end = min(data_end, len(self._mm))
+            _, offset = self._find(key_bytes, key_hash(key_bytes), data_end)
+            if offset == 0:
+                SEGMENT_OPS.inc(op="get", result="miss")
+                return None
+            _, created, meta_start, body_start, end = self._record_at(offset, data_end)
+            if verify and not self._crc_ok(offset, end):
+                SEGMENT_OPS.inc(op="get", result="corrupt")
+                return None
+            view = memoryview(self._mm)
+        SEGMENT_OPS.inc(op="get", result="hit")
+        return SegmentEntry(key, created, view[meta_start:body_start], view[body_start:end])
+
+    def put(self, key: str, body: str, meta: Dict, created: Optional[float] = None) -> None:
+        """
+        Append a record; the newest record for a key wins
+        """
+        record = encode_record(key, body, meta, created)
+        with self._locked():
+            self._recover()
+            slots, records, live, data_end = self._header()
+            if live + 1 > slots * MAX_LOAD:
+                self._compact_locked(self.max_age)
+                slots, records, live, data_end = self._header()
+
+            os.pwrite(self._fd, record, data_end)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._ensure_current()
+            end = data_end + len(record)
+            live += self._index(key.encode("utf-8"), data_end, end)
+            self._write_header(slots, records + 1, live, end)
+            SEGMENT_OPS.inc(op="put", result="ok")
+
+            # Superseded records are dead weight; rewrite once they dominate
+            if records + 1 >= Config.CACHE_SEGMENT_COMPACT_MIN_RECORDS and records + 1 > 2 * live:
+                self._compact_locked(self.max_age)
+
+    def compact(self, max_age: Optional[float] = None) -> None:
+        """
+        Rewrite the file with only the newest record per key, dropping
+        records older than max_age seconds (default: the segment's max_age)
+        """
+        with self._locked():
+            self._recover()
+            self._compact_locked(max_age if max_age is not None else self.max_age)
+
+    def _compact_locked(self, max_age: Optional[float] = None) -> None:
+        slots, _, _, data_end = self._header()
+        now = time.time()
+        live = []
+        for slot in range(slots):
+            _, offset = SLOT.unpack_from(self._mm, HEADER_SIZE + slot * SLOT.size)
+            record = self._record_at(offset, data_end) if offset else None
+            if record is None or (max_age is not None and now - record[1] > max_age):
+                continue
+            live.append((offset, record[0], record[4]))
+        live.sort()
+
+        new_slots = max(self.initial_slots, _next_power_of_two(int(len(live) / 0.5) + 1))
+        tmp = self.path + ".compact"
+        self._create(tmp, new_slots)
+        index = bytearray(new_slots * SLOT.size)
+        fd = os.open(tmp, os.O_RDWR)
+        try:
+            position = HEADER_SIZE + new_slots * SLOT.size
+            for offset, key, end in live:
+                os.pwrite(fd, self._mm[offset:end], position)
+                hashed = key_hash(key)
+                slot = next(
+                    s for s in self._probe(new_slots, hashed)
+                    if not SLOT.unpack_from(index, s * SLOT.size)[1]
+                )
+                SLOT.pack_into(index, slot * SLOT.size, hashed, position)
+                position += end - offset
+            os.pwrite(fd, bytes(index), HEADER_SIZE)
+            os.pwrite(fd, HEADER.pack(MAGIC, VERSION, new_slots, len(live), len(live), position), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._open()
+        SEGMENT_OPS.inc(op="compact", result="ok")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Index size, record counts and file size
+        """
+        with self._lock:
+            self._ensure_current()
+            slots, records, live, data_end = self._header()
+        return {"slots": slots, "records": records, "live": live, "bytes": data_end}
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+            os.close(self._lock_fd)
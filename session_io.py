@@ -0,0 +1,236 @@
+"""
+Bulk session export/import for the Startup Guide Tool
+
+Sessions are written as JSONL with one record per line so that exports of
+thousands of sessions can be streamed into analytics tools without ever
+holding a full session (or file) in memory. Files can optionally be
+gzip- or zstd-compressed, or "zdict"-compressed with the trained answer
+dictionary (smallest, but readable only where compression.py can load the
+dictionary); the format is detected on read.
+
+Record schema (version 1), in file order for each session:
+
+    {"type": "session", "schema": 1, "session_id": ..., "startup_profile": {...}}
+    {"type": "turn", "session_id": ..., "index": 0, "role": ..., "content": ...,
+     "topic": ..., "timestamp": ...}
+    {"type": "checklist", "session_id": ..., "key": ..., "states": [...]}
+"""
+import gzip
+import io
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from blobs import blob_store
+from compression import is_compressed, open_reader as open_dictionary_reader, open_writer as open_dictionary_writer
+from metrics import timed
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+SCHEMA_VERSION = 1
+
+COMPRESSIONS = ["none", "gzip", "zstd", "zdict"]
+
+# File extension and MIME type of an export, by compression
+EXPORT_FORMATS = {
+    "none": (".jsonl", "application/jsonl"),
+    "gzip": (".jsonl.gz", "application/gzip"),
+    "zstd": (".jsonl.zst", "application/zstd"),
+    "zdict": (".jsonl.zdict", "application/octet-stream"),
+}
+
+# What import_sessions raises for malformed records or a corrupt or
+# truncated compressed file
+IMPORT_ERRORS: Tuple[type, ...] = (ValueError, OSError, EOFError, zlib.error) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+# Fixed field order keeps every line of a given record type byte-stable
+SESSION_FIELDS = ["type", "schema", "session_id", "startup_profile"]
+TURN_FIELDS = ["type", "session_id", "index", "role", "content", "topic", "timestamp"]
+CHECKLIST_FIELDS = ["type", "session_id", "key", "states"]
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _encode(record: Dict, fields: List[str]) -> str:
+    """
+    Serialize a record with a stable field order and compact separators
+    """
+    ordered = {field: record.get(field) for field in fields}
+    return json.dumps(ordered, ensure_ascii=False, separators=(",", ":"))
+
+
+def iter_session_records(session_id: str, state: Dict) -> Iterator[str]:
+    """
+    Yield encoded JSONL lines for a single session's state
+    """
+    yield _encode({
+        "type": "session",
+        "schema": SCHEMA_VERSION,
+        "session_id": session_id,
+        "startup_profile": state.get("startup_profile") or {}
+    }, SESSION_FIELDS)
+
+    for idx, msg in enumerate(state.get("conversation_history") or []):
+        yield _encode({
+            "type": "turn",
+            "session_id": session_id,
+            "index": idx,
+            "role": msg.get("role"),
+            "content": msg.get("content"),
+            "topic": msg.get("topic"),
+            "timestamp": msg.get("timestamp")
+        }, TURN_FIELDS)
+
+    for key, states in (state.get("checklists") or {}).items():
+        yield _encode({
+            "type": "checklist",
+            "session_id": session_id,
+            "key": key,
+            "states": list(states)
+        }, CHECKLIST_FIELDS)
+
+
+def _open_writer(fileobj, compression: str):
+    """
+    Wrap a binary file object in the requested compressor
+    """
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=3).stream_writer(fileobj, closefd=False)
+    if compression == "zdict":
+        return open_dictionary_writer(fileobj)
+    if compression == "none":
+        return None
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+@timed("session_io.export_sessions")
+def export_sessions(
+    sessions: Iterable[Tuple[str, Dict]],
+    fileobj,
+    compression: str = "none"
+) -> int:
+    """
+    Stream (session_id, state) pairs into a binary file object as JSONL.
+    Returns the number of records written.
+    """
+    writer = _open_writer(fileobj, compression)
+    target = writer if writer is not None else fileobj
+    count = 0
+    try:
+        for session_id, state in sessions:
+            for line in iter_session_records(session_id, state):
+                target.write(line.encode("utf-8"))
+                target.write(b"\n")
+                count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export_session_bytes(session_id: str, state: Dict, compression: str = "gzip") -> bytes:
+    """
+    Export one session to an in-memory payload (used for download buttons)
+    """
+    buffer = io.BytesIO()
+    export_sessions([(session_id, state)], buffer, compression)
+    return buffer.getvalue()
+
+
+def export_format(compression: str) -> Tuple[str, str]:
+    """
+    (file extension, MIME type) for an export written with compression
+    """
+    if compression not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return EXPORT_FORMATS[compression]
+
+
+def _open_reader(fileobj):
+    """
+    Detect compression from the leading magic bytes and return a line reader
+    """
+    if not hasattr(fileobj, "peek"):
+        fileobj = io.BufferedReader(fileobj)
+    head = fileobj.peek(4)[:4]
+    if head.startswith(_GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if head.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Reading zstd exports requires the 'zstandard' package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fileobj))
+    if is_compressed(head):
+        return open_dictionary_reader(fileobj)
+    return fileobj
+
+
+def iter_records(fileobj) -> Iterator[Dict]:
+    """
+    Yield decoded records one at a time from a (possibly compressed) export
+    """
+    for raw in _open_reader(fileobj):
+        raw = raw.strip()
+        if not raw:
+            continue
+        record = json.loads(raw)
+        if record.get("type") == "session" and record.get("schema") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported export schema: {record.get('schema')}")
+        yield record
+
+
+def import_sessions(fileobj) -> Iterator[Tuple[str, Dict]]:
+    """
+    Rebuild (session_id, state) pairs from an export, one session at a time
+    """
+    current_id: Optional[str] = None
+    state: Dict = {}
+
+    for record in iter_records(fileobj):
+        kind = record.get("type")
+        if kind == "session":
+            if current_id is not None:
+                yield current_id, state
+            current_id = record["session_id"]
+            state = {
+                "startup_profile": record.get("startup_profile") or {},
+                "conversation_history": [],
+                "checklists": {}
+            }
+        elif current_id is None or record.get("session_id") != current_id:
+            raise ValueError("Record found outside of its session block")
+        elif kind == "turn":
+            turn = {
+                "role": record["role"],
+                "content": record["content"],
+                "topic": record.get("topic"),
+                "timestamp": record.get("timestamp")
+            }
+            if record["role"] == "assistant" and record["content"]:
+                # Imported answers share bodies with live sessions and the cache
+                turn["content"] = blob_store.intern(record["content"])
+                turn["content_hash"] = turn["content"].digest
+            state["conversation_history"].append(turn)
+        elif kind == "checklist":
+            state["checklists"][record["key"]] = list(record["states"])
+
+    if current_id is not None:
+        yield current_id, state
+
+
+def restore_session_state(target, state: Dict) -> None:
+    """
+    Load an imported session into a session store (e.g. st.session_state)
+    """
+    target["startup_profile"] = state.get("startup_profile", {})
+    target["conversation_history"] = state.get("conversation_history", [])
+    target["checklists"] = state.get("checklists", {})
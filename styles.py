@@ -0,0 +1,51 @@
+"""
+Static HTML/CSS for the Startup Guide Tool
+
+Defined once per process; app.py only references these constants on each
+rerun instead of rebuilding the literals.
+"""
+
+CUSTOM_CSS = """
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        font-weight: 700;
+        background: linear-gradient(120deg, #667eea 0%, #764ba2 100%);
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        margin-bottom: 1rem;
+    }
+    .topic-card {
+        padding: 1rem;
+        border-radius: 10px;
+        background: #f8f9fa;
+        margin: 0.5rem 0;
+    }
+    .response-container {
+        background: #ffffff;
+        padding: 2rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .checklist-item {
+        padding: 0.5rem;
+        margin: 0.3rem 0;
+        border-left: 3px solid #667eea;
+        background: #f8f9fa;
+    }
+    .metric-card {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        padding: 1rem;
+        border-radius: 8px;
+        text-align: center;
+    }
+</style>
+"""
+
+FOOTER_HTML = """
+<div style='text-align: center; color: #666; padding: 2rem;'>
+    <p>Built with ❤️ by SitaRaman | Powered by OpenRouter AI</p>
+    <p style='font-size: 0.8rem;'>🌟 Star this project | 📧 Contact for feedback</p>
+</div>
+"""
@@ -0,0 +1,184 @@
+"""
+Stream monitor and streamed completion tests, against a scripted HTTP session
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from prompts import get_required_headings  # noqa: E402
+
+SCALING_HEADINGS = get_required_headings("scaling")
+
+
+def scaling_answer(last_section: str, extra: str = "") -> str:
+    """
+    Answer with every scaling heading; the last section's body is given
+    """
+    parts = [f"{heading}\nA short paragraph about this part of scaling the company.\n" for heading in SCALING_HEADINGS[:-1]]
+    parts.append(f"{SCALING_HEADINGS[-1]}\n{last_section}")
+    return "\n".join(parts) + extra
+
+
+QUICK_WINS = (
+    "Focus on these three moves over the next month; each one is small enough that you can finish it within a few weeks:\n"
+    "\n"
+    "1. **Automate onboarding** so new customers activate without a call.\n"
+    "2. **Raise prices for new plans** and measure conversion for a month.\n"
+    "3. **Hire a support lead** before ticket volume doubles again.\n"
+)
+
+
+def feed_in_chunks(monitor: api.StreamMonitor, text: str, size: int = 7) -> str:
+    streamed = ""
+    for start in range(0, len(text), size):
+        streamed += text[start:start + size]
+        if monitor.feed(streamed):
+            break
+    return streamed
+
+
+def test_intro_paragraph_before_list_does_not_end_last_section():
+    answer = scaling_answer(QUICK_WINS)
+    monitor = api.build_stream_monitor("scaling", modifier="simplify")
+    streamed = feed_in_chunks(monitor, answer)
+    assert monitor.reason is None
+    assert monitor.final_text(streamed).endswith("before ticket volume doubles again.\n")
+
+
+def test_extra_section_after_required_ones_is_cut():
+    answer = scaling_answer(QUICK_WINS, extra="\n## Final Thoughts\nScaling is a journey, not a destination.\n")
+    monitor = api.build_stream_monitor("scaling")
+    streamed = feed_in_chunks(monitor, answer)
+    assert monitor.reason == "extra_section"
+    assert monitor.final_text(streamed).endswith("before ticket volume doubles again.")
+
+
+def test_word_budget_cuts_back_to_paragraph_break():
+    monitor = api.StreamMonitor(SCALING_HEADINGS, word_budget=30)
+    answer = "## Overview\nFirst paragraph with six words.\n\n" + "More words keep coming here. " * 10 + "\n"
+    streamed = feed_in_chunks(monitor, answer)
+    assert monitor.reason == "word_budget"
+    assert monitor.final_text(streamed) == "## Overview\nFirst paragraph with six words."
+
+
+class FakeResponse:
+    """Streamed response yielding SSE lines, optionally breaking off"""
+
+    status_code = 200
+    text = ""
+
+    def __init__(self, contents, finish_reason="stop", usage=None, drop=False):
+        self.lines = []
+        for content in contents:
+            chunk = {"choices": [{"delta": {"content": content}, "finish_reason": None}]}
+            self.lines.append(b"data: " + json.dumps(chunk).encode("utf-8"))
+        self.drop = drop
+        if not drop:
+            self.lines.append(b"data: " + json.dumps({"choices": [{"delta": {}, "finish_reason": finish_reason}]}).encode("utf-8"))
+            if usage:
+                self.lines.append(b"data: " + json.dumps({"choices": [], "usage": usage}).encode("utf-8"))
+            self.lines.append(b"data: [DONE]")
+
+    def iter_lines(self):
+        import requests
+
+        yield from self.lines
+        if self.drop:
+            raise requests.ConnectionError("connection reset mid-stream")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Returns scripted responses (or raises scripted errors) in order"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def post(self, url, headers=None, json=None, stream=False, timeout=None):
+        self.payloads.append(json)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    def install(*responses):
+        session = FakeSession(*responses)
+        monkeypatch.setattr(api, "get_http_session", lambda: session)
+        return session
+    return install
+
+
+PAYLOAD = {"model": "test/model", "stream": True, "max_tokens": 1000, "messages": [{"role": "user", "content": "x" * 400}]}
+
+
+def test_early_stop_estimates_usage_the_closed_stream_never_sent(fake_session):
+    answer = scaling_answer(QUICK_WINS, extra="\n## Final Thoughts\nScaling is a journey.\n\nMore text.\n")
+    fake_session(FakeResponse([answer[i:i + 20] for i in range(0, len(answer), 20)], usage={"prompt_tokens": 100}))
+    result = api.chat_completion(dict(PAYLOAD), "key", coalesce=False, monitor=api.build_stream_monitor("scaling"))
+    assert result["finish_reason"] == "early_stop"
+    assert result["usage"]["estimated"] is True
+    assert result["usage"]["prompt_tokens"] == 100
+    assert result["usage"]["completion_tokens"] > 0
+    assert "tokens_saved" not in result
+
+
+def test_overlap_length_finds_repeated_suffix():
+    partial = "## Overview\nStart by validating pricing with ten customers"
+    assert api.overlap_length(partial, "with ten customers before hiring.") == len("with ten customers")
+    # Too short to be a deliberate repeat
+    assert api.overlap_length(partial, "ers, then hire.") == 0
+    assert api.overlap_length(partial, "A new paragraph.") == 0
+
+
+def test_resume_stitches_continuation_without_repeating_overlap(fake_session):
+    first = "## Overview\nStart by validating pricing with ten customers"
+    rest = " before hiring a sales team. " + "Then measure retention every week. " * 8
+    session = fake_session(
+        FakeResponse([first[:20], first[20:]], drop=True),
+        FakeResponse(["pricing with ten customers" + rest[:40], rest[40:]])
+    )
+    result = api.chat_completion(dict(PAYLOAD), "key", coalesce=False)
+    assert result["content"] == first + rest
+    assert result["finish_reason"] == "stop"
+    assert result["resumes"] == 1
+    assert session.payloads[1]["messages"][-2] == {"role": "assistant", "content": first}
+
+
+def test_failed_resume_returns_partial_text(fake_session):
+    import requests
+
+    first = "## Overview\nStart by validating pricing with ten customers"
+    fake_session(
+        FakeResponse([first[:20], first[20:]], drop=True),
+        requests.ConnectionError("still unreachable")
+    )
+    result = api.chat_completion(dict(PAYLOAD), "key", coalesce=False)
+    assert result["content"] == first
+    assert result["finish_reason"] == "incomplete"
+
+
+def test_resume_rejected_by_provider_returns_partial_text(fake_session):
+    first = "## Overview\nStart by validating pricing"
+    fake_session(FakeResponse([first], drop=True), api.APIError(503, "unavailable"))
+    result = api.chat_completion(dict(PAYLOAD), "key", coalesce=False)
+    assert result["content"] == first
+    assert result["finish_reason"] == "incomplete"
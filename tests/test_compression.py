@@ -0,0 +1,49 @@
+"""
+Dictionary registry persistence and background training tests
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compression  # noqa: E402
+
+ANSWER = "## Incorporation Documents\n- **Action**: Incorporate in Delaware\n- **Owner**: Founders\n"
+
+
+def wait_for_version(registry, topic, timeout=5.0):
+    deadline = time.time() + timeout
+    while registry.current(topic).version == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    return registry.current(topic)
+
+
+def test_without_directory_nothing_is_written_or_trained(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    registry = compression.DictionaryRegistry(directory="", train_after=2)
+    monkeypatch.setattr(compression, "dictionaries", registry)
+    for _ in range(4):
+        blob = compression.compress(ANSWER, "documents")
+    assert os.listdir(tmp_path) == []
+    assert registry.current("documents").version == 0
+    # Another process rebuilds the same seed and can read the blob
+    monkeypatch.setattr(compression, "dictionaries", compression.DictionaryRegistry(directory=""))
+    assert compression.decompress(blob) == ANSWER
+
+
+def test_trained_dictionary_is_saved_and_readable_elsewhere(tmp_path, monkeypatch):
+    directory = str(tmp_path / "dicts")
+    registry = compression.DictionaryRegistry(directory=directory, train_after=3)
+    monkeypatch.setattr(compression, "dictionaries", registry)
+    for _ in range(3):
+        compression.compress(ANSWER, "documents")
+    trained = wait_for_version(registry, "documents")
+    assert trained.version == 1
+    assert trained.filename in os.listdir(directory)
+
+    blob = compression.compress(ANSWER, "documents", learn=False)
+    monkeypatch.setattr(compression, "dictionaries", compression.DictionaryRegistry(directory=directory))
+    assert compression.decompress(blob) == ANSWER
@@ -0,0 +1,88 @@
+"""
+Admission control tests for background (prefetch, revalidation) requests
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import AdmissionController, QueueFullError  # noqa: E402
+from scheduler import PriorityScheduler  # noqa: E402
+
+
+def test_background_is_charged_to_key_and_model_not_session():
+    controller = AdmissionController(max_concurrent=2)
+    with controller.admit("s1", "key", "m", background=True):
+        assert controller.active == 1
+    buckets = dict(controller.limiter.buckets_for("s1", "key", "m"))
+    assert buckets["session"].tokens == buckets["session"].capacity
+    assert buckets["api_key"].tokens < buckets["api_key"].capacity
+    assert buckets["model"].tokens < buckets["model"].capacity
+    assert controller.active == 0
+
+
+def test_background_never_takes_the_last_slot_from_a_waiting_user():
+    controller = AdmissionController(max_concurrent=1, timeout=5)
+    running = {"s1": threading.Event(), "s3": threading.Event()}
+    release = {"s1": threading.Event(), "s3": threading.Event()}
+
+    def user(session_id):
+        with controller.admit(session_id, "key", "m"):
+            running[session_id].set()
+            release[session_id].wait(5)
+
+    users = [threading.Thread(target=user, args=(session_id,)) for session_id in ("s1", "s3")]
+    users[0].start()
+    running["s1"].wait(5)
+    users[1].start()
+    while not controller.queue_depth():
+        pass
+    release["s1"].set()
+    # The slot frees up, but it is handed to the queued user, never to background work
+    with pytest.raises(QueueFullError):
+        with controller.admit("s2", "key", "m", background=True):
+            pass
+    assert running["s3"].wait(5)
+    release["s3"].set()
+    for thread in users:
+        thread.join(5)
+    with controller.admit("s2", "key", "m", background=True):
+        assert controller.active == 1
+
+
+def test_background_respects_per_model_cap_under_priority_policy():
+    controller = PriorityScheduler(max_concurrent=8)
+    with controller.admit("s1", "key", "openai/gpt-4o", background=True):
+        with controller.admit("s2", "key", "openai/gpt-4o", background=True):
+            with controller.admit("s3", "key", "openai/gpt-4o", background=True):
+                with pytest.raises(QueueFullError):
+                    with controller.admit("s4", "key", "openai/gpt-4o", background=True):
+                        pass
+    assert controller.active_by_model["openai/gpt-4o"] == 0
+
+
+def test_parallel_sections_are_charged_per_request_and_hold_free_slots():
+    controller = AdmissionController(max_concurrent=8)
+    with controller.admit("s1", "key", "m", requests=6) as ticket:
+        assert ticket.streams == 6
+        assert controller.active == 6
+        buckets = dict(controller.limiter.buckets_for("s1", "key", "m"))
+        assert buckets["api_key"].capacity - buckets["api_key"].tokens == pytest.approx(6, abs=0.1)
+        # Only two slots are left, so the next generation runs two sections at a time
+        with controller.admit("s2", "key2", "m", requests=6) as second:
+            assert second.streams == 2
+            assert controller.active == 8
+    assert controller.active == 0
+
+
+def test_parallel_sections_stay_within_the_model_cap():
+    controller = PriorityScheduler(max_concurrent=8)
+    with controller.admit("s1", "key", "openai/gpt-4o", requests=6) as ticket:
+        assert ticket.streams == 3
+        assert controller.active_by_model["openai/gpt-4o"] == 3
+    assert controller.active_by_model["openai/gpt-4o"] == 0
@@ -0,0 +1,27 @@
+"""
+Model router health signal tests
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import API_REQUESTS  # noqa: E402
+from router import ModelRouter  # noqa: E402
+
+
+def test_cancelled_requests_are_not_errors():
+    model = "test/cancelled-model"
+    API_REQUESTS.inc(6, model=model, status="200")
+    API_REQUESTS.inc(2, model=model, status="cancelled")
+    assert ModelRouter(log_path="").error_rate(model) == 0.0
+
+
+def test_incomplete_and_failed_requests_are_errors():
+    model = "test/flaky-model"
+    API_REQUESTS.inc(6, model=model, status="200")
+    API_REQUESTS.inc(1, model=model, status="incomplete")
+    API_REQUESTS.inc(1, model=model, status="503")
+    assert ModelRouter(log_path="").error_rate(model) == 0.25
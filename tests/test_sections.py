@@ -0,0 +1,26 @@
+"""
+Section-parallel usage merging tests
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sections import merge_usage  # noqa: E402
+
+
+def test_merge_usage_counts_cached_tokens_from_either_provider_field():
+    merged = merge_usage([
+        {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110, "prompt_tokens_details": {"cached_tokens": 40}},
+        {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120, "cache_read_input_tokens": 60},
+        None
+    ])
+    assert merged["prompt_tokens"] == 200
+    assert merged["completion_tokens"] == 30
+    assert merged["prompt_tokens_details"]["cached_tokens"] == 100
+
+
+def test_merge_usage_without_any_usage_is_none():
+    assert merge_usage([None, {}]) is None
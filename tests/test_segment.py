@@ -0,0 +1,114 @@
+"""
+Cache segment recovery, compaction and cross-process read tests
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import ResponseCache  # noqa: E402
+from segment import CacheSegment, encode_record  # noqa: E402
+
+META = {"topic": "general"}
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    segment = CacheSegment(path, initial_slots=16, fsync=False)
+    segment.put("kept", "first answer", META)
+    committed = os.path.getsize(path)
+    segment.close()
+    # A crash after writing part of the next record
+    with open(path, "ab") as handle:
+        handle.write(encode_record("torn", "second answer", META)[:-5])
+
+    segment = CacheSegment(path, initial_slots=16, fsync=False)
+    assert os.path.getsize(path) == committed
+    assert segment.get("kept").text() == "first answer"
+    assert segment.get("torn") is None
+    segment.put("after", "third answer", META)
+    assert segment.get("after", verify=True).text() == "third answer"
+    segment.close()
+
+
+def test_complete_unpublished_record_is_reindexed(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    CacheSegment(path, initial_slots=16, fsync=False).close()
+    # A crash after the append but before the index and header were updated
+    with open(path, "ab") as handle:
+        handle.write(encode_record("orphan", "recovered answer", META))
+
+    segment = CacheSegment(path, initial_slots=16, fsync=False)
+    assert segment.get("orphan", verify=True).text() == "recovered answer"
+    assert segment.stats()["live"] == 1
+    segment.close()
+
+
+def test_compaction_keeps_newest_record_per_key(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    segment = CacheSegment(path, initial_slots=16, fsync=False)
+    for version in range(5):
+        segment.put("same", f"answer v{version} " * 50, META)
+    segment.put("other", "other answer", META)
+    before = segment.stats()
+
+    segment.compact()
+    after = segment.stats()
+    assert before["records"] == 6 and after["records"] == 2
+    assert after["bytes"] < before["bytes"]
+    assert segment.get("same", verify=True).text() == "answer v4 " * 50
+    assert segment.get("other", verify=True).text() == "other answer"
+    segment.close()
+
+
+def test_compaction_drops_expired_records(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    segment = CacheSegment(path, initial_slots=16, fsync=False)
+    segment.put("old", "old answer", META, created=1.0)
+    segment.put("new", "new answer", META)
+    segment.compact(max_age=3600)
+    assert segment.get("old") is None
+    assert segment.get("new").text() == "new answer"
+    segment.close()
+
+
+def test_reader_sees_other_writers_appends_and_compaction(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    writer = CacheSegment(path, initial_slots=16, fsync=False)
+    reader = CacheSegment(path, initial_slots=16, fsync=False)
+    writer.put("a", "x" * 10000, META)
+    assert reader.get("a").text() == "x" * 10000
+    writer.compact()
+    writer.put("b", "y" * 5, META)
+    assert reader.get("b").text() == "y" * 5
+    writer.close()
+    reader.close()
+
+
+def test_read_after_append_past_mapping(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    writer = CacheSegment(path, initial_slots=16, fsync=False)
+    reader = CacheSegment(path, initial_slots=16, fsync=False)
+    # The append lands between the reader's remap check and its header read
+    reader._ensure_current = lambda: None
+    writer.put("grown", "z" * 20000, META)
+    assert reader.get("grown").text() == "z" * 20000
+    writer.close()
+    reader.close()
+
+
+def test_cache_serves_other_workers_answer_from_segment(tmp_path):
+    path = str(tmp_path / "cache.seg")
+    writer = ResponseCache(segment=CacheSegment(path, initial_slots=16, fsync=False))
+    reader = ResponseCache(segment=CacheSegment(path, initial_slots=16, fsync=False))
+    answer = "## Plan\n- [ ] Register the company\n- [ ] Open a bank account\n"
+    writer.put("key", answer, topic="general", query="how do I start")
+
+    entry = reader.get("key")
+    assert entry["content"] == answer
+    assert entry["query"] == "how do I start"
+    assert entry["analysis"]["checklist"] == list(entry["content"].checklist_items)
+    # Served in place, not copied into the reader's LRU
+    assert len(reader) == 0
@@ -0,0 +1,38 @@
+"""
+Session import error handling tests
+
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_io import IMPORT_ERRORS, export_session_bytes, import_sessions  # noqa: E402
+
+STATE = {
+    "startup_profile": {"stage": "Seed"},
+    "conversation_history": [
+        {"role": "user", "content": "How should we price? " * 40, "topic": "general", "timestamp": "2026-01-01"}
+    ],
+    "checklists": {}
+}
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zdict"])
+def test_corrupt_compressed_upload_raises_an_import_error(compression):
+    data = bytearray(export_session_bytes("s", STATE, compression))
+    for idx in range(20, len(data) - 10):
+        data[idx] ^= 0x55
+    with pytest.raises(IMPORT_ERRORS):
+        list(import_sessions(io.BytesIO(bytes(data))))
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zdict"])
+def test_truncated_upload_raises_an_import_error(compression):
+    data = export_session_bytes("s", STATE, compression)
+    with pytest.raises(IMPORT_ERRORS):
+        list(import_sessions(io.BytesIO(data[:len(data) // 2])))
@@ -0,0 +1,92 @@
+"""
+Delta transforms for the Startup Guide Tool
+
+Refine, Simplify and Expand rewrite the previous answer. Instead of
+re-sending the topic template, profile and conversation history (which
+already contains that answer) plus a modifier, the delta path sends the
+previous answer and a compact instruction only. Savings are recorded per
+mode against the prompt the full path would have sent.
+"""
+from typing import Dict, List, Optional
+
+from api import SYSTEM_PROMPT
+from config import Config
+from metrics import registry
+from prompts import TRANSFORM_INSTRUCTIONS, render_transform_prompt
+from utils import estimate_tokens
+
+TRANSFORM_REQUESTS = registry.counter("transform_requests_total", "Refine/Simplify/Expand requests by mode and path")
+TRANSFORM_PROMPT_TOKENS = registry.counter(
+    "transform_prompt_tokens_total", "Estimated prompt tokens sent for transforms by mode and path"
+)
+TRANSFORM_TOKENS_SAVED = registry.counter(
+    "transform_prompt_tokens_saved_total", "Estimated prompt tokens the delta path avoided sending, by mode"
+)
+TRANSFORM_SECONDS = registry.histogram("transform_seconds", "Transform request duration by mode and path")
+
+
+def is_transform(mode: str) -> bool:
+    """
+    True for the button modes that rewrite a previous answer
+    """
+    return mode in TRANSFORM_INSTRUCTIONS
+
+
+def previous_answer(current_guidance: Optional[Dict], history: List[Dict]) -> Optional[str]:
+    """
+    The answer a transform applies to: the guidance on screen, else the
+    latest assistant message in the history
+    """
+    if current_guidance and current_guidance.get("content"):
+        return current_guidance["content"]
+    for message in reversed(history):
+        if message.get("role") == "assistant" and message.get("content"):
+            return message["content"]
+    return None
+
+
+def build_transform_messages(
+    mode: str,
+    previous: str,
+    query: str,
+    profile_context: str = "",
+    length_note: str = ""
+) -> List[Dict]:
+    """
+    System prompt plus a single delta prompt; no template and no history
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": render_transform_prompt(mode, previous, query, profile_context, length_note)}
+    ]
+
+
+def transform_model(mode: str, model: str) -> str:
+    """
+    Model for a delta transform: the cheapest one for modes listed in
+    Config.TRANSFORM_CHEAPEST_MODES, otherwise the chosen model
+    """
+    if mode in Config.TRANSFORM_CHEAPEST_MODES:
+        return Config.cheapest_model()
+    return model
+
+
+def record_transform(
+    mode: str,
+    path: str,
+    prompt_text: str,
+    seconds: float,
+    full_prompt_tokens: Optional[int] = None
+) -> int:
+    """
+    Record one transform; path is "delta" or "full". Returns the estimated
+    prompt tokens saved against the full path (0 for the full path itself).
+    """
+    prompt_tokens = estimate_tokens(prompt_text)
+    TRANSFORM_REQUESTS.inc(mode=mode, path=path)
+    TRANSFORM_PROMPT_TOKENS.inc(prompt_tokens, mode=mode, path=path)
+    TRANSFORM_SECONDS.observe(seconds, mode=mode, path=path)
+    saved = max(0, (full_prompt_tokens or prompt_tokens) - prompt_tokens)
+    if saved:
+        TRANSFORM_TOKENS_SAVED.inc(saved, mode=mode)
+    return saved
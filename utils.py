@@ -6,6 +6,44 @@ from datetime import datetime
 from typing import List, Optional, Dict
 import hashlib
 
+from metrics import timed
+
+# Analyzers run on untrusted model output and user text. Every pattern
+# below is matched within a single capped line and uses bounded
+# quantifiers, so matching time is linear in the input length.
+MAX_ANALYSIS_CHARS = 200_000
+MAX_LINE_CHARS = 2_000
+MAX_ITEM_CHARS = 600
+
+_NUMBERED_ITEM = re.compile(r'[ \t]*\d{1,6}\.[ \t]+(.+)')
+_BULLET_ITEM = re.compile(r'[ \t]*[-*][ \t]+(.+)')
+_ACTION_ITEM = re.compile(r'[ \t]*([A-Z][a-z]{1,40}[ \t]{1,10}[a-z]{1,40}[ \t]{1,10}[^.!?]{10,500}[.!?])')
+_CHECKBOX_ITEM = re.compile(r'\[[ x]\][ \t]+(.+)', re.IGNORECASE)
+_BOLD = re.compile(r'\*\*(.+?)\*\*')
+_ITALIC = re.compile(r'\*(.+?)\*')
+_CODE = re.compile(r'`(.+?)`')
+
+_METRIC_PATTERNS = [
+    re.compile(r'(CAC|LTV|MRR|ARR|Churn|Retention|DAU|MAU|NPS|Conversion)\s{0,20}[:\-]?\s{0,20}([^.\n]{1,300})', re.IGNORECASE),
+    re.compile(r'\b(\w{1,40}\s{1,20}rate)\s{0,20}[:\-]?\s{0,20}([^.\n]{1,300})', re.IGNORECASE),
+]
+_TIMELINE_PATTERN = re.compile(
+    r'(Week|Month|Quarter|Year)\s{1,20}(\d{1,4}(?:-\d{1,4})?)[:\-]?\s{0,20}([^.\n]{1,300})',
+    re.IGNORECASE
+)
+_HEADING = re.compile(r'#{1,3}\s{1,20}\w')
+_RESOURCE_WORDS = re.compile(r'(tool|resource|platform|software)', re.IGNORECASE)
+_NUMBERS = re.compile(r'(?<!\d)\d{1,12}(?:%|\s{1,20}(?:months|weeks|days))')
+_EXAMPLES = re.compile(r'(example|case study|for instance)', re.IGNORECASE)
+
+def _iter_lines(text: str):
+    """
+    Yield the lines of a capped copy of text, each truncated to MAX_LINE_CHARS
+    """
+    for line in text[:MAX_ANALYSIS_CHARS].split('\n'):
+        yield line[:MAX_LINE_CHARS]
+
+@timed("utils.format_markdown_response")
 def format_markdown_response(text: str) -> str:
     """
     Format AI response with better markdown rendering
@@ -21,28 +59,37 @@ def format_markdown_response(text: str) -> str:
     
     return text.strip()
 
+@timed("utils.extract_checklist_items")
 def extract_checklist_items(text: str, max_items: int = 15) -> List[str]:
     """
     Extract actionable checklist items from AI response
     Uses multiple patterns to identify action items
     """
     checklist = []
-    
-    # Pattern 1: Numbered lists (1. Item, 2. Item)
-    numbered_pattern = r'^\s*\d+\.\s+(.+)$'
-    numbered_matches = re.findall(numbered_pattern, text, re.MULTILINE)
-    
-    # Pattern 2: Bullet points (- Item, * Item)
-    bullet_pattern = r'^\s*[-*]\s+(.+)$'
-    bullet_matches = re.findall(bullet_pattern, text, re.MULTILINE)
-    
-    # Pattern 3: Action verbs at start of sentences
-    action_pattern = r'^\s*([A-Z][a-z]+\s+[a-z]+\s+[^.!?]{10,}[.!?])'
-    action_matches = re.findall(action_pattern, text, re.MULTILINE)
-    
-    # Pattern 4: Checkbox items ([ ] Item, [x] Item)
-    checkbox_pattern = r'\[[ x]\]\s+(.+)'
-    checkbox_matches = re.findall(checkbox_pattern, text, re.IGNORECASE)
+    numbered_matches = []
+    bullet_matches = []
+    action_matches = []
+    checkbox_matches = []
+    
+    # Match line by line so no pattern can scan past the end of its line
+    for line in _iter_lines(text):
+        # Pattern 1: Numbered lists (1. Item, 2. Item)
+        match = _NUMBERED_ITEM.match(line)
+        if match:
+            numbered_matches.append(match.group(1))
+        
+        # Pattern 2: Bullet points (- Item, * Item)
+        match = _BULLET_ITEM.match(line)
+        if match:
+            bullet_matches.append(match.group(1))
+        
+        # Pattern 3: Action verbs at start of sentences
+        match = _ACTION_ITEM.match(line)
+        if match:
+            action_matches.append(match.group(1))
+        
+        # Pattern 4: Checkbox items ([ ] Item, [x] Item)
+        checkbox_matches.extend(_CHECKBOX_ITEM.findall(line))
     
     # Combine all matches
     all_items = numbered_matches + bullet_matches + checkbox_matches
@@ -50,10 +97,13 @@ def extract_checklist_items(text: str, max_items: int = 15) -> List[str]:
     # Filter and clean items
     for item in all_items:
         item = item.strip()
+        # Items this long cannot clean down to a checklist-sized entry
+        if len(item) > MAX_ITEM_CHARS:
+            continue
         # Remove markdown formatting
-        item = re.sub(r'\*\*(.+?)\*\*', r'\1', item)  # Bold
-        item = re.sub(r'\*(.+?)\*', r'\1', item)      # Italic
-        item = re.sub(r'`(.+?)`', r'\1', item)        # Code
+        item = _BOLD.sub(r'\1', item)    # Bold
+        item = _ITALIC.sub(r'\1', item)  # Italic
+        item = _CODE.sub(r'\1', item)    # Code
         
         # Only include items that look like actions
         if (
@@ -69,6 +119,8 @@ def extract_checklist_items(text: str, max_items: int = 15) -> List[str]:
     
     return checklist
 
+
+@timed("utils.export_to_markdown")
 def export_to_markdown(
     query: str,
     response: str,
@@ -195,27 +247,25 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
         return text
     return text[:max_length - len(suffix)].strip() + suffix
 
+@timed("utils.extract_metrics_from_response")
 def extract_metrics_from_response(text: str) -> List[Dict[str, str]]:
     """
     Extract key metrics mentioned in the response
     """
     metrics = []
+    text = text[:MAX_ANALYSIS_CHARS]
     
     # Common startup metrics patterns
-    metric_patterns = [
-        r'(CAC|LTV|MRR|ARR|Churn|Retention|DAU|MAU|NPS|Conversion)\s*[:\-]?\s*([^.\n]+)',
-        r'(\w+\s+rate)\s*[:\-]?\s*([^.\n]+)',
-    ]
-    
-    for pattern in metric_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
+    for pattern in _METRIC_PATTERNS:
+        for match in pattern.finditer(text):
             metrics.append({
-                "metric": match[0].strip(),
-                "description": match[1].strip()
+                "metric": match.group(1).strip(),
+                "description": match.group(2).strip()
             })
+            if len(metrics) >= 10:  # Limit to top 10 metrics
+                return metrics
     
-    return metrics[:10]  # Limit to top 10 metrics
+    return metrics
 
 def suggest_follow_up_questions(topic: str, query: str) -> List[str]:
     """
@@ -267,6 +317,7 @@ def suggest_follow_up_questions(topic: str, query: str) -> List[str]:
         "What are common mistakes to avoid?"
     ])
 
+@timed("utils.analyze_sentiment")
 def analyze_sentiment(text: str) -> str:
     """
     Simple sentiment analysis based on keyword presence
@@ -274,8 +325,9 @@ def analyze_sentiment(text: str) -> str:
     positive_keywords = ['success', 'growth', 'opportunity', 'achieve', 'win', 'excellent', 'great']
     negative_keywords = ['risk', 'challenge', 'difficult', 'problem', 'fail', 'avoid', 'warning']
     
-    positive_count = sum(1 for word in positive_keywords if word in text.lower())
-    negative_count = sum(1 for word in negative_keywords if word in text.lower())
+    text = text[:MAX_ANALYSIS_CHARS].lower()
+    positive_count = sum(1 for word in positive_keywords if word in text)
+    negative_count = sum(1 for word in negative_keywords if word in text)
     
     if positive_count > negative_count * 1.5:
         return "positive"
@@ -303,6 +355,7 @@ def format_currency(amount: float, currency: str = "USD") -> str:
     else:
         return f"{symbol}{amount:.2f}"
 
+@timed("utils.parse_timeline")
 def parse_timeline(text: str) -> List[Dict[str, str]]:
     """
     Extract timeline information from response
@@ -310,8 +363,7 @@ def parse_timeline(text: str) -> List[Dict[str, str]]:
     timeline_items = []
     
     # Pattern for time-based items (Week 1, Month 1-3, etc.)
-    pattern = r'(Week|Month|Quarter|Year)\s+(\d+(?:-\d+)?)[:\-]?\s*([^.\n]+)'
-    matches = re.findall(pattern, text, re.IGNORECASE)
+    matches = _TIMELINE_PATTERN.findall(text[:MAX_ANALYSIS_CHARS])
     
     for match in matches:
         timeline_items.append({
@@ -350,6 +402,7 @@ def calculate_progress_score(checklist_states: List[bool]) -> Dict[str, any]:
     }
 
 # Response quality scoring
+@timed("utils.score_response_quality")
 def score_response_quality(response: str) -> Dict[str, any]:
     """
     Score the quality and completeness of AI response
@@ -369,14 +422,17 @@ def score_response_quality(response: str) -> Dict[str, any]:
         feedback.append("Response is comprehensive")
         score += 15
     
+    text = response[:MAX_ANALYSIS_CHARS]
+    
     # Structure check (has headers/sections)
-    if re.search(r'#{1,3}\s+\w+', response):
+    if _HEADING.search(text):
         score += 20
         feedback.append("Well-structured with sections")
     
     # Actionable items check
     action_verbs = ['create', 'build', 'develop', 'implement', 'establish', 'design', 'launch']
-    action_count = sum(1 for verb in action_verbs if verb in response.lower())
+    lowered = text.lower()
+    action_count = sum(1 for verb in action_verbs if verb in lowered)
     if action_count >= 5:
         score += 20
         feedback.append("Contains actionable advice")
@@ -384,17 +440,17 @@ def score_response_quality(response: str) -> Dict[str, any]:
         score += 10
     
     # Resources/tools mentioned
-    if re.search(r'(tool|resource|platform|software)', response, re.IGNORECASE):
+    if _RESOURCE_WORDS.search(text):
         score += 15
         feedback.append("Includes helpful resources")
     
     # Numbers/metrics mentioned
-    if re.search(r'\d+%|\d+\s+(months|weeks|days)', response):
+    if _NUMBERS.search(text):
         score += 15
         feedback.append("Contains specific metrics/timelines")
     
     # Examples or case studies
-    if re.search(r'(example|case study|for instance)', response, re.IGNORECASE):
+    if _EXAMPLES.search(text):
         score += 10
         feedback.append("Includes examples")
     